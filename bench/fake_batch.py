@@ -0,0 +1,80 @@
+"""
+오프라인 일괄 처리(offline_batch)용 Batch API 로컬 대역. 디렉터리 하나에 파일/배치 상태를 둔다.
+    files/<file_id>.jsonl      업로드한 입력, 생성된 결과/오류 파일
+    batches/<batch_id>.json    배치 상태
+retrieve를 polls_to_complete번 받으면 입력을 한 줄씩 처리해 결과 파일을 만든다. (폴링 경로 확인용)
+응답 내용은 fake_openai.responses_body (프롬프트의 형식 예시 JSON을 채운 것).
+error_rate만큼은 500 응답으로 오류 파일에 넣는다. (재시도 라운드 확인용)
+"""
+import json, os, random, shutil, uuid
+from typing import Any, Dict
+
+from bench.fake_openai import responses_body
+from offline_batch import BatchInfo
+
+class LocalBatchBackend:
+    def __init__(self, root: str, polls_to_complete: int = 2, error_rate: float = 0.0, seed: int = 7):
+        self.root = root
+        self.polls_to_complete = polls_to_complete
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        os.makedirs(os.path.join(root, "files"), exist_ok=True)
+        os.makedirs(os.path.join(root, "batches"), exist_ok=True)
+
+    def _file(self, file_id: str) -> str:
+        return os.path.join(self.root, "files", f"{file_id}.jsonl")
+
+    def _batch(self, batch_id: str) -> str:
+        return os.path.join(self.root, "batches", f"{batch_id}.json")
+
+    def _save(self, b: Dict[str, Any]) -> None:
+        with open(self._batch(b["id"]), "w", encoding="utf-8") as f:
+            json.dump(b, f, ensure_ascii=False)
+
+    async def upload(self, path: str) -> str:
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        shutil.copyfile(path, self._file(file_id))
+        return file_id
+
+    async def create(self, input_file_id: str, metadata: Dict[str, str]) -> str:
+        b = {"id": f"batch_{uuid.uuid4().hex[:24]}", "status": "validating", "input_file_id": input_file_id,
+             "metadata": metadata, "polls": 0, "output_file_id": None, "error_file_id": None}
+        self._save(b)
+        return b["id"]
+
+    async def retrieve(self, batch_id: str) -> BatchInfo:
+        with open(self._batch(batch_id), encoding="utf-8") as f:
+            b = json.load(f)
+        if b["status"] not in ("completed", "failed"):
+            b["polls"] += 1
+            if b["polls"] >= self.polls_to_complete:
+                self._process(b)
+            else:
+                b["status"] = "in_progress"
+            self._save(b)
+        return BatchInfo(b["id"], b["status"], b["output_file_id"], b["error_file_id"])
+
+    async def download(self, file_id: str, dest: str) -> None:
+        shutil.copyfile(self._file(file_id), dest)
+
+    def _process(self, b: Dict[str, Any]) -> None:
+        out_id, err_id = f"file-{uuid.uuid4().hex[:24]}", f"file-{uuid.uuid4().hex[:24]}"
+        n_err = 0
+        with open(self._file(b["input_file_id"]), encoding="utf-8") as src, \
+             open(self._file(out_id), "w", encoding="utf-8") as out, \
+             open(self._file(err_id), "w", encoding="utf-8") as err:
+            for i, line in enumerate(src):
+                if not line.strip():
+                    continue
+                req = json.loads(line)
+                rec: Dict[str, Any] = {"id": f"batch_req_{i}", "custom_id": req["custom_id"], "error": None}
+                if self.error_rate and self.rng.random() < self.error_rate:
+                    rec["response"] = {"status_code": 500, "request_id": f"req_{i}",
+                                       "body": {"error": {"message": "server error (fake)", "type": "server_error"}}}
+                    err.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                    n_err += 1
+                    continue
+                _kind, body = responses_body(req["body"], self.rng, f"resp_{i}")
+                rec["response"] = {"status_code": 200, "request_id": f"req_{i}", "body": body}
+                out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        b.update(status="completed", output_file_id=out_id, error_file_id=err_id if n_err else None)
@@ -0,0 +1,193 @@
+"""
+벤치마크용 로컬 OpenAI 대역 서버.
+responses.create(/v1/responses)와 chat.completions.create(/v1/chat/completions, stream 포함)만 흉내 낸다.
+- 지연: 로그정규 분포(중앙값/시그마) + 출력 토큰당 지연
+- 429 주입: 지정 확률로 retry-after와 함께 429 반환
+- 응답: 프롬프트의 "출력(JSON 엄수...)" 예시 JSON을 그대로 채워 돌려준다
+  (제목/요약, fused, reduce, 질문/퀴즈, EPI 원문/요약 템플릿 모두 같은 방식)
+"""
+import asyncio, json, math, random, re, socket, threading, time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+@dataclass
+class FakeConfig:
+    latency_median_ms: float = 600.0
+    latency_sigma: float = 0.4          # 로그정규 시그마 (0이면 고정 지연)
+    ms_per_output_token: float = 4.0
+    error_429_rate: float = 0.0
+    retry_after_sec: float = 0.5
+    seed: Optional[int] = 7
+
+@dataclass
+class FakeStats:
+    requests: int = 0
+    rate_limited: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    by_kind: Dict[str, int] = field(default_factory=dict)
+
+_FORMAT_RE = re.compile(r"출력[^\n]*JSON[^\n]*:\n(.*)$", re.DOTALL)
+
+_FILLER = {
+    "newTitle": "시민 생활에 영향을 주는 소식이 전해졌어요",
+    "summary": "기사 핵심 사실을 정리한 요약이에요. 관계 기관은 후속 조치를 발표했어요. 시민들의 관심이 이어지고 있어요.",
+    "reason": "원문의 과장 어휘와 감정 표현이 요약에서 줄었어요.",
+    "question": "기사에서 발표된 조치는 이번 달부터 시행되나요?",
+}
+
+def _tokens(text: str) -> int:
+    # 서비스 쪽 추정식과 비슷한 수준이면 충분 (한글 글자당 ~0.8, ASCII 4자당 1)
+    ascii_n = sum(1 for ch in text if ord(ch) < 128)
+    return int(ascii_n / 4 + (len(text) - ascii_n) * 0.8) + 1
+
+def _fill(example: Any, rng: random.Random, key: str = "") -> Any:
+    if isinstance(example, dict):
+        return {k: _fill(v, rng, k) for k, v in example.items()}
+    if isinstance(example, list):
+        return [_fill(v, rng, key) for v in example]
+    if isinstance(example, bool):
+        return example
+    if isinstance(example, (int, float)):
+        return round(rng.uniform(0.2, 0.8), 1)
+    if key == "answer":
+        return rng.choice(["YES", "NO"])
+    if key == "questions":
+        return "기사 속 결정이 앞으로 어떤 변화를 만들까요?"
+    return _FILLER.get(key, "기사 내용을 바탕으로 작성한 문장이에요.")
+
+def canned_answer(system: str, user: str, rng: random.Random) -> Tuple[str, str]:
+    """(종류, 응답 텍스트). 형식 예시가 없으면(구간 요약/대화 요약) 평문."""
+    m = _FORMAT_RE.search(user)
+    if m:
+        try:
+            example = json.loads(m.group(1).strip())
+        except ValueError:
+            example = None
+        if example is not None:
+            kind = "epi" if "심사관" in system else ("quiz" if "questions" in example else "summary")
+            return kind, json.dumps(_fill(example, rng), ensure_ascii=False)
+    return "text", "기사 구간의 핵심 사실을 정리했어요. 관계 기관이 대책을 내놓았고 시민 반응이 이어졌어요."
+
+def responses_body(request: Dict[str, Any], rng: random.Random, resp_id: str) -> Tuple[str, Dict[str, Any]]:
+    """responses.create 요청 본문 -> (종류, 응답 객체). 배치 대역(fake_batch)도 같은 것을 쓴다."""
+    msgs: List[Dict[str, str]] = request.get("input") or []
+    system = "\n".join(m["content"] for m in msgs if m.get("role") == "system")
+    user = "\n".join(m["content"] for m in msgs if m.get("role") == "user")
+    kind, text = canned_answer(system, user, rng)
+    tin, tout = _tokens(system + user), _tokens(text)
+    return kind, {
+        "id": resp_id, "object": "response", "created_at": int(time.time()),
+        "model": request.get("model"), "status": "completed", "parallel_tool_calls": True,
+        "tool_choice": "auto", "tools": [],
+        "output": [{"type": "message", "id": "msg_1", "role": "assistant", "status": "completed",
+                    "content": [{"type": "output_text", "text": text, "annotations": []}]}],
+        "usage": {"input_tokens": tin, "output_tokens": tout, "total_tokens": tin + tout,
+                  "input_tokens_details": {"cached_tokens": 0},
+                  "output_tokens_details": {"reasoning_tokens": 0}},
+    }
+
+def create_app(cfg: FakeConfig, stats: FakeStats) -> FastAPI:
+    app = FastAPI(title="fake-openai")
+    rng = random.Random(cfg.seed)
+
+    async def delay(out_tokens: int) -> None:
+        base = cfg.latency_median_ms * math.exp(cfg.latency_sigma * rng.gauss(0, 1))
+        await asyncio.sleep((base + cfg.ms_per_output_token * out_tokens) / 1000)
+
+    def maybe_429() -> Optional[JSONResponse]:
+        stats.requests += 1
+        if cfg.error_429_rate and rng.random() < cfg.error_429_rate:
+            stats.rate_limited += 1
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after": str(cfg.retry_after_sec)},
+                content={"error": {"message": "Rate limit reached (fake)", "type": "requests", "code": "rate_limit_exceeded"}},
+            )
+        return None
+
+    def account(kind: str, tin: int, tout: int) -> None:
+        stats.input_tokens += tin
+        stats.output_tokens += tout
+        stats.by_kind[kind] = stats.by_kind.get(kind, 0) + 1
+
+    @app.post("/v1/responses")
+    async def responses(request: Request):
+        limited = maybe_429()
+        if limited is not None:
+            return limited
+        kind, resp = responses_body(await request.json(), rng, f"resp_{stats.requests}")
+        tin, tout = resp["usage"]["input_tokens"], resp["usage"]["output_tokens"]
+        await delay(tout)
+        account(kind, tin, tout)
+        return resp
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        limited = maybe_429()
+        if limited is not None:
+            return limited
+        body = await request.json()
+        tin = _tokens("".join(m.get("content") or "" for m in body.get("messages", [])))
+        answer = "기사에 따르면 관계 기관이 대책을 발표했어요. 기사에는 없지만 일반적으로는 후속 점검이 이어져요."
+        tout = _tokens(answer)
+        usage = {"prompt_tokens": tin, "completion_tokens": tout, "total_tokens": tin + tout}
+        account("chat", tin, tout)
+        base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": body.get("model")}
+
+        if not body.get("stream"):
+            await delay(tout)
+            return {**base, "object": "chat.completion", "usage": usage,
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": answer}}]}
+
+        async def events():
+            await delay(0)                                  # 첫 토큰까지
+            for piece in re.findall(r"\S+\s*", answer):
+                await asyncio.sleep(cfg.ms_per_output_token * _tokens(piece) / 1000)
+                chunk = {**base, "object": "chat.completion.chunk",
+                         "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield f"data: {json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [], 'usage': usage})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+class FakeOpenAIServer:
+    """별도 스레드(자체 이벤트 루프)에서 uvicorn으로 띄운다. 벤치 대상 앱의 루프와 분리하기 위함."""
+
+    def __init__(self, cfg: FakeConfig):
+        self.cfg = cfg
+        self.stats = FakeStats()
+        self.port = _free_port()
+        self._server = uvicorn.Server(uvicorn.Config(
+            create_app(cfg, self.stats), host="127.0.0.1", port=self.port,
+            log_level="warning", access_log=False,
+        ))
+        self._thread = threading.Thread(target=self._server.run, name="fake-openai", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        self._server.should_exit = True
+        self._thread.join(timeout=5)
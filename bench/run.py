@@ -0,0 +1,242 @@
+"""
+로컬 가짜 OpenAI 서버를 띄우고 main.app을 직접 호출해 처리량/지연을 잰다. (실제 쿼터 사용 없음)
+
+    python -m bench.run --articles 60 --batch-sizes 1,5,20 --concurrency 1,4,8
+    python -m bench.run --save-baseline bench/baseline.json
+    python -m bench.run --baseline bench/baseline.json          # 저장된 기준과 비교
+
+batch-size 1은 /v1/rewrite-summarize3, 그 이상은 /v1/rewrite-batch3로 보낸다.
+concurrency는 동시에 열어 두는 클라이언트 요청 수. 서버 쪽 기사 워커 수(BATCH_ARTICLE_WORKERS)는
+--article-concurrency로, AIMD 동시 호출 한도는 --aimd-initial/--aimd-max(--no-aimd로 끔)로 바꿀 수 있다.
+실행 끝에 모델별 최종 한도와 조절 횟수를 출력한다.
+"""
+import argparse, asyncio, json, os, statistics, sys, tempfile, time
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.fake_openai import FakeConfig, FakeOpenAIServer
+from bench.corpus import build_corpus
+
+def _pct(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    vs = sorted(values)
+    k = min(len(vs) - 1, max(0, int(round(p / 100 * (len(vs) - 1)))))
+    return round(vs[k], 1)
+
+class LoopLagMonitor:
+    """interval마다 깨어나 예정보다 늦게 깨어난 만큼을 이벤트 루프 지연으로 기록한다."""
+
+    def __init__(self, interval_sec: float = 0.01):
+        self.interval = interval_sec
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        while True:
+            t0 = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, (time.perf_counter() - t0 - self.interval) * 1000))
+
+    def start(self) -> None:
+        self.samples = []
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+async def run_scenario(client, corpus: List[Dict[str, str]], batch_size: int, concurrency: int) -> Dict[str, Any]:
+    if batch_size <= 1:
+        requests = [("/v1/rewrite-summarize3", a, 1) for a in corpus]
+    else:
+        requests = [("/v1/rewrite-batch3", {"items": corpus[i:i + batch_size]}, len(corpus[i:i + batch_size]))
+                    for i in range(0, len(corpus), batch_size)]
+
+    latencies: List[float] = []
+    tokens: List[int] = []
+    errors = 0
+    queue: asyncio.Queue = asyncio.Queue()
+    for r in requests:
+        queue.put_nowait(r)
+
+    def collect(data: Dict[str, Any]) -> None:
+        used = data["tokensUsedTotal"]
+        tokens.append(used["input"] + used["output"])
+
+    async def worker() -> None:
+        nonlocal errors
+        while not queue.empty():
+            path, payload, _n = queue.get_nowait()
+            t0 = time.perf_counter()
+            resp = await client.post(path, json=payload)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            if resp.status_code != 200:
+                errors += _n
+                continue
+            body = resp.json()
+            if batch_size <= 1:
+                collect(body)
+            else:
+                for item in body["results"]:
+                    if item["ok"]:
+                        collect(item["data"])
+                    else:
+                        errors += 1
+
+    lag = LoopLagMonitor()
+    lag.start()
+    t0 = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    wall = time.perf_counter() - t0
+    await lag.stop()
+
+    return {
+        "batchSize": batch_size,
+        "concurrency": concurrency,
+        "articles": len(corpus),
+        "errors": errors,
+        "wallSec": round(wall, 2),
+        "articlesPerSec": round(len(corpus) / wall, 2) if wall else 0.0,
+        "requestLatencyMs": {"p50": _pct(latencies, 50), "p95": _pct(latencies, 95), "p99": _pct(latencies, 99)},
+        "loopLagMs": {"p99": _pct(lag.samples, 99), "max": round(max(lag.samples, default=0.0), 1)},
+        "tokensPerArticle": round(statistics.mean(tokens), 1) if tokens else 0.0,
+    }
+
+def _scenario_key(r: Dict[str, Any]) -> str:
+    return f"b{r['batchSize']}-c{r['concurrency']}"
+
+def print_report(results: List[Dict[str, Any]], baseline: Optional[Dict[str, Any]]) -> None:
+    base = {k: v for k, v in (baseline or {}).get("scenarios", {}).items()}
+    header = f"{'scenario':<10}{'art/s':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'lag99':>8}{'tok/art':>9}{'err':>5}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        lat = r["requestLatencyMs"]
+        line = (f"{_scenario_key(r):<10}{r['articlesPerSec']:>8}{lat['p50']:>9}{lat['p95']:>9}{lat['p99']:>9}"
+                f"{r['loopLagMs']['p99']:>8}{r['tokensPerArticle']:>9}{r['errors']:>5}")
+        b = base.get(_scenario_key(r))
+        if b:
+            def delta(cur: float, old: float) -> str:
+                return f"{(cur - old) / old * 100:+.0f}%" if old else "n/a"
+            line += (f"   vs baseline: art/s {delta(r['articlesPerSec'], b['articlesPerSec'])}"
+                     f", p95 {delta(lat['p95'], b['requestLatencyMs']['p95'])}"
+                     f", tok/art {delta(r['tokensPerArticle'], b['tokensPerArticle'])}")
+        print(line)
+
+def _ints(s: str) -> List[int]:
+    return [int(x) for x in s.split(",") if x.strip()]
+
+def parse_args(argv=None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Article Rewriter API 로컬 벤치마크")
+    p.add_argument("--articles", type=int, default=40)
+    p.add_argument("--batch-sizes", type=_ints, default=[1, 5, 20])
+    p.add_argument("--concurrency", type=_ints, default=[1, 4])
+    p.add_argument("--article-concurrency", type=int, help="settings.BATCH_ARTICLE_WORKERS 덮어쓰기")
+    p.add_argument("--aimd-initial", type=int, help="settings.AIMD_INITIAL_LIMIT 덮어쓰기")
+    p.add_argument("--aimd-max", type=int, help="settings.AIMD_MAX_LIMIT 덮어쓰기")
+    p.add_argument("--no-aimd", action="store_true", help="AIMD 동시성 조절 끄기 (토큰 버킷만)")
+    p.add_argument("--latency-ms", type=float, default=600.0, help="가짜 서버 지연 중앙값")
+    p.add_argument("--latency-sigma", type=float, default=0.4)
+    p.add_argument("--ms-per-token", type=float, default=4.0)
+    p.add_argument("--error-429-rate", type=float, default=0.0)
+    p.add_argument("--rpm", type=int, default=10_000, help="서비스 측 RPM 한도 (기본은 사실상 무제한)")
+    p.add_argument("--tpm", type=int, default=10_000_000)
+    p.add_argument("--generation-mode", choices=["per_style", "fused"], default=None)
+    p.add_argument("--epi-mode", choices=["llm", "fast", "hybrid"], default=None)
+    p.add_argument("--cache", action="store_true", help="결과 캐시 사용 (기본은 꺼서 매번 호출)")
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--baseline", help="비교할 기준 JSON")
+    p.add_argument("--save-baseline", help="이번 결과를 기준 JSON으로 저장")
+    p.add_argument("--json", help="결과 JSON 저장 경로")
+    return p.parse_args(argv)
+
+async def run_suite(args: argparse.Namespace, fake: FakeOpenAIServer) -> List[Dict[str, Any]]:
+    import httpx
+    import main as app_main
+    from settings import settings
+
+    if args.article_concurrency:
+        settings.BATCH_ARTICLE_WORKERS = args.article_concurrency
+    if args.aimd_initial:
+        settings.AIMD_INITIAL_LIMIT = args.aimd_initial
+    if args.aimd_max:
+        settings.AIMD_MAX_LIMIT = args.aimd_max
+    if args.no_aimd:
+        settings.AIMD_ENABLED = False
+    if args.generation_mode:
+        settings.GENERATION_MODE = args.generation_mode
+    if args.epi_mode:
+        settings.EPI_MODE = args.epi_mode
+
+    corpus = build_corpus(args.articles, seed=args.seed)
+    results = []
+    async with app_main.app.router.lifespan_context(app_main.app):
+        transport = httpx.ASGITransport(app=app_main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for bs in args.batch_sizes:
+                for c in args.concurrency:
+                    before = fake.stats.rate_limited
+                    r = await run_scenario(client, corpus, bs, c)
+                    r["fake429"] = fake.stats.rate_limited - before
+                    results.append(r)
+    return results
+
+def print_concurrency() -> None:
+    from concurrency import concurrency_stats
+    for model, snap in concurrency_stats()["models"].items():
+        ups = sum(1 for d in snap["recentDecisions"] if d["decision"] == "increase")
+        downs = sum(1 for d in snap["recentDecisions"] if d["decision"] == "decrease")
+        print(f"aimd {model}: limit {snap['limit']} (min {snap['minLimit']}, max {snap['maxLimit']}), "
+              f"recent +{ups} / -{downs}")
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    fake = FakeOpenAIServer(FakeConfig(
+        latency_median_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        ms_per_output_token=args.ms_per_token,
+        error_429_rate=args.error_429_rate,
+        seed=args.seed,
+    )).start()
+
+    # settings는 import 시점에 env를 읽으므로 main 모듈을 불러오기 전에 채운다
+    tmp = tempfile.mkdtemp(prefix="bench-")
+    os.environ.update({
+        "OPENAI_API_KEY": "sk-bench",
+        "OPENAI_BASE_URL": fake.base_url,
+        "CACHE_ENABLED": "true" if args.cache else "false",
+        "CACHE_DB_PATH": "",
+        "NEAR_DUP_MODE": "off",     # 앞 시나리오 결과를 재사용하면 측정이 안 된다
+        "JOB_DB_PATH": os.path.join(tmp, "jobs.sqlite3"),
+        "CHECKPOINT_DB_PATH": os.path.join(tmp, "checkpoints.sqlite3"),
+        "CHAT_PRECOMPUTE_DB_PATH": os.path.join(tmp, "chat_answers.sqlite3"),
+        "MODEL_RATE_LIMITS": json.dumps({os.environ.get("MODEL_NAME", "gpt-4.1"): {"rpm": args.rpm, "tpm": args.tpm}}),
+    })
+    try:
+        results = asyncio.run(run_suite(args, fake))
+    finally:
+        fake.stop()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+    print(f"\nfake server: {fake.stats.requests} requests, {fake.stats.rate_limited} x 429, calls by kind {fake.stats.by_kind}")
+    print_concurrency()
+
+    report = {
+        "createdAt": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("baseline", "save_baseline", "json")},
+        "scenarios": {_scenario_key(r): r for r in results},
+    }
+    for path in filter(None, (args.save_baseline, args.json)):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"saved {path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import hashlib, json, os, re, sqlite3, threading, time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from settings import settings
+from telemetry import to_thread
+
+_WS_RE = re.compile(r"\s+")
+
+def normalize_title(title: str) -> str:
+    return _WS_RE.sub(" ", (title or "").strip()).lower()
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+def make_key(stage: str, title: str, body: str, style: str, prompt_text: str,
+             temperature: float, model: Optional[str] = None) -> str:
+    """
+    (정규화 제목, MAX_BODY_CHARS로 자른 본문, 스타일, 프롬프트 해시, 모델, temperature)로 만든 내용 주소 키.
+    stage는 같은 입력이라도 단계(summary/epi/quiz)별로 키를 분리하기 위한 네임스페이스.
+    """
+    payload = json.dumps([
+        stage,
+        normalize_title(title),
+        (body or "")[:settings.MAX_BODY_CHARS],
+        style,
+        text_hash(prompt_text),
+        model or settings.MODEL_NAME,
+        float(temperature),
+    ], ensure_ascii=False)
+    return text_hash(payload)
+
+class ResultCache:
+    """
+    2계층 결과 캐시.
+      1) 프로세스 내 LRU (항목 수 + TTL 만료)
+      2) 로컬 SQLite (재시작 후에도 유지, 같은 TTL)
+    메모리 미스 -> SQLite 조회 -> 있으면 메모리로 승격.
+    """
+
+    def __init__(self, max_entries: int, ttl_sec: float, db_path: Optional[str]):
+        self.max_entries = max_entries
+        self.ttl_sec = ttl_sec
+        self._mem: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self.hits = self.misses = self.disk_hits = 0
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    # ----- 메모리 계층 -----
+    def _mem_get(self, key: str) -> Optional[Any]:
+        item = self._mem.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.time():
+            del self._mem[key]
+            return None
+        self._mem.move_to_end(key)
+        return value
+
+    def _mem_set(self, key: str, value: Any, expires_at: float) -> None:
+        self._mem[key] = (expires_at, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    # ----- SQLite 계층 (짧은 블로킹 I/O라 스레드로 넘김) -----
+    def _db_get(self, key: str) -> Optional[Tuple[float, Any]]:
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < time.time():
+                self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+        return row[1], json.loads(row[0])
+
+    def _db_set(self, key: str, value: Any, expires_at: float) -> None:
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO results (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), expires_at),
+            )
+            self._db.commit()
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = self._mem_get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        if self._db is not None:
+            row = await to_thread("cache_get", self._db_get, key)
+            if row is not None:
+                expires_at, value = row
+                self._mem_set(key, value, expires_at)
+                self.hits += 1
+                self.disk_hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: Any) -> None:
+        """value는 JSON 직렬화 가능해야 한다. (튜플은 리스트로 저장됨)"""
+        expires_at = time.time() + self.ttl_sec
+        value = json.loads(json.dumps(value, ensure_ascii=False))
+        self._mem_set(key, value, expires_at)
+        if self._db is not None:
+            await to_thread("cache_set", self._db_set, key, value, expires_at)
+
+    def _db_delete(self, key: str) -> None:
+        with self._db_lock:
+            self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+            self._db.commit()
+
+    async def delete(self, key: str) -> None:
+        self._mem.pop(key, None)
+        if self._db is not None:
+            await to_thread("cache_delete", self._db_delete, key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "memoryEntries": len(self._mem),
+            "hits": self.hits,
+            "diskHits": self.disk_hits,
+            "misses": self.misses,
+        }
+
+    def close(self) -> None:
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
+
+_cache: Optional[ResultCache] = None
+
+def get_cache() -> Optional[ResultCache]:
+    """CACHE_ENABLED=False면 None."""
+    global _cache
+    if _cache is None and settings.CACHE_ENABLED:
+        _cache = ResultCache(
+            max_entries=settings.CACHE_MAX_ENTRIES,
+            ttl_sec=settings.CACHE_TTL_SEC,
+            db_path=settings.CACHE_DB_PATH or None,
+        )
+    return _cache
+
+def close_cache() -> None:
+    global _cache
+    if _cache is not None:
+        _cache.close()
+        _cache = None
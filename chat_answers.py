@@ -0,0 +1,68 @@
+import json, re, unicodedata
+from typing import Any, Dict, Optional
+from settings import settings
+from cache import ResultCache, text_hash
+from telemetry import CHAT_PRECOMPUTED
+
+# 추천 질문 답변 미리 만들기: 독자 대부분이 재작성 결과의 추천 질문 4개를 그대로 눌러 첫 턴(기록 없음)으로 묻는다.
+# 재작성이 끝나면 백그라운드에서 (articleId, 정규화 질문, 요약 해시)별 답변을 만들어 두고,
+# chat_about_article은 같은 첫 턴 질문이 오면 모델 호출 없이 바로 돌려준다. (없으면 평소대로 모델 호출)
+
+_SPACES = re.compile(r"\s+")
+_TRAILING = re.compile(r"[\s?？!！.。~]+$")
+
+def normalize_question(question: str) -> str:
+    """NFKC -> 소문자 -> 공백 하나로 -> 끝 문장부호 제거 (띄어쓰기/물음표 차이 무시)"""
+    text = unicodedata.normalize("NFKC", question or "").lower()
+    return _TRAILING.sub("", _SPACES.sub(" ", text).strip())
+
+class ChatAnswerStore:
+    """미리 만든 첫 턴 답변 (ResultCache와 같은 메모리 LRU + SQLite). 값은 {"answer", "model"}"""
+
+    def __init__(self, max_entries: int, ttl_sec: float, db_path: Optional[str]):
+        self._store = ResultCache(max_entries=max_entries, ttl_sec=ttl_sec, db_path=db_path)
+
+    @staticmethod
+    def _key(article_id: str, question: str, summary: str) -> str:
+        # 요약이 바뀌면(다른 스타일/재생성) 답변 근거가 달라지므로 요약 해시까지 키에 넣는다
+        return text_hash(json.dumps(
+            ["chat_answer", article_id, normalize_question(question), text_hash(summary.strip())],
+            ensure_ascii=False))
+
+    async def get(self, article_id: str, question: str, summary: str) -> Optional[Dict[str, Any]]:
+        return await self._store.get(self._key(article_id, question, summary))
+
+    async def lookup(self, article_id: str, question: str, summary: str) -> Optional[Dict[str, Any]]:
+        """대화 첫 턴 조회 (적중/미스 집계)"""
+        hit = await self.get(article_id, question, summary)
+        CHAT_PRECOMPUTED.inc(outcome="hit" if hit is not None else "miss")
+        return hit
+
+    async def set(self, article_id: str, question: str, summary: str, answer: str, model: str) -> None:
+        await self._store.set(self._key(article_id, question, summary), {"answer": answer, "model": model})
+        CHAT_PRECOMPUTED.inc(outcome="stored")
+
+    def stats(self) -> Dict[str, Any]:
+        return self._store.stats()
+
+    def close(self) -> None:
+        self._store.close()
+
+_answers: Optional[ChatAnswerStore] = None
+
+def get_chat_answers() -> Optional[ChatAnswerStore]:
+    """CHAT_PRECOMPUTE_ENABLED=False면 None."""
+    global _answers
+    if _answers is None and settings.CHAT_PRECOMPUTE_ENABLED:
+        _answers = ChatAnswerStore(
+            max_entries=settings.CHAT_PRECOMPUTE_MAX_ENTRIES,
+            ttl_sec=settings.CHAT_PRECOMPUTE_TTL_SEC,
+            db_path=settings.CHAT_PRECOMPUTE_DB_PATH or None,
+        )
+    return _answers
+
+def close_chat_answers() -> None:
+    global _answers
+    if _answers is not None:
+        _answers.close()
+        _answers = None
@@ -0,0 +1,110 @@
+import asyncio, time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional, Set, Tuple
+from settings import settings
+from schemas import ChatMessage
+from rate_limiter import estimate_tokens
+from llm_client import summarize_chat_history
+from scheduler import set_priority
+
+@dataclass
+class ChatSession:
+    summary: str = ""                                     # 기사 요약 (첫 요청 또는 갱신 시 저장)
+    turns: List[ChatMessage] = field(default_factory=list)  # 최근 대화 창 (토큰 예산 이내)
+    history_summary: str = ""                             # 창 밖으로 밀려난 이전 대화의 누적 요약
+    updated_at: float = field(default_factory=time.time)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+def _turns_tokens(turns: List[ChatMessage]) -> int:
+    return sum(estimate_tokens(t.content) + 4 for t in turns)
+
+class ChatSessionStore:
+    """
+    (articleId, userId)별 대화 기록을 서버에 보관한다.
+    - 최근 턴은 CHAT_HISTORY_TOKEN_BUDGET 안에서 그대로 유지
+    - 예산을 넘긴 오래된 턴은 LLM으로 누적 요약(history_summary)에 접어 넣는다
+    -> 대화가 길어져도 턴당 입력 크기가 거의 일정하다.
+    세션 수는 CHAT_SESSION_MAX(LRU), 유휴 세션은 CHAT_SESSION_TTL_SEC 뒤 만료.
+    """
+
+    def __init__(self, max_sessions: int, ttl_sec: float, token_budget: int):
+        self.max_sessions = max_sessions
+        self.ttl_sec = ttl_sec
+        self.token_budget = token_budget
+        self._sessions: "OrderedDict[Tuple[str, str], ChatSession]" = OrderedDict()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def get(self, article_id: str, user_id: str) -> ChatSession:
+        key = (article_id, user_id)
+        now = time.time()
+        sess = self._sessions.get(key)
+        if sess is None or now - sess.updated_at > self.ttl_sec:
+            sess = self._sessions[key] = ChatSession()
+        self._sessions.move_to_end(key)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return sess
+
+    def apply_request(self, sess: ChatSession, summary: Optional[str],
+                      history: Optional[List[ChatMessage]]) -> None:
+        """
+        요청에 요약/기록이 오면 세션 값을 교체. history=[]는 새 대화(서버 기록을 비움),
+        history를 아예 빼면 서버 기록을 이어 쓴다. 요약이 한 번도 없었다면 ValueError.
+        """
+        if summary:
+            sess.summary = summary
+        if history is not None:
+            sess.turns = list(history)
+            sess.history_summary = ""
+        if not sess.summary:
+            raise ValueError("기사 요약(summary)이 없습니다. 첫 요청에는 summary를 함께 보내세요.")
+
+    def record(self, sess: ChatSession, user_msg: str, answer: str) -> None:
+        sess.turns.append(ChatMessage(role="user", content=user_msg))
+        sess.turns.append(ChatMessage(role="assistant", content=answer))
+        sess.updated_at = time.time()
+
+    def over_budget(self, sess: ChatSession) -> bool:
+        return _turns_tokens(sess.turns) > self.token_budget
+
+    def schedule_compaction(self, sess: ChatSession) -> None:
+        """응답을 늦추지 않도록 압축은 백그라운드에서. (다음 턴은 세션 락에서 기다린다)"""
+        if not self.over_budget(sess):
+            return
+        task = asyncio.create_task(self.compact(sess))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def compact(self, sess: ChatSession) -> None:
+        """
+        예산을 넘는 만큼 오래된 턴(user/assistant 쌍 단위)을 떼어 누적 요약에 합친다.
+        요약 호출이 실패하면 요약 없이 잘라내기만 한다. (다음 턴 입력이 커지는 것보다 낫다)
+        """
+        set_priority("chat")   # 다음 턴이 세션 락에서 기다리므로 대화와 같은 우선순위 (백그라운드 태스크 안)
+        async with sess.lock:
+            if not self.over_budget(sess):
+                return
+            fold: List[ChatMessage] = []
+            # 예산의 절반까지 줄여 매 턴마다 요약 호출이 일어나지 않게 한다
+            while sess.turns and _turns_tokens(sess.turns) > self.token_budget // 2:
+                fold.extend(sess.turns[:2])
+                del sess.turns[:2]
+            if not fold:
+                return
+            try:
+                sess.history_summary = await summarize_chat_history(sess.history_summary, fold)
+            except Exception:
+                pass
+
+_store: Optional[ChatSessionStore] = None
+
+def get_session_store() -> ChatSessionStore:
+    global _store
+    if _store is None:
+        _store = ChatSessionStore(
+            max_sessions=settings.CHAT_SESSION_MAX,
+            ttl_sec=settings.CHAT_SESSION_TTL_SEC,
+            token_budget=settings.CHAT_HISTORY_TOKEN_BUDGET,
+        )
+    return _store
@@ -0,0 +1,81 @@
+import json
+from typing import Any, Dict, Optional, Set
+from settings import settings
+from cache import ResultCache, text_hash
+
+class ArticleCheckpoint:
+    """
+    기사 1건(articleId)의 LLM 스테이지 결과를 스테이지 이름별로 모은다.
+    값마다 내용 주소 키(make_key)를 함께 두어, 제목/본문/프롬프트가 바뀐 재요청에는 쓰지 않는다.
+    """
+
+    def __init__(self, article_id: str, saved: Optional[Dict[str, Any]] = None):
+        self.article_id = article_id
+        self._saved: Dict[str, Any] = saved or {}     # 이전 시도에서 저장된 {stage: {"key", "value"}}
+        self._fresh: Dict[str, Any] = {}              # 이번 시도에서 끝난 스테이지
+        self.resumed: Set[str] = set()
+
+    def get(self, stage: str, key: str) -> Optional[Any]:
+        rec = self._saved.get(stage)
+        if rec is None or rec.get("key") != key:
+            return None
+        self.resumed.add(stage)
+        return rec["value"]
+
+    def record(self, stage: str, key: str, value: Any) -> None:
+        self._fresh[stage] = {"key": key, "value": value}
+
+    def merged(self) -> Dict[str, Any]:
+        return {**{s: self._saved[s] for s in self.resumed}, **self._fresh}
+
+class CheckpointStore:
+    """
+    스테이지 체크포인트 (ResultCache와 같은 메모리 LRU + SQLite, 기사 ID당 레코드 1개).
+    기사의 일부 스테이지가 실패하면 그때까지 끝난(비용을 낸) 스테이지 결과를 저장해 두고,
+    같은 기사를 다시 요청하면 빠진 스테이지만 실행한다. 기사가 끝까지 성공하면 지운다.
+    정상 경로의 비용은 기사당 조회 1회뿐이다. (쓰기는 실패 시, 삭제는 이어서 성공했을 때만)
+    """
+
+    def __init__(self, max_entries: int, ttl_sec: float, db_path: Optional[str]):
+        self._store = ResultCache(max_entries=max_entries, ttl_sec=ttl_sec, db_path=db_path)
+
+    @staticmethod
+    def _key(article_id: str) -> str:
+        return text_hash(json.dumps(["checkpoint", article_id], ensure_ascii=False))
+
+    async def load(self, article_id: str) -> ArticleCheckpoint:
+        return ArticleCheckpoint(article_id, await self._store.get(self._key(article_id)))
+
+    async def save(self, ckpt: ArticleCheckpoint) -> None:
+        merged = ckpt.merged()
+        if merged:
+            await self._store.set(self._key(ckpt.article_id), merged)
+
+    async def clear(self, ckpt: ArticleCheckpoint) -> None:
+        if ckpt.resumed:
+            await self._store.delete(self._key(ckpt.article_id))
+
+    def stats(self) -> Dict[str, Any]:
+        return self._store.stats()
+
+    def close(self) -> None:
+        self._store.close()
+
+_checkpoints: Optional[CheckpointStore] = None
+
+def get_checkpoints() -> Optional[CheckpointStore]:
+    """CHECKPOINT_ENABLED=False면 None."""
+    global _checkpoints
+    if _checkpoints is None and settings.CHECKPOINT_ENABLED:
+        _checkpoints = CheckpointStore(
+            max_entries=settings.CHECKPOINT_MAX_ENTRIES,
+            ttl_sec=settings.CHECKPOINT_TTL_SEC,
+            db_path=settings.CHECKPOINT_DB_PATH or None,
+        )
+    return _checkpoints
+
+def close_checkpoints() -> None:
+    global _checkpoints
+    if _checkpoints is not None:
+        _checkpoints.close()
+        _checkpoints = None
@@ -0,0 +1,132 @@
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+from openai import APIStatusError, APITimeoutError
+from settings import settings
+from telemetry import AIMD_DECISIONS, AIMD_IN_FLIGHT, AIMD_LIMIT
+
+# 모델별 동시 LLM 호출 수를 AIMD로 조절한다.
+# 지연/오류가 정상이면 한도를 천천히(가산) 올리고, 429/5xx/타임아웃이나 지연 급증이면 곱으로 줄인다.
+# RPM/TPM 토큰 버킷(rate_limiter)은 그대로 두고, 그 위에서 "동시에 몇 개를 띄울지"만 정한다.
+# 기다리는 호출의 순서는 scheduler가 정하고, 여기는 한도와 진행 중 개수만 관리한다.
+
+class _Slot:
+    __slots__ = ("started", "key")
+
+    def __init__(self, key: str):
+        self.started = time.monotonic()
+        self.key = key
+
+def _signal(e: BaseException) -> Optional[str]:
+    """줄여야 하는 실패면 사유, 아니면 None (취소/형식 오류 등은 판단에 쓰지 않는다)"""
+    if isinstance(e, APITimeoutError):
+        return "timeout"
+    if isinstance(e, APIStatusError):
+        if e.status_code == 429:
+            return "429"
+        if e.status_code >= 500:
+            return "5xx"
+    return None
+
+class AdaptiveConcurrency:
+    def __init__(self, name: str, initial: int, min_limit: int, max_limit: int):
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(self.max_limit, max(self.min_limit, initial)))
+        self.in_flight = 0
+        self.listeners: List[Callable[[], None]] = []   # 자리가 날 때 (scheduler가 다음 호출을 고르게)
+        self._baseline: Dict[str, float] = {}    # 스테이지 종류별 정상 지연 EWMA (초)
+        self._samples: Dict[str, int] = {}
+        self._ratio = 1.0                        # 최근 지연 / 기준 (빠른 EWMA, 스테이지 종류 무관)
+        self._last_decrease = 0.0
+        self.decisions: Deque[Dict[str, Any]] = deque(maxlen=settings.AIMD_DECISION_LOG)
+        AIMD_LIMIT.set(int(self.limit), model=name)
+
+    @property
+    def current(self) -> int:
+        return int(self.limit)
+
+    def has_room(self) -> bool:
+        return self.in_flight < self.current
+
+    def take(self, key: str) -> _Slot:
+        """자리가 있는지는 부르는 쪽(scheduler)이 has_room()으로 확인한다."""
+        self.in_flight += 1
+        AIMD_IN_FLIGHT.set(self.in_flight, model=self.name)
+        return _Slot(key)
+
+    def finish(self, slot: _Slot, error: Optional[BaseException] = None) -> None:
+        """호출 결과로 한도를 조절하고 자리를 돌려준다."""
+        if error is None:
+            self.on_success(slot, time.monotonic() - slot.started)
+        else:
+            reason = _signal(error)
+            if reason:
+                self.on_failure(slot, reason)
+        self.in_flight -= 1
+        AIMD_IN_FLIGHT.set(self.in_flight, model=self.name)
+        for fn in self.listeners:
+            fn()
+
+    def _decide(self, decision: str, reason: str, before: int) -> None:
+        after = self.current
+        AIMD_LIMIT.set(after, model=self.name)
+        AIMD_DECISIONS.inc(model=self.name, decision=decision, reason=reason)
+        self.decisions.append({"at": round(time.time(), 3), "decision": decision, "reason": reason,
+                               "from": before, "to": after, "inFlight": self.in_flight})
+
+    def on_success(self, slot: _Slot, seconds: float) -> None:
+        base = self._baseline.get(slot.key)
+        n = self._samples.get(slot.key, 0)
+        if base is not None and n >= settings.AIMD_MIN_SAMPLES:
+            # 한 건의 느린 응답(출력 길이 차이 등)이 아니라 최근 호출들이 함께 느려질 때만 급증으로 본다
+            self._ratio += settings.AIMD_RATIO_ALPHA * (seconds / base - self._ratio)
+            if self._ratio > settings.AIMD_LATENCY_SPIKE_FACTOR:
+                self._ratio = 1.0
+                self.on_failure(slot, "latency")
+                return
+            if seconds > base * settings.AIMD_LATENCY_SPIKE_FACTOR:
+                return   # 느려진 표본은 기준에 넣지 않는다
+        self._baseline[slot.key] = seconds if base is None else base + settings.AIMD_EWMA_ALPHA * (seconds - base)
+        self._samples[slot.key] = n + 1
+        if self.in_flight < self.current:
+            return   # 한도를 다 쓰지 않는 동안에는 올리지 않는다 (부하 없이 한도만 커지는 것 방지)
+        before = self.current
+        # 한도만큼 성공하면 +AIMD_INCREASE (왕복 1회당 가산)
+        self.limit = min(float(self.max_limit), self.limit + settings.AIMD_INCREASE / self.limit)
+        if self.current > before:
+            self._decide("increase", "healthy", before)
+
+    def on_failure(self, slot: _Slot, reason: str) -> None:
+        # 지난 감소 이전에 출발한 호출의 신호는 이미 반영된 혼잡이므로 한 번만 줄인다
+        if slot.started < self._last_decrease:
+            return
+        before = self.current
+        self.limit = max(float(self.min_limit), self.limit * settings.AIMD_DECREASE_FACTOR)
+        self._last_decrease = time.monotonic()
+        self._decide("decrease", reason, before)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "limit": self.current,
+            "limitExact": round(self.limit, 3),
+            "minLimit": self.min_limit,
+            "maxLimit": self.max_limit,
+            "inFlight": self.in_flight,
+            "latencyRatio": round(self._ratio, 3),
+            "baselineSec": {k: round(v, 3) for k, v in self._baseline.items()},
+            "recentDecisions": list(self.decisions),
+        }
+
+_controllers: Dict[str, AdaptiveConcurrency] = {}
+
+def get_concurrency(model: str) -> AdaptiveConcurrency:
+    ctl = _controllers.get(model)
+    if ctl is None:
+        ctl = _controllers[model] = AdaptiveConcurrency(
+            model, settings.AIMD_INITIAL_LIMIT, settings.AIMD_MIN_LIMIT, settings.AIMD_MAX_LIMIT)
+    return ctl
+
+def concurrency_stats() -> Dict[str, Any]:
+    return {"enabled": settings.AIMD_ENABLED, "models": {m: c.snapshot() for m, c in _controllers.items()}}
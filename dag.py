@@ -0,0 +1,100 @@
+import asyncio, time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+from telemetry import span, stage_scope
+
+# 스테이지 함수는 선행 스테이지 결과(dict[name -> result])를 받아 코루틴을 반환한다.
+StageFn = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+@dataclass
+class Stage:
+    name: str
+    fn: StageFn
+    deps: List[str] = field(default_factory=list)
+
+class StageSkipped(Exception):
+    """선행 스테이지가 실패해 실행하지 않은 스테이지"""
+
+    def __init__(self, stage: str, failed_dep: str):
+        super().__init__(f"선행 스테이지 실패: {failed_dep}")
+        self.stage = stage
+        self.failed_dep = failed_dep
+
+@dataclass
+class DagRun:
+    results: Dict[str, Any]
+    timings: Dict[str, Tuple[float, float]]   # name -> (시작, 종료) 초 단위(monotonic)
+    wall_ms: int
+    errors: Dict[str, Exception] = field(default_factory=dict)   # fail_fast=False일 때 실패/건너뛴 스테이지
+
+    def duration_ms(self, name: str) -> int:
+        s, e = self.timings[name]
+        return int((e - s) * 1000)
+
+async def run_dag(stages: List[Stage], fail_fast: bool = True) -> DagRun:
+    """
+    의존성이 풀리는 즉시 각 스테이지를 실행한다.
+    (예: 스타일별 요약이 끝나는 순간 해당 스타일의 EPI가 시작)
+    fail_fast=True면 어느 스테이지든 실패하는 즉시 나머지를 취소하고 첫 예외를 그대로 올린다.
+    False면 실패한 스테이지에 의존하는 것만 건너뛰고(StageSkipped) 나머지는 끝까지 돌린 뒤
+    실패를 DagRun.errors에 담아 돌려준다. (이미 비용을 낸 독립 스테이지 결과를 버리지 않기 위함)
+    """
+    by_name = {st.name: st for st in stages}
+    for st in stages:
+        for d in st.deps:
+            if d not in by_name:
+                raise ValueError(f"알 수 없는 선행 스테이지: {st.name} -> {d}")
+
+    results: Dict[str, Any] = {}
+    timings: Dict[str, Tuple[float, float]] = {}
+    tasks: Dict[str, asyncio.Task] = {}
+
+    errors: Dict[str, Exception] = {}
+
+    async def run_stage(st: Stage):
+        if st.deps:
+            await asyncio.gather(*(tasks[d] for d in st.deps), return_exceptions=not fail_fast)
+            failed = next((d for d in st.deps if d in errors), None)
+            if failed is not None:
+                raise StageSkipped(st.name, failed)
+        t0 = time.monotonic()
+        # 스테이지 안의 LLM 호출/파싱 실패는 이 스테이지 이름으로 집계된다
+        with stage_scope(st.name), span("stage", stage=st.name):
+            out = await st.fn({d: results[d] for d in st.deps})
+        timings[st.name] = (t0, time.monotonic())
+        results[st.name] = out
+        return out
+
+    async def run_stage_partial(st: Stage):
+        try:
+            return await run_stage(st)
+        except Exception as e:
+            errors[st.name] = e
+            raise
+
+    t_start = time.monotonic()
+    # 위상 순서와 무관하게 태스크를 먼저 모두 등록해야 deps 조회가 가능
+    for st in stages:
+        coro = run_stage(st) if fail_fast else run_stage_partial(st)
+        tasks[st.name] = asyncio.create_task(coro, name=f"stage:{st.name}")
+    try:
+        await asyncio.gather(*tasks.values(), return_exceptions=not fail_fast)
+    except BaseException:
+        for t in tasks.values():
+            t.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        raise
+    return DagRun(results, timings, int((time.monotonic() - t_start) * 1000), errors)
+
+def critical_path_ms(stages: List[Stage], durations: Dict[str, int]) -> int:
+    """스테이지별 지연(ms)으로 가장 긴 의존 체인의 합을 구한다."""
+    by_name = {st.name: st for st in stages}
+    memo: Dict[str, int] = {}
+
+    def finish(name: str) -> int:
+        if name not in memo:
+            st = by_name[name]
+            memo[name] = durations.get(name, 0) + max((finish(d) for d in st.deps), default=0)
+        return memo[name]
+
+    return max((finish(st.name) for st in stages), default=0)
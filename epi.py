@@ -0,0 +1,44 @@
+from typing import Any, Dict, Mapping, Sequence
+
+# EPI_SYSTEM_PROMPT의 [점수식]을 그대로 옮긴 것
+EPI_KEYS = ("S", "SUBJ", "K", "F", "C", "V", "X", "EVID")
+EPI_WEIGHTS = {
+    "S": 0.20, "SUBJ": 0.10, "K": 0.20, "F": 0.15,
+    "C": 0.10, "V": 0.10, "X": 0.10, "EVID": -0.15,
+}
+_RAW_MIN, _RAW_MAX = -0.15, 0.85
+
+def validate_components(comp: Mapping[str, Any], side: str,
+                        keys: Sequence[str] = EPI_KEYS) -> Dict[str, float]:
+    """컴포넌트(기본 8개)가 모두 0~1 범위인지 확인하고 float dict로 돌려준다."""
+    out: Dict[str, float] = {}
+    for k in keys:
+        v = float(comp.get(k, 0))
+        if not (0.0 <= v <= 1.0):
+            raise ValueError(f"EPI 컴포넌트 범위 오류: {side}.{k}={v}")
+        out[k] = v
+    return out
+
+def epi_score(comp: Mapping[str, float]) -> int:
+    """EPI_raw(-0.15~0.85)를 0~100으로 선형변환 후 clamp."""
+    raw = sum(EPI_WEIGHTS[k] * float(comp.get(k, 0)) for k in EPI_KEYS)
+    scaled = (raw - _RAW_MIN) / (_RAW_MAX - _RAW_MIN) * 100
+    return int(round(min(100.0, max(0.0, scaled))))
+
+def reduction_pct(epi_orig: int, epi_sum: int) -> float:
+    """감소율 = max(0, (EPI_orig - EPI_sum) / max(EPI_orig, 1e-6)) * 100"""
+    return round(max(0.0, (epi_orig - epi_sum) / max(epi_orig, 1e-6)) * 100, 1)
+
+def build_epi_result(comp_orig: Mapping[str, float], comp_sum: Mapping[str, float], reason: str) -> Dict[str, Any]:
+    """원문/요약 컴포넌트로 EpiResult 필드를 로컬 계산한다. (원문 점수는 기사당 1회 산출한 값을 공유)"""
+    epi_orig, epi_sum = epi_score(comp_orig), epi_score(comp_sum)
+    pct = reduction_pct(epi_orig, epi_sum)
+    return {
+        "epiOriginal": epi_orig,
+        "epiSummary": epi_sum,
+        "reductionPct": pct,
+        "stimulationReduced": f"자극도를 {round(pct)}% 줄였어요",
+        "componentsOriginal": {k: float(comp_orig[k]) for k in EPI_KEYS},
+        "componentsSummary":  {k: float(comp_sum[k])  for k in EPI_KEYS},
+        "reason": reason,
+    }
@@ -0,0 +1,119 @@
+import math, re
+from bisect import bisect_right
+from typing import Dict, List, Mapping, Sequence
+
+from epi import EPI_KEYS
+
+# LLM 없이 로컬에서 계산하는 EPI 컴포넌트 (fast 모드는 전부, hybrid 모드는 LLM_KEYS 외 나머지)
+LOCAL_MODEL = "local-lexicon"
+LLM_KEYS = ("S", "SUBJ", "F")           # hybrid 모드에서 LLM 심사관에게 맡기는 컴포넌트
+
+# 컴포넌트별 어휘/패턴. 하나의 결합 정규식으로 컴파일하므로 카테고리끼리 겹치지 않게 둔다.
+# (앞쪽 카테고리가 우선 매칭되므로 더 구체적인 패턴을 먼저)
+_LEXICON: Dict[str, Sequence[str]] = {
+    # C: 클릭베이트 패턴
+    "C": [
+        r"알고\s?보니", r"이것만\s?보면", r"소름", r"충격적\s?(?:진실|근황|반전)", r"결국\s?[.…]+",
+        r"무슨\s?일이", r"정체는", r"반전", r"이유는\s?\?", r"[가-힣]+했다\s?\?!", r"경악할",
+        r"난리\s?난", r"한\s?번\s?보면", r"모르면\s?손해",
+    ],
+    # K: 선정/과장 어휘
+    "K": [
+        r"충격", r"경악", r"초유의?", r"역대급", r"참혹", r"끔찍", r"대참사", r"아비규환",
+        r"발칵", r"초비상", r"쇼킹", r"어마어마", r"살벌", r"섬뜩", r"폭탄\s?발언", r"핵폭탄급",
+        r"미쳤다", r"레전드",
+    ],
+    # V: 피해화 동사
+    "V": [
+        r"짓밟[혔히았]?", r"털렸", r"유린", r"학대", r"희생[되된당]", r"당했", r"농락", r"착취",
+        r"갑질", r"폭행당", r"뒤통수", r"피해를\s?입",
+    ],
+    # X: 과장/구두점 남용
+    "X": [
+        r"[!！]{2,}", r"[?？]{2,}", r"[!?！？]{2,}", r"…{2,}|\.{4,}", r"ㅋ{2,}|ㅎ{2,}|ㅠ{2,}|ㅜ{2,}",
+        r"[A-Z]{4,}", r"['\"“”‘’]{2,}",
+    ],
+    # S: 감정 강도
+    "S": [
+        r"격분", r"분노", r"오열", r"통곡", r"절규", r"비탄", r"분통", r"울분", r"참담", r"망연자실",
+        r"눈물바다", r"치를\s?떨", r"피눈물",
+    ],
+    # SUBJ: 주관성(단정/추측/평가)
+    "SUBJ": [
+        r"분명히", r"아마(?:도)?", r"확실히", r"소위", r"라고\s?본다", r"것으로\s?보인다", r"틀림없이",
+        r"당연히", r"어처구니", r"황당", r"한심", r"마땅히", r"그야말로", r"이른바",
+    ],
+    # F: 공포·분노 프레이밍
+    "F": [
+        r"위협", r"불안", r"공포", r"위기", r"비상", r"경고", r"붕괴", r"재앙", r"폭락", r"테러",
+        r"대란", r"패닉", r"공황",
+    ],
+    # EVID: 근거(숫자/출처/직접 인용) — 많을수록 높음
+    "EVID": [
+        r"\d+(?:[.,]\d+)?\s?(?:%|퍼센트|명|건|원|달러|억|만|천|년|월|일|시|mm|km|kg)",
+        r"에\s?따르면", r"밝혔다", r"발표했", r"설명했", r"통계", r"조사\s?결과", r"연구\s?결과",
+        r"관계자는", r"“[^”\x00]{2,}”|\"[^\"\x00]{2,}\"",
+    ],
+}
+
+# 문장당 출현율 -> 0~1 포화 변환 계수 (1 - exp(-scale * rate))
+_SCALE = {"S": 1.2, "SUBJ": 1.2, "K": 1.5, "F": 1.0, "C": 2.0, "V": 1.5, "X": 2.0, "EVID": 0.8}
+
+# 카테고리를 named group으로 묶은 단일 정규식 (한 번의 스캔으로 모든 컴포넌트 집계)
+_COMBINED = re.compile("|".join(
+    f"(?P<{key}>{'|'.join(patterns)})" for key, patterns in _LEXICON.items()
+))
+_SENT_END = re.compile(r"[.!?。…]+|\n+")
+
+_COMPONENT_NAMES = {
+    "S": "감정 강도", "SUBJ": "주관적 표현", "K": "선정·과장 어휘", "F": "공포·분노 프레이밍",
+    "C": "클릭베이트 표현", "V": "피해화 동사", "X": "과장 구두점",
+}
+
+def _to_components(counts: Mapping[str, int], n_sent: int) -> Dict[str, float]:
+    n = max(1, n_sent)
+    return {
+        k: round(min(1.0, 1.0 - math.exp(-_SCALE[k] * counts.get(k, 0) / n)), 1)
+        for k in EPI_KEYS
+    }
+
+def score_text(text: str) -> Dict[str, float]:
+    """텍스트 1개의 8개 컴포넌트(0~1, 소수 1자리)."""
+    return score_batch([text])[0]
+
+def score_batch(texts: Sequence[str]) -> List[Dict[str, float]]:
+    """
+    여러 텍스트를 구분자로 이어 붙여 결합 정규식 1회 스캔으로 채점한다.
+    매칭 위치를 텍스트 경계에 이분 탐색으로 배정하므로 배치 전체가 O(총 길이).
+    """
+    if not texts:
+        return []
+    sep = "\x00"   # 어떤 패턴/문장 경계와도 매칭되지 않는 구분자
+    starts, pos = [], 0
+    for t in texts:
+        starts.append(pos)
+        pos += len(t) + len(sep)
+    joined = sep.join(texts)
+
+    counts: List[Dict[str, int]] = [dict() for _ in texts]
+    for m in _COMBINED.finditer(joined):
+        i = bisect_right(starts, m.start()) - 1
+        c = counts[i]
+        c[m.lastgroup] = c.get(m.lastgroup, 0) + 1
+
+    sentences = [0] * len(texts)
+    for m in _SENT_END.finditer(joined):
+        sentences[bisect_right(starts, m.start()) - 1] += 1
+
+    return [_to_components(c, n) for c, n in zip(counts, sentences)]
+
+def local_reason(comp_orig: Mapping[str, float], comp_sum: Mapping[str, float]) -> str:
+    """원문 대비 많이 줄어든 컴포넌트로 '자극도 감소 이유'를 만든다."""
+    dropped = sorted(
+        ((comp_orig[k] - comp_sum[k], k) for k in _COMPONENT_NAMES if comp_orig[k] - comp_sum[k] >= 0.1),
+        reverse=True,
+    )[:2]
+    if not dropped:
+        return "원문과 비교해 자극 요소의 큰 변화는 없어요."
+    names = ", ".join(_COMPONENT_NAMES[k] for _, k in dropped)
+    return f"원문에 있던 {names} 요소가 요약에서 줄었어요."
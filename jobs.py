@@ -0,0 +1,270 @@
+import asyncio, os, sqlite3, threading, time, uuid
+from typing import List, Optional, Tuple
+from settings import settings
+from schemas import (RewriteBatchRequest, RewriteBatchItemIn, RewriteBatchItemMultiResult,
+                     RewriteOptions, JobStatus)
+from pipeline import process_batch_item
+from scheduler import set_priority
+from telemetry import request_id_var, to_thread
+
+class JobStore:
+    """
+    배치 잡/아이템 상태를 로컬 SQLite에 저장한다.
+    아이템 상태: pending -> running -> done | failed
+    running 아이템은 가져간 프로세스(owner)와 임대 만료 시각(lease_until)을 가진다. 같은 DB 파일을 여러
+    프로세스가 써도 조건부 UPDATE로 한 곳만 가져가고, 처리 중에는 임대를 연장한다.
+    임대가 끝난 running 아이템(죽은 프로세스가 남긴 것)만 다시 가져간다. (done은 다시 하지 않음)
+    """
+
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.owner = uuid.uuid4().hex
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    created_at REAL NOT NULL,
+                    options TEXT
+                );
+                CREATE TABLE IF NOT EXISTS job_items (
+                    job_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    article_id TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    result TEXT,
+                    owner TEXT,
+                    lease_until REAL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (job_id, idx)
+                );
+                CREATE INDEX IF NOT EXISTS job_items_status ON job_items (status, job_id, idx);
+            """)
+            self._db.commit()
+
+    def create_job(self, payload: RewriteBatchRequest) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, created_at, options) VALUES (?, ?, ?)",
+                (job_id, now, payload.pipeline_options().model_dump_json()),
+            )
+            self._db.executemany(
+                "INSERT INTO job_items (job_id, idx, article_id, title, body, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [(job_id, i, it.articleId, it.title, it.body, now) for i, it in enumerate(payload.items)],
+            )
+            self._db.commit()
+        return job_id
+
+    def reset_running(self) -> int:
+        """임대가 끝난 running 아이템(죽은 프로세스가 남긴 것)을 pending으로 복구. 살아 있는 프로세스 것은 그대로."""
+        with self._lock:
+            cur = self._db.execute(
+                "UPDATE job_items SET status = 'pending', owner = NULL, lease_until = NULL"
+                " WHERE status = 'running' AND (lease_until IS NULL OR lease_until < ?)",
+                (time.time(),),
+            )
+            self._db.commit()
+            return cur.rowcount
+
+    def claim_next(self) -> Optional[Tuple[str, int, RewriteBatchItemIn, RewriteOptions]]:
+        """
+        가장 오래된 잡의 다음 pending(또는 임대가 끝난 running) 아이템을 이 프로세스 임대로 가져온다.
+        다른 프로세스가 먼저 가져갔으면(rowcount 0) 다음 후보로.
+        """
+        with self._lock:
+            while True:
+                now = time.time()
+                row = self._db.execute(
+                    "SELECT i.job_id, i.idx, i.article_id, i.title, i.body, j.options, i.status, i.lease_until"
+                    " FROM job_items i JOIN jobs j ON j.id = i.job_id"
+                    " WHERE i.status = 'pending' OR (i.status = 'running' AND i.lease_until < ?)"
+                    " ORDER BY j.created_at, i.idx LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is None:
+                    return None
+                job_id, idx, article_id, title, body, options, status, lease = row
+                # 조회 이후 상태가 그대로일 때만 가져간다 (다른 프로세스와의 경쟁은 여기서 갈린다)
+                cur = self._db.execute(
+                    "UPDATE job_items SET status = 'running', owner = ?, lease_until = ?, updated_at = ?"
+                    " WHERE job_id = ? AND idx = ? AND status = ? AND lease_until IS ?",
+                    (self.owner, now + settings.JOB_LEASE_SEC, now, job_id, idx, status, lease),
+                )
+                self._db.commit()
+                if cur.rowcount == 1:
+                    break
+        opts = RewriteOptions.model_validate_json(options) if options else RewriteOptions()
+        return job_id, idx, RewriteBatchItemIn(articleId=article_id, title=title, body=body), opts
+
+    def renew(self, job_id: str, idx: int) -> bool:
+        """처리 중인 아이템의 임대 연장. 이미 임대를 잃었으면 False"""
+        with self._lock:
+            cur = self._db.execute(
+                "UPDATE job_items SET lease_until = ? WHERE job_id = ? AND idx = ? AND status = 'running' AND owner = ?",
+                (time.time() + settings.JOB_LEASE_SEC, job_id, idx, self.owner),
+            )
+            self._db.commit()
+            return cur.rowcount == 1
+
+    def release(self, job_id: str, idx: int) -> None:
+        """종료로 처리를 멈춘 아이템을 바로 pending으로 (임대 만료를 기다리지 않게)"""
+        with self._lock:
+            self._db.execute(
+                "UPDATE job_items SET status = 'pending', owner = NULL, lease_until = NULL"
+                " WHERE job_id = ? AND idx = ? AND status = 'running' AND owner = ?",
+                (job_id, idx, self.owner),
+            )
+            self._db.commit()
+
+    def complete(self, job_id: str, idx: int, result: RewriteBatchItemMultiResult) -> None:
+        """임대를 가진 경우에만 기록 (임대가 끝나 다른 프로세스가 가져갔으면 그쪽 결과를 쓴다)"""
+        with self._lock:
+            self._db.execute(
+                "UPDATE job_items SET status = ?, result = ?, owner = NULL, lease_until = NULL, updated_at = ?"
+                " WHERE job_id = ? AND idx = ? AND status = 'running' AND owner = ?",
+                ("done" if result.ok else "failed", result.model_dump_json(), time.time(), job_id, idx, self.owner),
+            )
+            self._db.commit()
+
+    def requeue_failed(self, job_id: str) -> int:
+        """failed 아이템을 pending으로 되돌린다. 되돌린 개수."""
+        with self._lock:
+            cur = self._db.execute(
+                "UPDATE job_items SET status = 'pending', result = NULL, updated_at = ?"
+                " WHERE job_id = ? AND status = 'failed'",
+                (time.time(), job_id),
+            )
+            self._db.commit()
+            return cur.rowcount
+
+    def status(self, job_id: str) -> Optional[JobStatus]:
+        with self._lock:
+            job = self._db.execute("SELECT created_at FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            counts = dict(self._db.execute(
+                "SELECT status, COUNT(*) FROM job_items WHERE job_id = ? GROUP BY status", (job_id,)
+            ).fetchall())
+            updated = self._db.execute(
+                "SELECT MAX(updated_at) FROM job_items WHERE job_id = ?", (job_id,)
+            ).fetchone()[0]
+        total = sum(counts.values())
+        done, failed = counts.get("done", 0), counts.get("failed", 0)
+        pending, running = counts.get("pending", 0), counts.get("running", 0)
+        if done + failed == total:
+            state = "completed"
+        elif running or done or failed:
+            state = "running"
+        else:
+            state = "queued"
+        return JobStatus(
+            jobId=job_id, status=state, total=total,
+            done=done, failed=failed, pending=pending, running=running,
+            progressPct=round((done + failed) * 100.0 / total, 1) if total else 100.0,
+            createdAt=job[0], updatedAt=updated or job[0],
+        )
+
+    def results(self, job_id: str, offset: int, limit: int) -> List[RewriteBatchItemMultiResult]:
+        """완료(done/failed)된 아이템 결과를 idx 순으로 페이지 단위 조회."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT result FROM job_items WHERE job_id = ? AND result IS NOT NULL"
+                " ORDER BY idx LIMIT ? OFFSET ?",
+                (job_id, limit, offset),
+            ).fetchall()
+        return [RewriteBatchItemMultiResult.model_validate_json(r[0]) for r in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+class JobRunner:
+    """JOB_WORKERS개의 백그라운드 워커가 JobStore의 pending 아이템을 하나씩 처리한다."""
+
+    def __init__(self, store: JobStore, workers: int):
+        self.store = store
+        self.n_workers = workers
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        # 죽은 프로세스가 처리 중이던 아이템부터 이어서
+        await to_thread("jobs_reset", self.store.reset_running)
+        self._tasks = [asyncio.create_task(self._worker(), name=f"job-worker-{i}")
+                       for i in range(self.n_workers)]
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, payload: RewriteBatchRequest) -> str:
+        job_id = await to_thread("jobs_create", self.store.create_job, payload)
+        self._wakeup.set()
+        return job_id
+
+    async def retry_failed(self, job_id: str) -> int:
+        n = await to_thread("jobs_requeue", self.store.requeue_failed, job_id)
+        if n:
+            self._wakeup.set()
+        return n
+
+    async def _worker(self) -> None:
+        set_priority("offline")   # 잡은 뒤에서 채우는 작업: 대화/단건/동기 배치가 남긴 여유만 쓴다
+        while True:
+            claimed = await to_thread("jobs_claim", self.store.claim_next)
+            if claimed is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=settings.JOB_POLL_INTERVAL_SEC)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            job_id, idx, item, options = claimed
+            request_id_var.set(f"job:{job_id}:{idx}")
+            heartbeat = asyncio.create_task(self._renew(job_id, idx))
+            try:
+                result = await process_batch_item(item, options)
+            except asyncio.CancelledError:
+                # 종료: 다른 프로세스(또는 다음 기동)가 바로 이어받게 돌려놓는다
+                self.store.release(job_id, idx)
+                raise
+            finally:
+                heartbeat.cancel()
+            await to_thread("jobs_complete", self.store.complete, job_id, idx, result)
+
+    async def _renew(self, job_id: str, idx: int) -> None:
+        """처리하는 동안 임대의 1/3마다 연장"""
+        while True:
+            await asyncio.sleep(settings.JOB_LEASE_SEC / 3)
+            if not await to_thread("jobs_renew", self.store.renew, job_id, idx):
+                return
+
+_runner: Optional[JobRunner] = None
+
+async def start_jobs() -> JobRunner:
+    global _runner
+    if _runner is None:
+        _runner = JobRunner(JobStore(settings.JOB_DB_PATH), settings.JOB_WORKERS)
+        await _runner.start()
+    return _runner
+
+async def stop_jobs() -> None:
+    global _runner
+    if _runner is not None:
+        await _runner.stop()
+        _runner.store.close()
+        _runner = None
+
+def get_runner() -> JobRunner:
+    if _runner is None:
+        raise RuntimeError("잡 러너가 시작되지 않았습니다.")
+    return _runner
@@ -1,13 +1,32 @@
-import json, time
-from typing import Any, List, Tuple, Dict, Literal
-from openai import OpenAI
-from settings import settings
+import asyncio, json, time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, List, Optional, Tuple, Dict, Literal, Sequence, TypeVar
+import httpx
+from openai import AsyncOpenAI, APIStatusError
+from settings import settings, StageRoute
+from telemetry import (LLM_RESILIENCE, PARSE_FAILURES, current_stage, record_llm_call,
+                       span, stage_scope, stage_var)
+from resilience import (DeadlineExceeded, call_timeout, deadline_scope, enforce_deadline, hedged, remaining,
+                        with_retries)
+from rate_limiter import Reservation, get_limiter, estimate_tokens
+from scheduler import admit, get_scheduler, scheduled
+from chat_answers import get_chat_answers
+from epi import EPI_KEYS, validate_components
 from prompts import (TITLE_SUMMARY_USER_TEMPLATE,
+                     TITLE_SUMMARY_FUSED_SYSTEM_TEMPLATE,
+                     TITLE_SUMMARY_FUSED_USER_TEMPLATE,
+                     SEGMENT_SUMMARY_SYSTEM_PROMPT,
+                     SEGMENT_SUMMARY_USER_TEMPLATE,
+                     TITLE_SUMMARY_REDUCE_USER_TEMPLATE,
+                     JSON_REPAIR_SYSTEM_PROMPT,
                      QUESTIONS_SYSTEM_PROMPT,
                      QUESTIONS_USER_TEMPLATE,
                      CHAT_SYSTEM_PROMPT,
+                     CHAT_HISTORY_SUMMARY_PROMPT,
                      EPI_SYSTEM_PROMPT,
-                     EPI_USER_TEMPLATE,
+                     EPI_ORIGINAL_USER_TEMPLATE,
+                     EPI_SUMMARIES_USER_TEMPLATE,
                      TITLE_SUMMARY_SYSTEM_PROMPT_CONCISE,
                      TITLE_SUMMARY_SYSTEM_PROMPT_FRIENDLY,
                      TITLE_SUMMARY_SYSTEM_PROMPT_NEUTRAL,
@@ -15,6 +34,96 @@ from prompts import (TITLE_SUMMARY_USER_TEMPLATE,
 
 NewsStyle = Literal["CONCISE", "FRIENDLY", "NEUTRAL"]
 
+# 단계별 temperature (결과 캐시 키에도 포함)
+SUMMARY_TEMPERATURE = 0.6
+QUIZ_TEMPERATURE = 0.6
+EPI_TEMPERATURE = 0.2   # 평가 일관성 위해 낮게
+SEGMENT_TEMPERATURE = 0.2   # 긴 기사 구간 요약은 사실 보존 위주
+
+@dataclass(frozen=True)
+class Route:
+    """스테이지 1회 호출의 모델/파라미터. models는 시도 순서 (작은 모델 -> 큰 모델), 마지막이 최종 모델."""
+    models: Tuple[str, ...]
+    temperature: float
+    max_output_tokens: int
+
+    @property
+    def model(self) -> str:
+        return self.models[-1]
+
+    @property
+    def tag(self) -> str:
+        return ">".join(self.models)
+
+def resolve_route(stage: str, temperature: float, max_output_tokens: int,
+                  items: int = 1, cascade: bool = True) -> Route:
+    """
+    settings.MODEL_ROUTES에서 스테이지 이름("summary:CONCISE") -> 종류("summary") 순으로 찾는다.
+    temperature/max_output_tokens는 라우트에 없을 때의 기본값. items는 한 호출로 여러 스타일을 받는 경우의 개수.
+    cascade=False(평문 출력 등 검증할 게 없는 호출)면 작은 모델을 거치지 않는다.
+    """
+    kind = stage.partition(":")[0]
+    r = settings.MODEL_ROUTES.get(stage) or settings.MODEL_ROUTES.get(kind) or StageRoute()
+    model = r.model or settings.MODEL_NAME
+    models: Tuple[str, ...] = (model,)
+    if cascade and settings.MODEL_CASCADE_ENABLED and r.cheap_model and r.cheap_model != model:
+        models = (r.cheap_model, model)
+    return Route(
+        models=models,
+        temperature=temperature if r.temperature is None else r.temperature,
+        max_output_tokens=r.max_output_tokens * items if r.max_output_tokens else max_output_tokens,
+    )
+
+def cache_route(stage: str, temperature: float) -> Tuple[float, str]:
+    """결과 캐시 키용 (실제 temperature, 모델 태그). 라우트가 바뀌면 키도 바뀐다."""
+    route = resolve_route(stage, temperature, 0)
+    return route.temperature, route.tag
+
+# 오프라인 일괄 처리(offline_batch.BatchCollector)가 설정돼 있으면 responses 호출을 바로 보내지 않고
+# Batch API 요청으로 모았다가 결과 파일에서 받는다. (재시도/헤지/리미터는 거치지 않음)
+offline_collector_var: ContextVar[Optional[Any]] = ContextVar("offline_collector", default=None)
+
+# 프로세스 전역 AsyncOpenAI 클라이언트 (FastAPI lifespan에서 생성/종료)
+_client: AsyncOpenAI | None = None
+
+def init_client() -> AsyncOpenAI | None:
+    """
+    커넥션 풀(keep-alive)을 공유하는 AsyncOpenAI 클라이언트를 1회 생성한다.
+    API 키가 없으면 만들지 않는다. (헬스체크 등은 키 없이도 떠야 하므로)
+    """
+    global _client
+    if _client is None and settings.OPENAI_API_KEY:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY_SEC,
+            ),
+            timeout=httpx.Timeout(
+                settings.OPENAI_TIMEOUT_SEC,
+                connect=settings.OPENAI_CONNECT_TIMEOUT_SEC,
+            ),
+        )
+        _client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL,
+            http_client=http_client,
+            max_retries=settings.OPENAI_MAX_RETRIES,
+        )
+    return _client
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+def get_client() -> AsyncOpenAI:
+    client = init_client()
+    if client is None:
+        raise RuntimeError("OPENAI_API_KEY가 비어 있습니다. .env 또는 환경변수를 확인하세요.")
+    return client
+
 def _style_to_prompt(style: NewsStyle) -> str:
     mapping = {
         "CONCISE":  TITLE_SUMMARY_SYSTEM_PROMPT_CONCISE,
@@ -42,6 +151,7 @@ def _parse_json_block(text: str) -> dict[str, Any]:
     s, e = text.find("{"), text.rfind("}")
     if s == -1 or e == -1 or e <= s:
         snippet = text.strip().replace("\n", "\\n")
+        PARSE_FAILURES.inc(stage=current_stage()[0])
         raise ValueError(f"LLM 출력에서 JSON을 찾지 못함: '{snippet[:180]}'")
 
     raw = text[s:e+1].strip()
@@ -50,6 +160,7 @@ def _parse_json_block(text: str) -> dict[str, Any]:
     except json.JSONDecodeError as ex:
         # 어디서 깨졌는지 보여주기 위해 원본 일부를 detail에 포함
         preview = raw[:400].replace("\n", "\\n")
+        PARSE_FAILURES.inc(stage=current_stage()[0])
         raise ValueError(f"JSON 파싱 실패: {ex}. 원본 일부: '{preview}'")
 
 def _extract_output_text(resp) -> str:
@@ -72,193 +183,594 @@ def _normalize_yes_no(val: str) -> str:
         return "NO"
     raise ValueError(f"quiz.answer가 YES/NO가 아님: {val!r}")
 
-def call_llm(title: str, body: str, system_prompt: str) -> Tuple[str, str, int, int, str, int]:
-    # (기존 함수 시그니처 변경: system_prompt 인자를 받도록)
-    if not settings.OPENAI_API_KEY:
-        raise RuntimeError("OPENAI_API_KEY가 비어 있습니다. .env 또는 환경변수를 확인하세요.")
-    client = OpenAI(api_key=settings.OPENAI_API_KEY)
+def _failure_outcome(e: Exception) -> str:
+    return "rate_limited" if getattr(e, "status_code", None) == 429 else "error"
 
-    user_prompt = TITLE_SUMMARY_USER_TEMPLATE.format(
-        title=title, body=body[:settings.MAX_BODY_CHARS]
+async def _create_response(system_prompt: str, user_prompt: str, temperature: float, max_output_tokens: int,
+                           model: Optional[str] = None) -> Tuple[str, int, int, str, int]:
+    """
+    공용 클라이언트로 responses.create 호출.
+    429/5xx/타임아웃이면 요청 기한 안에서 백오프 후 다시 시도한다. (매 시도 리미터 재예약)
+    반환: (text, input_tokens, output_tokens, model, latency_ms)
+    """
+    collector = offline_collector_var.get()
+    if collector is not None:
+        return await collector.submit(response_params(system_prompt, user_prompt, temperature, max_output_tokens, model))
+    return await with_retries(
+        lambda: _create_response_once(system_prompt, user_prompt, temperature, max_output_tokens, model)
     )
-    t0 = time.time()
-    resp = client.responses.create(
-        model=settings.MODEL_NAME,
-        input=[
+
+def response_params(system_prompt: str, user_prompt: str, temperature: float, max_output_tokens: int,
+                    model: Optional[str] = None) -> Dict[str, Any]:
+    """responses.create 요청 본문 (온라인 호출과 Batch API 요청 파일이 같은 것을 쓴다)"""
+    return {
+        "model": model or settings.MODEL_NAME,
+        "input": [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt},
         ],
-        temperature=0.6,
-        max_output_tokens=400,
-    )
+        "temperature": temperature,
+        "max_output_tokens": max_output_tokens,
+    }
+
+async def _create_response_once(system_prompt: str, user_prompt: str, temperature: float, max_output_tokens: int,
+                                model: Optional[str] = None) -> Tuple[str, int, int, str, int]:
+    """
+    responses.create 1회 호출.
+    스케줄러에서 차례를 받아 RPM/TPM 리미터에 (프롬프트 추정 + max_output_tokens) 만큼 예약하고
+    AIMD 동시성 슬롯을 잡은 뒤 호출하고, 응답 usage와 x-ratelimit-* 헤더로 정산한다.
+    (지연은 차례를 받은 뒤부터)
+    """
+    client = get_client()
+    model = model or settings.MODEL_NAME
+    limiter = get_limiter(model)
+    est = estimate_tokens(system_prompt) + estimate_tokens(user_prompt) + max_output_tokens
+    async with scheduled(model, est, current_stage()[0]) as reservation:
+        t0 = time.time()
+        try:
+            with span("llm", stage=stage_var.get(), model=model):
+                raw = await client.responses.with_raw_response.create(
+                    **response_params(system_prompt, user_prompt, temperature, max_output_tokens, model),
+                    timeout=call_timeout(),
+                )
+        except asyncio.CancelledError:
+            # 헤지에서 진 호출, 연결 끊김/기한 초과 등: 서버는 이미 처리 중일 수 있으니 예약분을 돌려받지 않는다
+            limiter.settle(reservation, reservation.estimated)
+            record_llm_call(model, 0, 0, 0, "cancelled")
+            raise
+        except APIStatusError as e:
+            limiter.update_from_headers(e.response.headers)
+            limiter.settle(reservation, 0)
+            record_llm_call(model, 0, 0, 0, _failure_outcome(e))
+            raise
+        except Exception as e:
+            limiter.settle(reservation, 0)
+            record_llm_call(model, 0, 0, 0, _failure_outcome(e))
+            raise
+    resp = raw.parse()
     text = _extract_output_text(resp)
     usage = getattr(resp, "usage", None)
     meta_in = getattr(usage, "input_tokens", 0) if usage else 0
     meta_out = getattr(usage, "output_tokens", 0) if usage else 0
-    picked_model = getattr(resp, "model", settings.MODEL_NAME)
+    picked_model = getattr(resp, "model", model)
     latency_ms = int((time.time() - t0) * 1000)
+    limiter.settle(reservation, meta_in + meta_out)
+    limiter.update_from_headers(raw.headers)
+    record_llm_call(picked_model, latency_ms / 1000, meta_in, meta_out)
+    return text, meta_in, meta_out, picked_model, latency_ms
+
+T = TypeVar("T")
+
+# convert가 이 예외를 내면 출력 형식 문제로 보고 교정 재요청
+_FORMAT_ERRORS = (ValueError, KeyError, TypeError, AttributeError)
+
+def _hedge_budget(system_prompt: str, user_prompt: str, max_output_tokens: int,
+                  model: str) -> Callable[[], bool]:
+    """헤지 호출은 기다리는 호출 없이 지금 바로 보낼 수 있을 때만 (기다려서 보내면 헤지 의미가 없다)"""
+    if offline_collector_var.get() is not None:
+        return lambda: False
+    sched = get_scheduler(model)
+    est = estimate_tokens(system_prompt) + estimate_tokens(user_prompt) + max_output_tokens
+    return lambda: sched.can_start_now(est)
+
+async def _call_text(system_prompt: str, user_prompt: str,
+                     temperature: float, max_output_tokens: int) -> Tuple[str, int, int, str, int]:
+    """평문 출력 호출: 라우팅 + 재시도 + 헤지 (검증할 게 없으므로 캐스케이드 없이 최종 모델)"""
+    route = resolve_route(stage_var.get(), temperature, max_output_tokens, cascade=False)
+    return await hedged(
+        lambda: _create_response(system_prompt, user_prompt, route.temperature, route.max_output_tokens, route.model),
+        _hedge_budget(system_prompt, user_prompt, route.max_output_tokens, route.model),
+        key=f"{current_stage()[0]}@{route.model}",
+    )
+
+class OutputFormatError(ValueError):
+    """교정 재요청까지 해도 출력 형식이 맞지 않음. 그때까지 거친 호출의 토큰/지연을 함께 담는다."""
+
+    def __init__(self, error: Exception, tokens_in: int, tokens_out: int, model: str, latency_ms: int):
+        super().__init__(str(error))
+        self.tokens_in = tokens_in
+        self.tokens_out = tokens_out
+        self.model = model
+        self.latency_ms = latency_ms
+
+class _Escalate:
+    """작은 모델 출력이 검증에 실패 -> 다음(큰) 모델로"""
 
-    parsed = _parse_json_block(text)
-    return parsed["newTitle"], parsed["summary"], meta_in, meta_out, picked_model, latency_ms
+    def __init__(self, error: Exception):
+        self.error = error
 
-# 기사당 1번만 질문/퀴즈를 만들기
-def build_variants_for_styles(title: str, body: str, styles: List[NewsStyle]):
+async def _call_json(system_prompt: str, user_prompt: str, temperature: float, max_output_tokens: int,
+                     convert: Callable[[Dict[str, Any]], T], items: int = 1) -> Tuple[T, int, int, str, int]:
     """
-    스타일 리스트에 대해 (제목/요약 + EPI)만 생성하여 variants 배열을 만든다.
-    질문/퀴즈는 여기서 만들지 않는다. (엔드포인트에서 기사당 1회 호출)
-    반환: (variants: List[dict], total_in: int, total_out: int, total_latency: int)
+    JSON 출력 호출: 라우팅 + 캐스케이드 + 재시도 + 헤지 + 교정 재요청.
+    convert는 파싱된 dict를 호출부 결과로 바꾸고, 형식이 맞지 않으면 ValueError/KeyError 등을 낸다.
+    캐스케이드 라우트면 작은 모델부터 호출하고, 검증에 실패하면 큰 모델로 다시 호출한다.
+    최종 모델에서도 실패하면 깨진 출력과 출력 형식만 보내 JSON을 고쳐 받는다(1회).
+    그래도 맞지 않으면 OutputFormatError (쓴 토큰 포함).
+    반환 토큰/지연은 거친 호출 전부의 합, 모델은 결과를 낸 모델.
     """
-    if not styles:
-        return [], 0, 0, 0
-
-    variants: List[Dict[str, Any]] = []
-    total_in = total_out = total_latency = 0
-
-    for style in styles:
-        sys_prompt = _style_to_prompt(style)
-        new_title, summary, in1, out1, model, lat1 = call_llm(title, body, sys_prompt)
-        epi_json, in3, out3, _, lat3, reason = evaluate_epi(title, body, new_title, summary)
-
-        epi = {
-            "epiOriginal": int(epi_json["original"]["EPI"]),
-            "epiSummary": int(epi_json["summary"]["EPI"]),
-            "reductionPct": float(epi_json.get("reductionPct", 0)),
-            "stimulationReduced": str(epi_json.get("stimulationReduced", "자극도를 0% 줄였어요")),
-            "componentsOriginal": {k: float(epi_json["original"][k]) for k in ("S","SUBJ","K","F","C","V","X","EVID")},
-            "componentsSummary":  {k: float(epi_json["summary"][k])  for k in ("S","SUBJ","K","F","C","V","X","EVID")},
-            "reason": reason
-        }
+    route = resolve_route(stage_var.get(), temperature, max_output_tokens, items)
+    stage = current_stage()[0]
+
+    async def attempt(model: str, final: bool):
+        text, tin, tout, served, lat = await _create_response(
+            system_prompt, user_prompt, route.temperature, route.max_output_tokens, model
+        )
+        try:
+            return convert(_parse_json_block(text)), tin, tout, served, lat
+        except _FORMAT_ERRORS as e:
+            if not final:
+                return _Escalate(e), tin, tout, served, lat
+            if not settings.JSON_REPAIR_ENABLED:
+                raise OutputFormatError(e, tin, tout, served, lat) from e
+            LLM_RESILIENCE.inc(stage=stage, event="repair")
+            fixed, rin, rout, _, rlat = await _repair_json(text, user_prompt, e, route.max_output_tokens, model)
+            try:
+                result = convert(_parse_json_block(fixed))
+            except _FORMAT_ERRORS as e2:
+                LLM_RESILIENCE.inc(stage=stage, event="repair_failed")
+                raise OutputFormatError(e2, tin + rin, tout + rout, served, lat + rlat) from e2
+            return result, tin + rin, tout + rout, served, lat + rlat
+
+    spent_in = spent_out = spent_lat = 0
+    for i, model in enumerate(route.models):
+        final = i == len(route.models) - 1
+        try:
+            result, tin, tout, served, lat = await hedged(
+                lambda: attempt(model, final),
+                _hedge_budget(system_prompt, user_prompt, route.max_output_tokens, model),
+                key=f"{stage}@{model}",
+            )
+        except OutputFormatError as e:
+            # 캐스케이드 앞 단계에서 쓴 토큰까지 합쳐서 올린다
+            e.tokens_in += spent_in
+            e.tokens_out += spent_out
+            e.latency_ms += spent_lat
+            raise
+        spent_in, spent_out, spent_lat = spent_in + tin, spent_out + tout, spent_lat + lat
+        if not isinstance(result, _Escalate):
+            return result, spent_in, spent_out, served, spent_lat
+        LLM_RESILIENCE.inc(stage=stage, event="escalate")
+    raise AssertionError("unreachable")
+
+async def _repair_json(bad_text: str, user_prompt: str, error: Exception,
+                       max_output_tokens: int, model: str) -> Tuple[str, int, int, str, int]:
+    # 모든 USER 템플릿은 "출력 ..." 안내와 형식 예시로 끝난다 -> 그 부분만 다시 보낸다 (본문 제외)
+    i = user_prompt.rfind("출력")
+    fmt = user_prompt[i:] if i != -1 else user_prompt[-800:]
+    repair_prompt = f"[출력 형식]\n{fmt}\n\n[오류]\n{error}\n\n[깨진 출력]\n{bad_text}"
+    return await _create_response(JSON_REPAIR_SYSTEM_PROMPT, repair_prompt,
+                                  temperature=0.0, max_output_tokens=max_output_tokens, model=model)
+
+def _title_summary(parsed: Dict[str, Any]) -> Tuple[str, str]:
+    new_title, summary = parsed["newTitle"], parsed["summary"]
+    if not (isinstance(new_title, str) and isinstance(summary, str) and new_title.strip() and summary.strip()):
+        raise ValueError("newTitle/summary가 비었거나 문자열이 아닙니다.")
+    return new_title, summary
+
+async def call_llm(title: str, body: str, system_prompt: str) -> Tuple[str, str, int, int, str, int]:
+    # (기존 함수 시그니처 변경: system_prompt 인자를 받도록)
+    user_prompt = TITLE_SUMMARY_USER_TEMPLATE.format(
+        title=title, body=body[:settings.MAX_BODY_CHARS]
+    )
+    (new_title, summary), meta_in, meta_out, picked_model, latency_ms = await _call_json(
+        system_prompt, user_prompt, temperature=SUMMARY_TEMPERATURE, max_output_tokens=400,
+        convert=_title_summary,
+    )
+    return new_title, summary, meta_in, meta_out, picked_model, latency_ms
 
-        variants.append({
-            "newsStyle": style,
-            "newTitle": new_title.strip(),
-            "summary": summary.strip(),
-            "model": model,
-            "latencyMs": lat1 + lat3,
-            "epi": epi,
-        })
+async def summarize_segment(title: str, segment: str, index: int, total: int) -> Tuple[str, int, int, str, int]:
+    """ 긴 기사 map 단계: 본문 구간 1개를 평문으로 요약 """
+    user_prompt = SEGMENT_SUMMARY_USER_TEMPLATE.format(
+        title=title, segment=segment, index=index + 1, total=total
+    )
+    text, meta_in, meta_out, picked_model, latency_ms = await _call_text(
+        SEGMENT_SUMMARY_SYSTEM_PROMPT, user_prompt,
+        temperature=SEGMENT_TEMPERATURE, max_output_tokens=settings.LONG_DOC_SEGMENT_SUMMARY_MAX_TOKENS,
+    )
+    return text.strip(), meta_in, meta_out, picked_model, latency_ms
+
+def reduce_user_prompt(title: str, segment_summaries: List[str]) -> str:
+    segments = "\n\n".join(f"[{i + 1}] {s}" for i, s in enumerate(segment_summaries))
+    return TITLE_SUMMARY_REDUCE_USER_TEMPLATE.format(title=title, segments=segments)
+
+async def call_llm_reduce(title: str, segment_summaries: List[str], system_prompt: str
+                          ) -> Tuple[str, str, int, int, str, int]:
+    """ 긴 기사 reduce 단계: 구간 요약들로 스타일별 {newTitle, summary} 생성 (call_llm과 같은 반환형) """
+    (new_title, summary), meta_in, meta_out, picked_model, latency_ms = await _call_json(
+        system_prompt, reduce_user_prompt(title, segment_summaries),
+        temperature=SUMMARY_TEMPERATURE, max_output_tokens=400, convert=_title_summary,
+    )
+    return new_title, summary, meta_in, meta_out, picked_model, latency_ms
+
+def fused_system_prompt(styles: List[NewsStyle]) -> str:
+    """요청 스타일의 개별 프롬프트 규칙을 모은 fused SYSTEM 프롬프트 (머리말/JSON 출력 줄은 공통 부분에 한 번만)"""
+    def rules(style: NewsStyle) -> str:
+        lines = _style_to_prompt(style).strip().splitlines()[1:]
+        return "\n".join(line for line in lines if not line.startswith("- 출력은"))
+    return TITLE_SUMMARY_FUSED_SYSTEM_TEMPLATE.format(
+        sections="\n\n".join(f"[{style}]\n{rules(style)}" for style in styles)
+    )
 
-        total_in  += in1 + in3
-        total_out += out1 + out3
-        total_latency += lat1 + lat3
+def fused_user_prompt(title: str, body: str, styles: List[NewsStyle]) -> str:
+    fmt = json.dumps(
+        {s: {"newTitle": "<새로운 한글 제목>", "summary": "<요약: 3~5문장>"} for s in styles},
+        ensure_ascii=False, indent=2,
+    )
+    return TITLE_SUMMARY_FUSED_USER_TEMPLATE.format(
+        title=title, body=body[:settings.MAX_BODY_CHARS], styles=", ".join(styles), format=fmt
+    )
 
-    return variants, total_in, total_out, total_latency
+async def call_llm_fused(title: str, body: str, styles: List[NewsStyle]
+                         ) -> Tuple[Dict[str, Tuple[str, str]], int, int, str, int]:
+    """
+    본문을 1번만 보내 여러 스타일의 {newTitle, summary}를 한 JSON으로 받는다.
+    스타일별로 검증해 통과한 것만 돌려준다. (빠진 스타일은 호출 측에서 call_llm으로 보충)
+    반환: ({style: (newTitle, summary)}, input_tokens, output_tokens, model, latency_ms)
+    """
+    def convert(parsed: Dict[str, Any]) -> Dict[str, Tuple[str, str]]:
+        out: Dict[str, Tuple[str, str]] = {}
+        for style in styles:
+            item = parsed.get(style)
+            if isinstance(item, dict):
+                try:
+                    out[style] = _title_summary(item)
+                except _FORMAT_ERRORS:
+                    pass
+        if not out:
+            # 한 스타일도 못 건졌을 때만 교정 재요청 (일부만 빠지면 호출 측이 개별 보충)
+            raise ValueError("fused 출력에서 유효한 스타일이 없습니다.")
+        return out
+
+    return await _call_json(
+        fused_system_prompt(styles), fused_user_prompt(title, body, styles),
+        temperature=SUMMARY_TEMPERATURE, max_output_tokens=400 * len(styles), convert=convert, items=len(styles),
+    )
 
-def suggest_questions_and_quiz(title: str, body: str) -> Tuple[List[str], Dict[str, str], int, int, str, int]:
+async def suggest_questions_and_quiz(title: str, body: str) -> Tuple[List[str], Dict[str, str], int, int, str, int]:
     """ 질문 4개 + 예/아니오 퀴즈 1개(정답 YES/NO)"""
-    if not settings.OPENAI_API_KEY:
-        raise RuntimeError("OPENAI_API_KEY가 비어 있습니다. .env 또는 환경변수를 확인하세요.")
-    client = OpenAI(api_key=settings.OPENAI_API_KEY)
-
     user_prompt  = QUESTIONS_USER_TEMPLATE.format(
         title=title, body=body[:settings.MAX_BODY_CHARS]
     )
-    t0 = time.time()
-    resp = client.responses.create(
-        model=settings.MODEL_NAME,
-        input=[
-            {"role": "system", "content": QUESTIONS_SYSTEM_PROMPT},
-            {"role": "user", "content": user_prompt},
-        ],
-        temperature=0.6,
-        max_output_tokens=320,
-    )
-    text = _extract_output_text(resp)
-    data = _parse_json_block(text)
-
-    # 후처리: questions 4개 보장, quiz.answer 정상화
-    questions = data.get("questions", [])
-    if not isinstance(questions, list):
-        questions = []
-    questions = [q for q in questions if isinstance(q, str)][:4]
-
-    quiz = data.get("quiz", {})
-    if not isinstance(quiz, dict) or "question" not in quiz or "answer" not in quiz:
-        raise ValueError("quiz 필드가 없거나 형식이 올바르지 않습니다.")
-    quiz = {
-        "question": str(quiz.get("question", "")).strip(),
-        "answer": _normalize_yes_no(str(quiz.get("answer", "")).strip())
-    }
-
-    usage = getattr(resp, "usage", None)
-    meta_in  = getattr(usage, "input_tokens", 0) if usage else 0
-    meta_out = getattr(usage, "output_tokens", 0) if usage else 0
-    picked_model = getattr(resp, "model", settings.MODEL_NAME)
-    latency_ms = int((time.time() - t0) * 1000)
+    def convert(data: Dict[str, Any]) -> Tuple[List[str], Dict[str, str]]:
+        # 후처리: questions 4개 보장, quiz.answer 정상화
+        questions = data.get("questions", [])
+        if not isinstance(questions, list):
+            questions = []
+        questions = [q for q in questions if isinstance(q, str)][:4]
+
+        quiz = data.get("quiz", {})
+        if not isinstance(quiz, dict) or "question" not in quiz or "answer" not in quiz:
+            raise ValueError("quiz 필드가 없거나 형식이 올바르지 않습니다.")
+        quiz = {
+            "question": str(quiz.get("question", "")).strip(),
+            "answer": _normalize_yes_no(str(quiz.get("answer", "")).strip())
+        }
+        return questions, quiz
 
+    (questions, quiz), meta_in, meta_out, picked_model, latency_ms = await _call_json(
+        QUESTIONS_SYSTEM_PROMPT, user_prompt, temperature=QUIZ_TEMPERATURE, max_output_tokens=320,
+        convert=convert,
+    )
     return questions, quiz, meta_in, meta_out, picked_model, latency_ms
 
-def chat_about_article(article_id: str, user_id: str, summary: str, history: list, user_msg: str):
-    client = OpenAI(api_key=settings.OPENAI_API_KEY)
+CHAT_TEMPERATURE = 0.5
+CHAT_MAX_TOKENS = 200
 
+def _chat_messages(article_id: str, summary: str, history: list, user_msg: str,
+                   history_summary: str = "") -> List[Dict[str, str]]:
     messages = [
         {"role": "system", "content": CHAT_SYSTEM_PROMPT},
         {"role": "system", "content": f"[기사ID: {article_id}]"},
         {"role": "system", "content": f"[기사 요약]\n{summary}"}
     ]
+    if history_summary:
+        messages.append({"role": "system", "content": f"[이전 대화 요약]\n{history_summary}"})
 
     for h in history:
         messages.append({"role": h.role, "content": h.content})
 
     messages.append({"role": "user", "content": user_msg})
-
+    return messages
+
+async def _precomputed_answer(article_id: str, summary: str, history: list, user_msg: str,
+                              history_summary: str) -> Optional[Dict[str, Any]]:
+    """대화 첫 턴(기록/누적 요약 없음)이면 미리 만든 추천 질문 답변 조회"""
+    store = get_chat_answers()
+    if store is None or history or history_summary:
+        return None
+    return await store.lookup(article_id, user_msg, summary)
+
+async def chat_about_article(article_id: str, user_id: str, summary: str, history: list, user_msg: str,
+                             history_summary: str = ""):
     t0 = time.time()
-    resp = client.chat.completions.create(
-        model=settings.MODEL_NAME,
-        messages=messages,
-        temperature=0.5,
-        max_tokens=200,
-    )
+    hit = await _precomputed_answer(article_id, summary, history, user_msg, history_summary)
+    if hit is not None:
+        return hit["answer"], hit["model"], int((time.time() - t0) * 1000)
+    messages = _chat_messages(article_id, summary, history, user_msg, history_summary)
+    return await _chat_live(messages)
+
+async def _chat_live(messages: List[Dict[str, str]], priority: str = "chat") -> Tuple[str, str, int]:
+    route = resolve_route("chat", CHAT_TEMPERATURE, CHAT_MAX_TOKENS, cascade=False)
+    with deadline_scope(settings.REQUEST_DEADLINE_SEC):
+        async with enforce_deadline():
+            return await with_retries(lambda: _chat_once(messages, route, priority))
+
+async def precompute_chat_answers(article_id: str, summaries: Sequence[str], questions: Sequence[str]) -> int:
+    """
+    요약 x 추천 질문마다 첫 턴 답변을 만들어 저장한다. 이미 있는 답변은 건너뛰고, 실패한 질문은
+    저장하지 않는다(독자가 물으면 평소대로 모델 호출). 만든 답변 수를 돌려준다.
+    """
+    store = get_chat_answers()
+    if store is None:
+        return 0
+
+    async def answer(summary: str, question: str) -> bool:
+        if await store.get(article_id, question, summary) is not None:
+            return False
+        # 독자가 기다리는 호출이 아니므로 가장 낮은 우선순위로
+        text, model, _ = await _chat_live(_chat_messages(article_id, summary, [], question, ""), "offline")
+        await store.set(article_id, question, summary, text, model)
+        return True
+
+    pairs = {(s, q) for s in summaries if s for q in questions if q}
+    done = await asyncio.gather(*[answer(s, q) for s, q in pairs], return_exceptions=True)
+    return sum(1 for d in done if d is True)
+
+async def _chat_once(messages: List[Dict[str, str]], route: Route, priority: str) -> Tuple[str, str, int]:
+    client = get_client()
+    limiter = get_limiter(route.model)
+    est = sum(estimate_tokens(m["content"]) for m in messages) + route.max_output_tokens
+    async with scheduled(route.model, est, "chat", priority=priority) as reservation:
+        t0 = time.time()
+        try:
+            with span("llm", stage="chat", model=route.model):
+                raw = await client.chat.completions.with_raw_response.create(
+                    model=route.model,
+                    messages=messages,
+                    temperature=route.temperature,
+                    max_tokens=route.max_output_tokens,
+                    timeout=call_timeout(),
+                )
+        except asyncio.CancelledError:
+            limiter.settle(reservation, reservation.estimated)
+            record_llm_call(route.model, 0, 0, 0, "cancelled", stage_name="chat")
+            raise
+        except APIStatusError as e:
+            limiter.update_from_headers(e.response.headers)
+            limiter.settle(reservation, 0)
+            record_llm_call(route.model, 0, 0, 0, _failure_outcome(e), stage_name="chat")
+            raise
+        except Exception as e:
+            limiter.settle(reservation, 0)
+            record_llm_call(route.model, 0, 0, 0, _failure_outcome(e), stage_name="chat")
+            raise
+    resp = raw.parse()
     latency = int((time.time() - t0) * 1000)
+    usage = getattr(resp, "usage", None)
+    limiter.settle(reservation, (usage.prompt_tokens + usage.completion_tokens) if usage else 0)
+    limiter.update_from_headers(raw.headers)
     answer = resp.choices[0].message.content
     model_used = resp.model
+    record_llm_call(model_used, latency / 1000,
+                    usage.prompt_tokens if usage else 0, usage.completion_tokens if usage else 0,
+                    stage_name="chat")
 
     return answer, model_used, latency
 
+async def _next_chunk(chunks: AsyncIterator[Any]) -> Any:
+    """스트림 다음 청크. 요청 기한이 있으면 남은 시간 안에 와야 한다 (스트림 생성 뒤에도 기한을 지킨다)"""
+    left = remaining()
+    if left is None:
+        return await chunks.__anext__()
+    if left <= 0:
+        raise DeadlineExceeded("요청 기한을 넘겼습니다.")
+    try:
+        return await asyncio.wait_for(chunks.__anext__(), timeout=left)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded("요청 기한을 넘겼습니다.") from None
 
-def evaluate_epi(original_title: str, original_body: str, generated_title: str, generated_summary: str) -> Tuple[dict, int, int, str, int, str]:
-    """ 원문 vs 요약 EPI 평가"""
-    if not settings.OPENAI_API_KEY:
-        raise RuntimeError("OPENAI_API_KEY가 비어 있습니다. .env 또는 환경변수를 확인하세요.")
-    client = OpenAI(api_key=settings.OPENAI_API_KEY)
+async def _open_chat_stream(client: AsyncOpenAI, messages: List[Dict[str, str]],
+                            route: Route) -> Tuple[Any, Reservation]:
+    """
+    스트림 생성 1회. 시도마다 스케줄러 차례(토큰 예약)를 받고, 생성이 실패하면 그 예약을 정산한다.
+    스트림은 오래 붙잡으므로 동시성 슬롯 없이 차례만 받는다.
+    """
+    limiter = get_limiter(route.model)
+    reservation = await admit(
+        route.model, sum(estimate_tokens(m["content"]) for m in messages) + route.max_output_tokens,
+        priority="chat",
+    )
+    try:
+        stream = await client.chat.completions.create(
+            model=route.model,
+            messages=messages,
+            temperature=route.temperature,
+            max_tokens=route.max_output_tokens,
+            stream=True,
+            stream_options={"include_usage": True},   # 마지막 청크에 usage 포함
+            timeout=call_timeout(),      # 요청 기한(X-Request-Timeout 등)이 더 짧으면 그쪽
+        )
+    except asyncio.CancelledError:
+        limiter.settle(reservation, reservation.estimated)
+        record_llm_call(route.model, 0, 0, 0, "cancelled", stage_name="chat")
+        raise
+    except APIStatusError as e:
+        limiter.update_from_headers(e.response.headers)
+        limiter.settle(reservation, 0)
+        record_llm_call(route.model, 0, 0, 0, _failure_outcome(e), stage_name="chat")
+        raise
+    except Exception as e:
+        limiter.settle(reservation, 0)
+        record_llm_call(route.model, 0, 0, 0, _failure_outcome(e), stage_name="chat")
+        raise
+    limiter.update_from_headers(stream.response.headers)
+    return stream, reservation
+
+async def stream_chat_about_article(article_id: str, user_id: str, summary: str, history: list, user_msg: str,
+                                    history_summary: str = "") -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    chat_about_article의 스트리밍 버전.
+    ("delta", {"delta": str}) 를 도착하는 대로 내보내고, 마지막에
+    ("done", {answer, model, latencyMs, ttftMs, inputTokens, outputTokens}) 를 내보낸다.
+    """
+    hit = await _precomputed_answer(article_id, summary, history, user_msg, history_summary)
+    if hit is not None:
+        yield "delta", {"delta": hit["answer"]}
+        yield "done", {"answer": hit["answer"], "model": hit["model"], "latencyMs": 0, "ttftMs": 0,
+                       "inputTokens": 0, "outputTokens": 0}
+        return
+
+    client = get_client()
+    messages = _chat_messages(article_id, summary, history, user_msg, history_summary)
+    route = resolve_route("chat", CHAT_TEMPERATURE, CHAT_MAX_TOKENS, cascade=False)
+
+    limiter = get_limiter(route.model)
+    t0 = time.time()
+    ttft_ms = None
+    parts: List[str] = []
+    model_used = route.model
+    meta_in = meta_out = 0
+    # 첫 응답 전(스트림 생성) 실패만 재시도. 토큰을 내보내기 시작한 뒤에는 다시 보내지 않는다
+    stream, reservation = await with_retries(lambda: _open_chat_stream(client, messages, route))
+    chunks = stream.__aiter__()
+    try:
+        while True:
+            try:
+                chunk = await _next_chunk(chunks)
+            except StopAsyncIteration:
+                break
+            model_used = chunk.model or model_used
+            if chunk.usage:
+                meta_in, meta_out = chunk.usage.prompt_tokens, chunk.usage.completion_tokens
+            for choice in chunk.choices:
+                delta = choice.delta.content if choice.delta else None
+                if delta:
+                    if ttft_ms is None:
+                        ttft_ms = int((time.time() - t0) * 1000)
+                    parts.append(delta)
+                    yield "delta", {"delta": delta}
+    except APIStatusError as e:
+        limiter.update_from_headers(e.response.headers)
+        record_llm_call(route.model, 0, 0, 0, _failure_outcome(e), stage_name="chat")
+        raise
+    except DeadlineExceeded:
+        # 토큰이 오다 멈춘 스트림: 기한에서 끊고 연결을 닫는다
+        record_llm_call(route.model, 0, 0, 0, "cancelled", stage_name="chat")
+        await stream.close()
+        raise
+    finally:
+        # 중간에 끊겨도 받은 usage(없으면 0)로 정산
+        limiter.settle(reservation, meta_in + meta_out)
+
+    record_llm_call(model_used, time.time() - t0, meta_in, meta_out, stage_name="chat")
+
+    yield "done", {
+        "answer": "".join(parts),
+        "model": model_used,
+        "latencyMs": int((time.time() - t0) * 1000),
+        "ttftMs": ttft_ms if ttft_ms is not None else 0,
+        "inputTokens": meta_in,
+        "outputTokens": meta_out,
+    }
 
-    user_prompt = EPI_USER_TEMPLATE.format(
+async def summarize_chat_history(previous_summary: str, turns: list) -> str:
+    """ 오래된 대화 턴을 기존 누적 요약에 합쳐 다시 요약 """
+    dialog = "\n".join(f"{'사용자' if t.role == 'user' else '어시스턴트'}: {t.content}" for t in turns)
+    user_prompt = f"[기존 요약]\n{previous_summary or '(없음)'}\n\n[새로 접을 대화]\n{dialog}"
+    with stage_scope("chat_summary"):
+        text, *_ = await _call_text(
+            CHAT_HISTORY_SUMMARY_PROMPT, user_prompt,
+            temperature=0.2, max_output_tokens=settings.CHAT_HISTORY_SUMMARY_MAX_TOKENS,
+        )
+    return text.strip()
+
+async def evaluate_epi_original(original_title: str, original_body: str,
+                                keys: Sequence[str] = EPI_KEYS) -> Tuple[Dict[str, float], int, int, str, int]:
+    """ 원문 EPI 컴포넌트만 채점 (기사당 1회, 스타일 간 공유). keys로 채점할 컴포넌트를 좁힐 수 있다."""
+    user_prompt = EPI_ORIGINAL_USER_TEMPLATE.format(
         originalTitle=original_title,
         originalBody=original_body[:settings.MAX_BODY_CHARS],
-        generatedTitle=generated_title,
-        generatedSummary=generated_summary
+        format=json.dumps({k: 0.0 for k in keys}, ensure_ascii=False),
     )
-    t0 = time.time()
-    resp = client.responses.create(
-        model=settings.MODEL_NAME,
-        input=[
-            {"role": "system", "content": EPI_SYSTEM_PROMPT},
-            {"role": "user", "content": user_prompt},
-        ],
-        temperature=0.2,           # 평가 일관성 위해 낮게
-        max_output_tokens=300,
+    # "original": {...}로 감싸서 오는 경우도 허용
+    return await _call_json(
+        EPI_SYSTEM_PROMPT, user_prompt,
+        temperature=EPI_TEMPERATURE,
+        max_output_tokens=120,
+        convert=lambda data: validate_components(data.get("original", data), "original", keys),
     )
-    text = _extract_output_text(resp)
-    data = _parse_json_block(text)
 
-    usage = getattr(resp, "usage", None)
-    meta_in  = getattr(usage, "input_tokens", 0) if usage else 0
-    meta_out = getattr(usage, "output_tokens", 0) if usage else 0
-    picked_model = getattr(resp, "model", settings.MODEL_NAME)
-    latency_ms = int((time.time() - t0) * 1000)
+def epi_summaries_user_prompt(original_title: str, original_components: Dict[str, float],
+                              summaries: Dict[str, Tuple[str, str]],
+                              keys: Sequence[str] = EPI_KEYS) -> str:
+    blocks = "\n\n".join(
+        f"[{style}]\n제목: {t}\n요약: {s}" for style, (t, s) in summaries.items()
+    )
+    fmt = json.dumps(
+        {style: {**{k: 0.0 for k in keys}, "reason": "자극도 감소 이유"} for style in summaries},
+        ensure_ascii=False, indent=2,
+    )
+    return EPI_SUMMARIES_USER_TEMPLATE.format(
+        originalTitle=original_title,
+        originalComponents=json.dumps(original_components, ensure_ascii=False),
+        summaries=blocks,
+        format=fmt,
+    )
 
-    # 최소 범위 검증
-    for side in ("original", "summary"):
-        comp = data.get(side, {})
-        for k in ("S","SUBJ","K","F","C","V","X","EVID"):
-            v = float(comp.get(k, 0))
-            if not (0.0 <= v <= 1.0):
-                raise ValueError(f"EPI 컴포넌트 범위 오류: {side}.{k}={v}")
-        epi_val = int(comp.get("EPI", 0))
-        if not (0 <= epi_val <= 100):
-            raise ValueError(f"EPI 값 범위 오류: {side}.EPI={epi_val}")
-
-    # 자극도 감소 이유
-    reason = data.get("reason", "자극도 감소 이유를 생성할 수 없습니다.")
-
-    return data, meta_in, meta_out, picked_model, latency_ms, reason
\ No newline at end of file
+async def evaluate_epi_summaries(original_title: str, original_components: Dict[str, float],
+                                 summaries: Dict[str, Tuple[str, str]],
+                                 keys: Sequence[str] = EPI_KEYS,
+                                 ) -> Tuple[Dict[str, Tuple[Dict[str, float], str]], int, int, str, int]:
+    """
+    생성 요약 여러 개(스타일별)를 1회 호출로 채점. 원문 본문은 다시 보내지 않는다.
+    범위 검증을 통과한 스타일만 돌려준다.
+    반환: ({style: (components, reason)}, input_tokens, output_tokens, model, latency_ms)
+    """
+    user_prompt = epi_summaries_user_prompt(original_title, original_components, summaries, keys)
+    def convert(data: Dict[str, Any]) -> Dict[str, Tuple[Dict[str, float], str]]:
+        out: Dict[str, Tuple[Dict[str, float], str]] = {}
+        errors = []
+        for style in summaries:
+            item = data.get(style)
+            if not isinstance(item, dict):
+                errors.append(f"{style} 누락")
+                continue
+            try:
+                comp = validate_components(item, style, keys)
+            except ValueError as ex:
+                errors.append(str(ex))
+                continue
+            # 자극도 감소 이유
+            out[style] = (comp, str(item.get("reason", "자극도 감소 이유를 생성할 수 없습니다.")))
+        if not out:
+            raise ValueError(f"EPI 요약 평가 실패: {'; '.join(errors)}")
+        return out
+
+    return await _call_json(
+        EPI_SYSTEM_PROMPT, user_prompt,
+        temperature=EPI_TEMPERATURE,
+        max_output_tokens=220 * len(summaries),
+        convert=convert,
+        items=len(summaries),
+    )
@@ -1,143 +1,371 @@
-from fastapi import FastAPI, HTTPException
-import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Literal
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel
+import asyncio, json, time, uuid
 from schemas import (
-    RewriteRequest,TokensUsed,
+    RewriteRequest,
     RewriteBatchRequest,ChatArticleRequest, ChatArticleResponse,
     RewriteBatchMultiResponse, RewriteBatchItemMultiResult,
-    RewriteVariant, RewriteMultiResponse
+    RewriteBatchStreamSummary, RewriteMultiResponse, ChatArticleStreamDone, TokensUsed,
+    JobSubmitResponse, JobStatus, JobResultsPage,
 )
-from llm_client import suggest_questions_and_quiz, chat_about_article, build_variants_for_styles
+from llm_client import chat_about_article, stream_chat_about_article, init_client, close_client
+from pipeline import RewriteStagesFailed, rewrite_article, process_batch_item
+from cache import get_cache, close_cache
+from checkpoint import get_checkpoints, close_checkpoints
+from chat_answers import get_chat_answers, close_chat_answers
+from near_dup import get_near_dup_index
+from concurrency import concurrency_stats
+from scheduler import SchedulerRejected, scheduler_stats, set_priority
+from singleflight import get_single_flight
+from jobs import start_jobs, stop_jobs, get_runner
+from chat_sessions import get_session_store
+from resilience import DeadlineExceeded, deadline_scope, parse_timeout_header
+from settings import settings
+from telemetry import (HTTP_LATENCY, HTTP_REQUESTS, QUEUE_WAIT, REQUESTS_CANCELLED, render_metrics,
+                       request_id_var, to_thread)
 
-app = FastAPI(title="Article Rewriter API", version="1.3.1")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 공용 AsyncOpenAI 클라이언트(커넥션 풀) 생성 -> 종료 시 정리
+    init_client()
+    await start_jobs()
+    yield
+    await stop_jobs()
+    await close_client()
+    close_cache()
+    close_checkpoints()
+    close_chat_answers()
 
-CONCURRENCY_ARTICLES = 4 #한번에 요청 개수 제한
-CHUNK_SIZE = 3            # 한번에 보낼 기사 개수 (청크 크기)
-CHUNK_DELAY_SEC = 50     # 청크 사이 지연(초)
+app = FastAPI(title="Article Rewriter API", version="1.3.1", lifespan=lifespan)
 
-def _chunked(seq, size):
-    """seq를 size개 단위로 순회하는 제너레이터"""
-    for i in range(0, len(seq), size):
-        yield seq[i:i+size]
+@app.exception_handler(SchedulerRejected)
+async def scheduler_rejected(request: Request, exc: SchedulerRejected):
+    # 대기열이 가득 찼거나 너무 오래 기다림 -> 잠시 후 다시 시도하라고 알린다
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "5"})
+
+@app.exception_handler(RewriteStagesFailed)
+async def rewrite_stages_failed(request: Request, exc: RewriteStagesFailed):
+    # 일부 스테이지 실패: 배치 아이템과 같이 끝난 부분(partial)과 실패 스테이지를 돌려준다 (재요청 시 체크포인트로 이어서)
+    return JSONResponse(status_code=502, content={
+        "detail": str(exc),
+        "partial": exc.partial.model_dump(mode="json"),
+        "failedStages": [f.model_dump(mode="json") for f in exc.failures],
+    })
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded(request: Request, exc: DeadlineExceeded):
+    # 요청 기한 초과: 진행 중이던 호출은 이미 취소됨 (끝난 스테이지는 캐시/체크포인트에 남아 재요청 시 재사용)
+    REQUESTS_CANCELLED.inc(path=_route_path(request), reason="deadline")
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
+def _route_path(request: Request) -> str:
+    return getattr(request.scope.get("route"), "path", "unmatched")
+
+def _request_deadline(request: Request) -> float:
+    """헤더로 준 기한(초, 상한 REQUEST_DEADLINE_MAX_SEC) 또는 경로별 기본값 (없으면 0 = 요청 단위 기한 없음)"""
+    sec = parse_timeout_header(request.headers.get(settings.REQUEST_DEADLINE_HEADER))
+    if sec is not None:
+        return min(sec, settings.REQUEST_DEADLINE_MAX_SEC)
+    return settings.REQUEST_DEADLINES.get(request.url.path, 0.0)
+
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    """요청 ID(X-Request-ID, 없으면 생성)와 요청 기한을 컨텍스트에 싣고 HTTP 메트릭을 남긴다."""
+    rid = request.headers.get("x-request-id") or uuid.uuid4().hex
+    request_id_var.set(rid)
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        with deadline_scope(_request_deadline(request)):
+            response = await call_next(request)
+        status = response.status_code
+    finally:
+        # 경로 파라미터(jobId 등)로 라벨이 늘어나지 않게 라우트 템플릿으로 집계
+        path = _route_path(request)
+        HTTP_LATENCY.observe(time.perf_counter() - t0, path=path)
+        HTTP_REQUESTS.inc(path=path, method=request.method, status=status)
+    response.headers["X-Request-ID"] = rid
+    return response
+
+async def _pool_map(items, fn, workers: int, queue_name: str) -> list:
+    """
+    워커 workers개가 items를 하나씩 가져가 fn을 돌린다 (결과는 입력 순서).
+    청크 단위로 기다리지 않으므로 느린 기사 하나가 나머지를 막지 않는다.
+    """
+    results = [None] * len(items)
+    it = iter(enumerate(items))
+    t0 = time.perf_counter()
+
+    async def worker():
+        for i, item in it:   # 같은 이터레이터를 공유 -> 아이템은 한 워커만 가져감
+            QUEUE_WAIT.observe(time.perf_counter() - t0, queue=queue_name)
+            results[i] = await fn(item)
+
+    await asyncio.gather(*[worker() for _ in range(max(1, min(workers, len(items))))])
+    return results
+
+async def _cancel_on_disconnect(request: Request, coro):
+    """
+    coro를 돌리다 클라이언트가 끊기면(http.disconnect) 취소하고 499.
+    대기열/진행 중 LLM 호출까지 취소되고, 끝난 스테이지는 결과 캐시와 체크포인트에 남는다.
+    (스트리밍 엔드포인트는 응답 제너레이터가 닫히면서 같은 방식으로 취소된다)
+    """
+    async def watch():
+        # 본문은 이미 읽었으므로 다음 메시지는 연결 종료뿐
+        while (await request.receive())["type"] != "http.disconnect":
+            pass
+
+    work = asyncio.ensure_future(coro)
+    watcher = asyncio.ensure_future(watch())
+    try:
+        await asyncio.wait({work, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        if not work.done():
+            work.cancel()
+            await asyncio.gather(work, return_exceptions=True)
+        watcher.cancel()
+    if work.cancelled():
+        REQUESTS_CANCELLED.inc(path=_route_path(request), reason="disconnect")
+        return Response(status_code=499)
+    return work.result()
 
 @app.post("/v1/rewrite-summarize3", response_model=RewriteMultiResponse)
-async def rewrite_summarize3(payload: RewriteRequest):
+async def rewrite_summarize3(payload: RewriteRequest, request: Request):
     body = payload.body.strip()
     if len(body) < 50:
         raise HTTPException(status_code=422, detail="본문이 너무 짧습니다(최소 50자).")
 
-    styles = ["CONCISE", "FRIENDLY", "NEUTRAL"]
+    # 스타일별 요약/EPI 체인 3개 + 질문/퀴즈를 동시에 생성
+    return await _cancel_on_disconnect(request, rewrite_article(payload.articleId, payload.title, body, payload))
 
-    # 스타일별 요약/EPI 한번에 생성 (질문/퀴즈는 여기서 만들지 않음)
-    variants, v_in, v_out, v_lat = await asyncio.to_thread(
-        build_variants_for_styles, payload.title, body, styles
-    )
+@app.post("/v1/rewrite-batch3", response_model=RewriteBatchMultiResponse)
+async def rewrite_batch3(payload: RewriteBatchRequest, request: Request):
+    set_priority("batch")
+    # 기사 수는 BATCH_ARTICLE_WORKERS로만 묶고, 실제 동시 LLM 호출 수는 llm_client의 AIMD 슬롯과
+    # 토큰 버킷 리미터가 정한다
+    async def run():
+        all_results = await _pool_map(payload.items, lambda it: process_batch_item(it, payload),
+                                      settings.BATCH_ARTICLE_WORKERS, "batch")
+        return RewriteBatchMultiResponse(results=list(all_results))
+    return await _cancel_on_disconnect(request, run())
 
-    # 기사당 1회만 질문/퀴즈 생성
-    questions, quiz, q_in, q_out, _, q_lat = await asyncio.to_thread(
-        suggest_questions_and_quiz, payload.title, body
-    )
+async def _stream_batch_results(payload: RewriteBatchRequest) -> AsyncIterator[BaseModel]:
+    """
+    워커 BATCH_ARTICLE_WORKERS개가 아이템을 하나씩 가져가 처리하고,
+    끝나는 순서대로 결과를 내보낸 뒤 마지막에 요약 레코드를 보낸다.
+    결과는 큐(최대 워커 수)만 거쳐 나가므로 전체 결과를 메모리에 쌓지 않는다.
+    """
+    t0 = time.time()
+    items = iter(payload.items)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=settings.BATCH_ARTICLE_WORKERS)
+    done = object()
 
-    return RewriteMultiResponse(
-        articleId=payload.articleId,
-        variants=[
-            RewriteVariant(
-                newsStyle=v["newsStyle"],
-                articleId=payload.articleId,
-                newTitle=v["newTitle"],
-                summary=v["summary"],
-                model=v["model"],
-                latencyMs=v["latencyMs"],
-                epi=v["epi"]
+    async def worker():
+        set_priority("batch")   # 워커 태스크 컨텍스트에만 적용
+        try:
+            for item in items:   # 같은 이터레이터를 공유 -> 아이템은 한 워커만 가져감
+                QUEUE_WAIT.observe(time.time() - t0, queue="stream")
+                await queue.put(await process_batch_item(item, payload))
+        finally:
+            await queue.put(done)
+
+    n_workers = max(1, min(settings.BATCH_ARTICLE_WORKERS, len(payload.items)))
+    workers = [asyncio.create_task(worker()) for _ in range(n_workers)]
+    summary = RewriteBatchStreamSummary(total=len(payload.items))
+    try:
+        finished = 0
+        while finished < len(workers):
+            res = await queue.get()
+            if res is done:
+                finished += 1
+                continue
+            if res.ok:
+                summary.ok += 1
+                summary.tokensUsedTotal.input += res.data.tokensUsedTotal.input
+                summary.tokensUsedTotal.output += res.data.tokensUsedTotal.output
+            else:
+                summary.failed += 1
+                if res.partial is not None:
+                    # 실패한 기사라도 끝난 스테이지가 쓴 토큰은 집계
+                    summary.tokensUsedTotal.input += res.partial.tokensUsedTotal.input
+                    summary.tokensUsedTotal.output += res.partial.tokensUsedTotal.output
+            yield res
+        summary.elapsedMs = int((time.time() - t0) * 1000)
+        yield summary
+    finally:
+        # 클라이언트가 끊기면 남은 작업을 취소
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+@app.post("/v1/rewrite-batch3/stream")
+async def rewrite_batch3_stream(payload: RewriteBatchRequest,
+                                format: Literal["ndjson", "sse"] = "ndjson"):
+    """
+    /v1/rewrite-batch3의 스트리밍 버전.
+    기사 1건이 끝날 때마다 RewriteBatchItemMultiResult를 한 줄(NDJSON) 또는 이벤트(SSE)로 전송하고,
+    마지막에 type="summary" 레코드(성공/실패 수, 토큰 합계)를 보낸다.
+    """
+    async def ndjson():
+        async for rec in _stream_batch_results(payload):
+            yield rec.model_dump_json() + "\n"
+
+    async def sse():
+        async for rec in _stream_batch_results(payload):
+            event = "summary" if isinstance(rec, RewriteBatchStreamSummary) else "result"
+            yield f"event: {event}\ndata: {rec.model_dump_json()}\n\n"
+
+    if format == "sse":
+        return StreamingResponse(sse(), media_type="text/event-stream")
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+@app.post("/v1/jobs", response_model=JobSubmitResponse, status_code=202)
+async def submit_job(payload: RewriteBatchRequest):
+    """배치를 잡으로 등록하고 즉시 jobId 반환. 처리는 백그라운드 워커가 한다."""
+    job_id = await get_runner().submit(payload)
+    return JobSubmitResponse(jobId=job_id, total=len(payload.items))
+
+@app.get("/v1/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    status = await to_thread("jobs_status", get_runner().store.status, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="잡을 찾을 수 없습니다.")
+    return status
+
+@app.get("/v1/jobs/{job_id}/results", response_model=JobResultsPage)
+async def get_job_results(job_id: str,
+                          offset: int = Query(0, ge=0),
+                          limit: int = Query(50, ge=1, le=500)):
+    store = get_runner().store
+    if await to_thread("jobs_status", store.status, job_id) is None:
+        raise HTTPException(status_code=404, detail="잡을 찾을 수 없습니다.")
+    results = await to_thread("jobs_results", store.results, job_id, offset, limit)
+    return JobResultsPage(jobId=job_id, offset=offset, limit=limit, results=results)
+
+@app.post("/v1/jobs/{job_id}/retry", response_model=JobStatus)
+async def retry_job(job_id: str):
+    """
+    failed 아이템을 다시 pending으로. 끝난 스테이지는 체크포인트에 남아 있으므로
+    재처리 때는 실패했던(또는 건너뛴) 스테이지만 LLM을 호출한다.
+    """
+    runner = get_runner()
+    if await to_thread("jobs_status", runner.store.status, job_id) is None:
+        raise HTTPException(status_code=404, detail="잡을 찾을 수 없습니다.")
+    await runner.retry_failed(job_id)
+    return await to_thread("jobs_status", runner.store.status, job_id)
+
+@app.post("/v1/chat-article", response_model=ChatArticleResponse)
+async def chat_article(payload: ChatArticleRequest, request: Request):
+    return await _cancel_on_disconnect(request, _chat_article(payload))
+
+async def _chat_article(payload: ChatArticleRequest) -> ChatArticleResponse:
+    store = get_session_store()
+    sess = store.get(payload.articleId, payload.userId)
+    async with sess.lock:
+        try:
+            store.apply_request(sess, payload.summary, payload.history)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        try:
+            answer, model, latency = await chat_about_article(
+                payload.articleId,
+                payload.userId,
+                sess.summary,
+                sess.turns,
+                payload.userMessage,
+                history_summary=sess.history_summary,
             )
-            for v in variants
-        ],
+        except (SchedulerRejected, DeadlineExceeded):
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        store.record(sess, payload.userMessage, answer)
+    store.schedule_compaction(sess)
 
-        questions=questions,
-        quiz=quiz,
-        tokensUsedTotal=TokensUsed(input=v_in + q_in, output=v_out + q_out),
-        latencyMsTotal=v_lat + q_lat
+    return ChatArticleResponse(
+        articleId=payload.articleId,
+        userId=payload.userId,
+        userMessage=payload.userMessage,
+        answer=answer,
+        model=model,
+        latencyMs=latency,
     )
 
-@app.post("/v1/rewrite-batch3", response_model=RewriteBatchMultiResponse)
-async def rewrite_batch3(payload: RewriteBatchRequest):
-    sem = asyncio.Semaphore(CONCURRENCY_ARTICLES)
-
-    async def process_one(item) -> RewriteBatchItemMultiResult:
-        async with sem:
-            body = (item.body or "").strip()
-            if len(body) < 50:
-                return RewriteBatchItemMultiResult(
-                    articleId=item.articleId, ok=False,
-                    error="본문이 너무 짧습니다(최소 50자)."
-                )
+@app.post("/v1/chat-article/stream")
+async def chat_article_stream(payload: ChatArticleRequest):
+    """
+    /v1/chat-article의 SSE 스트리밍 버전.
+    event: delta  -> {"delta": "..."} (토큰이 도착하는 대로)
+    event: done   -> ChatArticleStreamDone (model, latencyMs, ttftMs, tokensUsed 포함)
+    event: error  -> {"detail": "..."} (요청 기한을 넘기면 받은 데까지 보낸 뒤 error로 끝난다)
+    """
+    store = get_session_store()
+    sess = store.get(payload.articleId, payload.userId)
+    if not (payload.summary or sess.summary):
+        raise HTTPException(status_code=422, detail="기사 요약(summary)이 없습니다. 첫 요청에는 summary를 함께 보내세요.")
+
+    async def events():
+        async with sess.lock:
             try:
-                styles = ["CONCISE", "FRIENDLY", "NEUTRAL"]
-
-                # 스타일별 요약/EPI 생성
-                variants, v_in, v_out, v_lat = await asyncio.to_thread(
-                    build_variants_for_styles, item.title, body, styles
-                )
-                # 기사당 1회만 질문/퀴즈 생성
-                questions, quiz, q_in, q_out, _, q_lat = await asyncio.to_thread(
-                    suggest_questions_and_quiz, item.title, body
-                )
-
-                data = RewriteMultiResponse(
-                    articleId=item.articleId,
-                    variants=[
-                        RewriteVariant(
-                            newsStyle=v["newsStyle"],
-                            articleId=item.articleId,
-                            newTitle=v["newTitle"],
-                            summary=v["summary"],
-                            model=v["model"],
-                            latencyMs=v["latencyMs"],
-                            epi=v["epi"]
+                store.apply_request(sess, payload.summary, payload.history)
+                async for kind, data in stream_chat_about_article(
+                    payload.articleId,
+                    payload.userId,
+                    sess.summary,
+                    sess.turns,
+                    payload.userMessage,
+                    history_summary=sess.history_summary,
+                ):
+                    if kind == "delta":
+                        yield f"event: delta\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+                    else:
+                        store.record(sess, payload.userMessage, data["answer"])
+                        done = ChatArticleStreamDone(
+                            articleId=payload.articleId,
+                            userId=payload.userId,
+                            userMessage=payload.userMessage,
+                            answer=data["answer"],
+                            model=data["model"],
+                            latencyMs=data["latencyMs"],
+                            ttftMs=data["ttftMs"],
+                            tokensUsed=TokensUsed(input=data["inputTokens"], output=data["outputTokens"]),
                         )
-                        for v in variants
-                    ],
-                    questions=questions,
-                    quiz=quiz,
-                    tokensUsedTotal=TokensUsed(input=v_in + q_in, output=v_out + q_out),
-                    latencyMsTotal=v_lat + q_lat
-                )
-                return RewriteBatchItemMultiResult(articleId=item.articleId, ok=True, data=data)
+                        yield f"event: done\ndata: {done.model_dump_json()}\n\n"
             except Exception as e:
-                return RewriteBatchItemMultiResult(articleId=item.articleId, ok=False, error=str(e))
-
-    all_results = []
-    for chunk in _chunked(payload.items, CHUNK_SIZE):
-        # 청크의 작업들을 동시에 처리 (최대 CONCURRENCY_ARTICLES 만큼 세마포어 제한)
-        tasks = [process_one(it) for it in chunk]
-        chunk_results = await asyncio.gather(*tasks)
-        all_results.extend(chunk_results)
+                if isinstance(e, DeadlineExceeded):
+                    REQUESTS_CANCELLED.inc(path="/v1/chat-article/stream", reason="deadline")
+                yield f"event: error\ndata: {json.dumps({'detail': str(e)}, ensure_ascii=False)}\n\n"
+        store.schedule_compaction(sess)
 
-        # 다음 청크로 넘어가기 전 잠깐 대기 -> GPT TPM 한도 때문
-        # 마지막 청크 뒤에는 굳이 안 쉬어도 되지만 단순화를 위해 통일
-        await asyncio.sleep(CHUNK_DELAY_SEC)
+    return StreamingResponse(events(), media_type="text/event-stream")
 
-    return RewriteBatchMultiResponse(results=list(all_results))
+@app.get("/v1/stats")
+async def stats():
+    """
+    모니터링용: 진행 중 동일 호출 합치기(single-flight), 결과 캐시, 스테이지 체크포인트, 유사 중복 색인,
+    AIMD 동시성 한도, 우선순위 대기열, 미리 만든 챗봇 답변
+    """
+    cache = get_cache()
+    near_dup = get_near_dup_index()
+    checkpoints = get_checkpoints()
+    chat_answers = get_chat_answers()
+    return {
+        "singleFlight": get_single_flight().stats(),
+        "cache": cache.stats() if cache is not None else None,
+        "checkpoints": checkpoints.stats() if checkpoints is not None else None,
+        "nearDup": near_dup.stats() if near_dup is not None else None,
+        "concurrency": concurrency_stats(),
+        "scheduler": scheduler_stats(),
+        "chatAnswers": chat_answers.stats() if chat_answers is not None else None,
+    }
 
-@app.post("/v1/chat-article", response_model=ChatArticleResponse)
-async def chat_article(payload: ChatArticleRequest):
-    try:
-        answer, model, latency = chat_about_article(
-            payload.articleId,
-            payload.userId,
-            payload.summary,
-            payload.history,
-            payload.userMessage,
-        )
-        return ChatArticleResponse(
-            articleId=payload.articleId,
-            userId=payload.userId,
-            userMessage=payload.userMessage,
-            answer=answer,
-            model=model,
-            latencyMs=latency,
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 스크레이프용 (텍스트 포맷 0.0.4)"""
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.get("/health")
 async def health_check():
@@ -0,0 +1,146 @@
+import hashlib, re, time, unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from settings import settings
+from preprocess import strip_boilerplate
+from telemetry import NEAR_DUP_LOOKUPS
+
+# 유사 중복 기사 색인: 여러 매체에 조금씩 고쳐 실린 통신 기사(바이라인/제목/한두 문장 차이)를 찾아
+# 이미 처리한 기사의 결과를 다시 쓴다. (정확히 같은 입력만 맞히는 내용 주소 캐시를 보완)
+#   정규화 본문 -> 글자 n-gram(shingle) 집합 -> MinHash 서명(단일 해시 + 구간 분할, OPH) -> LSH 밴드 버킷
+# 조회는 밴드 버킷 몇 개 + 후보 서명 비교뿐이라 1ms 미만. 항목 수 상한을 넘으면 오래 안 쓴 것부터 지운다.
+
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+_EMPTY = 0xFFFFFFFF
+
+def normalize(text: str) -> str:
+    """상용구 줄 제거 -> NFKC -> 소문자 -> 글자/숫자만 (띄어쓰기/문장부호 차이 무시)"""
+    text = unicodedata.normalize("NFKC", strip_boilerplate(text or "")).lower()
+    return _NON_WORD.sub("", text)
+
+def shingles(text: str, k: int) -> set:
+    norm = normalize(text)
+    return {norm[i:i + k] for i in range(max(0, len(norm) - k + 1))}
+
+def signature(text: str, num_perm: int = 0) -> Optional[array]:
+    """
+    One Permutation Hashing: shingle마다 64비트 해시 1번 -> 하위 비트로 구간(bin), 상위 32비트의 구간별 최솟값.
+    빈 구간은 다음 구간 값을 빌려 채운다(densification). 두 서명의 같은 구간 비율이 Jaccard 유사도 추정치.
+    shingle이 NEAR_DUP_MIN_SHINGLES보다 적으면(짧은 글) None.
+    """
+    num_perm = num_perm or settings.NEAR_DUP_NUM_PERM
+    grams = shingles(text, settings.NEAR_DUP_SHINGLE_CHARS)
+    if len(grams) < settings.NEAR_DUP_MIN_SHINGLES:
+        return None
+    sig = array("I", [_EMPTY]) * num_perm
+    for g in grams:
+        h = int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest(), "little")
+        b, v = h % num_perm, h >> 32
+        if v < sig[b]:
+            sig[b] = v
+    for i in range(num_perm):
+        if sig[i] == _EMPTY:
+            j = i
+            while sig[j % num_perm] == _EMPTY:
+                j += 1
+            sig[i] = sig[j % num_perm]
+    return sig
+
+def similarity(a: array, b: array) -> float:
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+class _Entry:
+    __slots__ = ("sig", "bands", "scope", "value")
+
+    def __init__(self, sig: array, bands: List[int], scope: str, value: Any):
+        self.sig = sig
+        self.bands = bands
+        self.scope = scope
+        self.value = value
+
+class NearDupIndex:
+    """
+    key(articleId) -> (서명, 결과). 밴드 b개 x 행 r개(num_perm = b*r)로 나눠, 한 밴드라도 같으면 후보.
+    후보는 서명 전체로 유사도를 다시 재서 threshold 이상인 가장 비슷한 항목을 돌려준다.
+    scope가 다른 항목(옵션/스타일이 달라 결과를 그대로 쓸 수 없는 것)은 건너뛴다.
+    """
+
+    def __init__(self, max_entries: int, bands: int, threshold: float):
+        self.max_entries = max_entries
+        self.bands = bands
+        self.threshold = threshold
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._buckets: List[Dict[int, List[str]]] = [{} for _ in range(bands)]
+        self.lookups = 0
+        self.hits = 0
+        self.evictions = 0
+        self._lookup_sec = 0.0
+
+    def _band_keys(self, sig: array) -> List[int]:
+        rows = len(sig) // self.bands
+        return [hash(tuple(sig[i * rows:(i + 1) * rows])) for i in range(self.bands)]
+
+    def lookup(self, sig: array, scope: str, exclude: Optional[str] = None) -> Optional[Tuple[str, float, Any]]:
+        t0 = time.perf_counter()
+        self.lookups += 1
+        best: Optional[Tuple[str, float]] = None
+        seen = set()
+        for band, bk in zip(self._buckets, self._band_keys(sig)):
+            for key in band.get(bk, ()):
+                if key in seen or key == exclude:
+                    continue
+                seen.add(key)
+                entry = self._entries[key]
+                if entry.scope != scope:
+                    continue
+                sim = similarity(sig, entry.sig)
+                if sim >= self.threshold and (best is None or sim > best[1]):
+                    best = (key, sim)
+        self._lookup_sec += time.perf_counter() - t0
+        if best is None:
+            NEAR_DUP_LOOKUPS.inc(outcome="miss")
+            return None
+        self.hits += 1
+        NEAR_DUP_LOOKUPS.inc(outcome="hit")
+        self._entries.move_to_end(best[0])
+        return best[0], best[1], self._entries[best[0]].value
+
+    def add(self, key: str, sig: array, scope: str, value: Any) -> None:
+        self.remove(key)
+        bands = self._band_keys(sig)
+        self._entries[key] = _Entry(sig, bands, scope, value)
+        for band, bk in zip(self._buckets, bands):
+            band.setdefault(bk, []).append(key)
+        while len(self._entries) > self.max_entries:
+            self.remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for band, bk in zip(self._buckets, entry.bands):
+            keys = band.get(bk)
+            if keys is not None:
+                keys.remove(key)
+                if not keys:
+                    del band[bk]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "evictions": self.evictions,
+            "avgLookupUs": round(self._lookup_sec / self.lookups * 1e6, 1) if self.lookups else 0.0,
+        }
+
+_index: Optional[NearDupIndex] = None
+
+def get_near_dup_index() -> Optional[NearDupIndex]:
+    """NEAR_DUP_MAX_ENTRIES가 0이면 None (색인 사용 안 함)"""
+    global _index
+    if _index is None and settings.NEAR_DUP_MAX_ENTRIES > 0:
+        _index = NearDupIndex(settings.NEAR_DUP_MAX_ENTRIES, settings.NEAR_DUP_BANDS, settings.NEAR_DUP_THRESHOLD)
+    return _index
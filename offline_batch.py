@@ -0,0 +1,354 @@
+"""
+오프라인 일괄 처리: 기사 코퍼스(JSONL)를 OpenAI Batch API로 처리한다. (지연 대신 비용/처리량)
+
+    python -m offline_batch --corpus corpus.jsonl --out results.jsonl
+    python -m offline_batch --corpus corpus.jsonl --out results.jsonl --backend local --local-dir data/fake-batch
+
+코퍼스 한 줄: {"articleId", "title", "body"} (RewriteBatchItemIn)
+결과 한 줄: RewriteBatchItemMultiResult (온라인 /v1/rewrite-batch3 결과와 같은 형식)
+
+기사마다 온라인과 같은 DAG(pipeline.process_batch_item)를 돌리되, LLM 호출은 BatchCollector가 모아
+라운드 단위 요청 파일로 만든다. 요약/원문 EPI/퀴즈가 1라운드, 요약 EPI가 2라운드
+(긴 기사 map-reduce, JSON 교정, 429/5xx 재시도는 라운드가 더 붙는다).
+custom_id는 "<articleId>|<스테이지>" (같은 스테이지의 두 번째 호출부터 "#n").
+같은 요청 파일(sha256)은 상태 파일에 배치 ID가 남아 있어, 다시 실행하면 새로 올리지 않고 이어서 기다린다.
+결과 파일에 이미 있는 articleId는 건너뛴다.
+메모리: 기사는 --chunk-articles개씩 처리하고, 요청/결과 파일은 한 줄씩 쓰고 읽는다.
+"""
+import argparse, asyncio, hashlib, json, os, sys, time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Protocol, Set, Tuple
+
+from settings import settings
+from schemas import RewriteBatchItemIn, RewriteBatchItemMultiResult, RewriteOptions
+from llm_client import close_client, get_client, offline_collector_var
+from pipeline import process_batch_item
+from cache import close_cache
+from checkpoint import close_checkpoints
+from resilience import is_retryable_status
+from telemetry import record_llm_call, request_id_var, stage_var
+
+BATCH_ENDPOINT = "/v1/responses"
+_TERMINAL = {"completed", "failed", "expired", "cancelled"}
+
+class BatchLineError(Exception):
+    """배치 결과 파일에서 요청 1건이 실패로 돌아옴"""
+
+    def __init__(self, custom_id: str, status_code: Optional[int], message: str):
+        super().__init__(f"배치 요청 실패({custom_id}, status={status_code}): {message}")
+        self.custom_id = custom_id
+        self.status_code = status_code
+
+@dataclass
+class BatchInfo:
+    id: str
+    status: str                         # validating | in_progress | finalizing | completed | failed | expired | ...
+    output_file_id: Optional[str] = None
+    error_file_id: Optional[str] = None
+
+class BatchBackend(Protocol):
+    """Batch API 엔드포인트 (OpenAIBatchBackend, 로컬 대역은 bench.fake_batch.LocalBatchBackend)"""
+
+    async def upload(self, path: str) -> str: ...
+    async def create(self, input_file_id: str, metadata: Dict[str, str]) -> str: ...
+    async def retrieve(self, batch_id: str) -> BatchInfo: ...
+    async def download(self, file_id: str, dest: str) -> None: ...
+
+class OpenAIBatchBackend:
+    def __init__(self):
+        self.client = get_client()
+
+    async def upload(self, path: str) -> str:
+        with open(path, "rb") as f:
+            return (await self.client.files.create(file=f, purpose="batch")).id
+
+    async def create(self, input_file_id: str, metadata: Dict[str, str]) -> str:
+        batch = await self.client.batches.create(
+            input_file_id=input_file_id, endpoint=BATCH_ENDPOINT,
+            completion_window="24h", metadata=metadata,
+        )
+        return batch.id
+
+    async def retrieve(self, batch_id: str) -> BatchInfo:
+        b = await self.client.batches.retrieve(batch_id)
+        return BatchInfo(b.id, b.status, b.output_file_id, b.error_file_id)
+
+    async def download(self, file_id: str, dest: str) -> None:
+        # 결과 파일은 클 수 있으므로 메모리에 올리지 않고 바로 디스크로
+        async with self.client.files.with_streaming_response.content(file_id) as resp:
+            with open(dest, "wb") as f:
+                async for chunk in resp.iter_bytes():
+                    f.write(chunk)
+
+def _iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def _output_text(body: Dict[str, Any]) -> str:
+    if body.get("output_text"):
+        return body["output_text"]
+    for item in body.get("output") or []:
+        for part in item.get("content") or []:
+            if part.get("text"):
+                return part["text"]
+    return ""
+
+# 요청 1건: (요청 본문, 기다리는 호출의 future, 재시도 횟수)
+_Entry = Tuple[Dict[str, Any], asyncio.Future, int]
+
+class BatchCollector:
+    """
+    offline_collector_var로 설정하면 llm_client의 responses 호출이 여기로 모인다.
+    라운드마다 모인 요청을 JSONL로 쓰고, 결과 파일을 한 줄씩 읽어 기다리던 호출에 돌려준다.
+    결과가 429/5xx면 LLM_RETRY_MAX회까지 다음 라운드에 다시 넣는다.
+    """
+
+    def __init__(self):
+        self._pending: Dict[str, _Entry] = {}
+        self._ids: Counter = Counter()
+        self.last_submit = time.monotonic()
+        self.requests = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def _custom_id(self) -> str:
+        base = f"{request_id_var.get()}|{stage_var.get()}"
+        self._ids[base] += 1
+        n = self._ids[base]
+        return base if n == 1 else f"{base}#{n}"
+
+    async def submit(self, body: Dict[str, Any]) -> Tuple[str, int, int, str, int]:
+        """llm_client._create_response 대신 호출된다. 반환형도 같다 (배치라 latency_ms는 0)."""
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[self._custom_id()] = (body, fut, 0)
+        self.last_submit = time.monotonic()
+        self.requests += 1
+        text, tin, tout, model, lat = await fut
+        record_llm_call(model, 0, tin, tout)     # 모델별 토큰 집계(usage_ledger)에 반영
+        return text, tin, tout, model, lat
+
+    async def wait_quiet(self, tasks: List[asyncio.Task], settle_sec: float) -> None:
+        """모든 기사가 끝났거나, 요청이 settle_sec 동안 더 들어오지 않을 때까지 (= 이번 라운드 요청이 다 모임)"""
+        while not all(t.done() for t in tasks):
+            if self._pending and time.monotonic() - self.last_submit >= settle_sec:
+                return
+            await asyncio.sleep(settle_sec / 5)
+
+    def write_round(self, path: str) -> Tuple[str, Dict[str, _Entry]]:
+        """대기 중 요청을 Batch API 입력 파일로 쓴다. (파일 sha256, 이번 라운드 요청)"""
+        inflight, self._pending = self._pending, {}
+        digest = hashlib.sha256()
+        with open(path, "w", encoding="utf-8") as f:
+            for custom_id, (body, _fut, _attempt) in inflight.items():
+                line = json.dumps({"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body},
+                                  ensure_ascii=False, sort_keys=True) + "\n"
+                f.write(line)
+                digest.update(line.encode("utf-8"))
+        return digest.hexdigest(), inflight
+
+    async def resolve(self, inflight: Dict[str, _Entry], result_path: str) -> None:
+        """결과(또는 오류) 파일을 한 줄씩 읽어 해당 호출을 깨운다."""
+        for n, line in enumerate(_iter_jsonl(result_path), 1):
+            custom_id = line.get("custom_id")
+            entry = inflight.pop(custom_id, None)
+            if entry is None:
+                continue
+            body, fut, attempt = entry
+            if fut.done():      # 기다리던 기사가 이미 취소됨
+                continue
+            resp = line.get("response") or {}
+            status = resp.get("status_code")
+            payload = resp.get("body") or {}
+            if line.get("error") or status != 200:
+                message = (line.get("error") or payload.get("error") or {}).get("message", "")
+                if status and is_retryable_status(status) and attempt < settings.LLM_RETRY_MAX:
+                    self._pending[custom_id] = (body, fut, attempt + 1)
+                    self.last_submit = time.monotonic()
+                else:
+                    fut.set_exception(BatchLineError(custom_id, status, message))
+            else:
+                usage = payload.get("usage") or {}
+                fut.set_result((_output_text(payload), usage.get("input_tokens", 0), usage.get("output_tokens", 0),
+                                payload.get("model") or settings.MODEL_NAME, 0))
+            if n % 500 == 0:
+                await asyncio.sleep(0)      # 깨운 기사들이 다음 라운드 요청을 만들 수 있게
+
+    def fail_missing(self, inflight: Dict[str, _Entry], status: str) -> None:
+        for custom_id, (_body, fut, _attempt) in inflight.items():
+            if not fut.done():
+                fut.set_exception(BatchLineError(custom_id, None, f"배치 결과에 없음 (batch status={status})"))
+        inflight.clear()
+
+class _State:
+    """요청 파일 sha256 -> 배치 ID. 재실행 시 같은 라운드를 다시 올리지 않기 위함"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.data: Dict[str, Any] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.data = json.load(f)
+
+    def get(self, sha: str) -> Optional[Dict[str, Any]]:
+        return self.data.get(sha)
+
+    def put(self, sha: str, rec: Dict[str, Any]) -> None:
+        self.data[sha] = rec
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
+
+async def _submit_and_wait(backend: BatchBackend, state: _State, path: str, sha: str,
+                           poll_interval: float) -> BatchInfo:
+    rec = state.get(sha)
+    if rec is None:
+        file_id = await backend.upload(path)
+        batch_id = await backend.create(file_id, {"source": "article-rewriter", "round": os.path.basename(path)})
+        state.put(sha, {"batchId": batch_id, "inputFileId": file_id, "file": os.path.basename(path)})
+        print(f"  submitted {os.path.basename(path)} -> {batch_id}")
+    else:
+        batch_id = rec["batchId"]
+        print(f"  resuming {os.path.basename(path)} -> {batch_id}")
+    while True:
+        info = await backend.retrieve(batch_id)
+        if info.status in _TERMINAL:
+            return info
+        await asyncio.sleep(poll_interval)
+
+def _written_ids(out_path: str) -> Set[str]:
+    if not os.path.exists(out_path):
+        return set()
+    return {rec["articleId"] for rec in _iter_jsonl(out_path)}
+
+def _iter_corpus(path: str, skip: Set[str]) -> Iterator[RewriteBatchItemIn]:
+    for rec in _iter_jsonl(path):
+        item = RewriteBatchItemIn.model_validate(rec)
+        if item.articleId in skip:          # 이미 처리했거나 코퍼스 안에서 중복된 ID (custom_id가 겹치므로)
+            continue
+        skip.add(item.articleId)
+        yield item
+
+def _chunks(items: Iterator[RewriteBatchItemIn], size: int) -> Iterator[List[RewriteBatchItemIn]]:
+    chunk: List[RewriteBatchItemIn] = []
+    for it in items:
+        chunk.append(it)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+async def _run_chunk(chunk: List[RewriteBatchItemIn], tag: str, out, backend: BatchBackend, state: _State,
+                     work_dir: str, options: RewriteOptions, poll_interval: float, settle_sec: float,
+                     totals: Counter) -> None:
+    collector = BatchCollector()
+
+    async def one(item: RewriteBatchItemIn) -> RewriteBatchItemMultiResult:
+        request_id_var.set(item.articleId)
+        return await process_batch_item(item, options)
+
+    # 태스크는 생성 시점 컨텍스트를 복사하므로 collector가 설정된 상태로 만든다
+    token = offline_collector_var.set(collector)
+    try:
+        tasks = [asyncio.create_task(one(it)) for it in chunk]
+    finally:
+        offline_collector_var.reset(token)
+
+    written: Set[int] = set()
+
+    def flush() -> None:
+        for i, t in enumerate(tasks):
+            if i in written or not t.done():
+                continue
+            res = t.result()
+            out.write(res.model_dump_json() + "\n")
+            written.add(i)
+            totals["ok" if res.ok else "failed"] += 1
+            used = res.data.tokensUsedTotal if res.ok else (res.partial.tokensUsedTotal if res.partial else None)
+            if used is not None:
+                totals["inputTokens"] += used.input
+                totals["outputTokens"] += used.output
+        out.flush()
+
+    rnd = 0
+    while True:
+        await collector.wait_quiet(tasks, settle_sec)
+        flush()
+        if not collector.pending:
+            break
+        rnd += 1
+        path = os.path.join(work_dir, f"{tag}-round{rnd}.jsonl")
+        sha, inflight = collector.write_round(path)
+        print(f"{tag} round {rnd}: {len(inflight)} requests")
+        info = await _submit_and_wait(backend, state, path, sha, poll_interval)
+        for kind, file_id in (("out", info.output_file_id), ("err", info.error_file_id)):
+            if file_id:
+                dest = f"{path[:-len('.jsonl')]}.{kind}.jsonl"
+                await backend.download(file_id, dest)
+                await collector.resolve(inflight, dest)
+        collector.fail_missing(inflight, info.status)
+        totals["rounds"] += 1
+    totals["requests"] += collector.requests
+
+async def run_offline(corpus_path: str, out_path: str, backend: BatchBackend,
+                      work_dir: Optional[str] = None, options: Optional[RewriteOptions] = None,
+                      chunk_articles: Optional[int] = None, poll_interval: Optional[float] = None,
+                      settle_sec: float = 0.5) -> Dict[str, int]:
+    work_dir = work_dir or settings.OFFLINE_BATCH_WORK_DIR
+    os.makedirs(work_dir, exist_ok=True)
+    state = _State(os.path.join(work_dir, "state.json"))
+    totals: Counter = Counter()
+    items = _iter_corpus(corpus_path, _written_ids(out_path))
+    with open(out_path, "a", encoding="utf-8") as out:
+        for i, chunk in enumerate(_chunks(items, chunk_articles or settings.OFFLINE_BATCH_CHUNK_ARTICLES)):
+            await _run_chunk(chunk, f"chunk{i:04d}", out, backend, state, work_dir,
+                             options or RewriteOptions(),
+                             poll_interval if poll_interval is not None else settings.OFFLINE_BATCH_POLL_INTERVAL_SEC,
+                             settle_sec, totals)
+    return dict(totals)
+
+def parse_args(argv=None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Article Rewriter 오프라인 일괄 처리 (OpenAI Batch API)")
+    p.add_argument("--corpus", required=True, help="입력 JSONL (articleId, title, body)")
+    p.add_argument("--out", required=True, help="결과 JSONL (RewriteBatchItemMultiResult, 이어쓰기)")
+    p.add_argument("--work-dir", default=None, help="요청/결과 파일과 상태 파일 위치")
+    p.add_argument("--backend", choices=["openai", "local"], default="openai")
+    p.add_argument("--local-dir", default="data/fake-batch", help="--backend local의 파일 저장 위치")
+    p.add_argument("--chunk-articles", type=int, default=None)
+    p.add_argument("--poll-interval", type=float, default=None)
+    p.add_argument("--generation-mode", choices=["per_style", "fused"], default=None)
+    p.add_argument("--epi-mode", choices=["llm", "fast", "hybrid"], default=None)
+    return p.parse_args(argv)
+
+async def _main(args: argparse.Namespace) -> Dict[str, int]:
+    if args.backend == "local":
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        from bench.fake_batch import LocalBatchBackend
+        backend: BatchBackend = LocalBatchBackend(args.local_dir)
+        poll = 0.0 if args.poll_interval is None else args.poll_interval
+    else:
+        backend = OpenAIBatchBackend()
+        poll = args.poll_interval
+    options = RewriteOptions(generationMode=args.generation_mode, epiMode=args.epi_mode)
+    try:
+        return await run_offline(args.corpus, args.out, backend, args.work_dir, options,
+                                 args.chunk_articles, poll)
+    finally:
+        await close_client()
+        close_cache()
+        close_checkpoints()
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    t0 = time.time()
+    totals = asyncio.run(_main(args))
+    print(f"done in {time.time() - t0:.1f}s: {json.dumps(totals)}")
+
+if __name__ == "__main__":
+    main()
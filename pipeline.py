@@ -0,0 +1,587 @@
+import asyncio, json
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from settings import settings
+from schemas import (RewriteMultiResponse, RewriteVariant, TokensUsed, RewriteOptions, EpiMode,
+                     RewriteBatchItemIn, RewriteBatchItemMultiResult, BodyCompression,
+                     RewritePartialResponse, StageFailure)
+from dag import Stage, StageSkipped, run_dag, critical_path_ms
+from cache import get_cache, make_key
+from checkpoint import ArticleCheckpoint, get_checkpoints
+from singleflight import get_single_flight
+from telemetry import PIPELINE_ABORTED, STAGE_LATENCY, span, split_stage, to_thread, usage_ledger
+from resilience import DeadlineExceeded, deadline_scope, deadline_var, enforce_deadline
+from scheduler import priority_var, set_priority
+from chat_answers import get_chat_answers
+from epi import EPI_KEYS, build_epi_result
+from epi_local import LOCAL_MODEL, LLM_KEYS, score_text, score_batch, local_reason
+from rate_limiter import estimate_tokens
+from preprocess import PreparedBody, prepare_body, long_doc_segments
+from near_dup import get_near_dup_index, signature
+from prompts import (TITLE_SUMMARY_USER_TEMPLATE,
+                     TITLE_SUMMARY_FUSED_USER_TEMPLATE,
+                     TITLE_SUMMARY_REDUCE_USER_TEMPLATE,
+                     SEGMENT_SUMMARY_SYSTEM_PROMPT,
+                     SEGMENT_SUMMARY_USER_TEMPLATE,
+                     QUESTIONS_SYSTEM_PROMPT,
+                     QUESTIONS_USER_TEMPLATE,
+                     EPI_SYSTEM_PROMPT,
+                     EPI_ORIGINAL_USER_TEMPLATE,
+                     EPI_SUMMARIES_USER_TEMPLATE,
+                     )
+from llm_client import (
+    NewsStyle, _style_to_prompt, cache_route,
+    call_llm, call_llm_fused, fused_system_prompt, fused_user_prompt, suggest_questions_and_quiz, precompute_chat_answers,
+    offline_collector_var, OutputFormatError,
+    summarize_segment, call_llm_reduce,
+    evaluate_epi_original, evaluate_epi_summaries,
+    SUMMARY_TEMPERATURE, QUIZ_TEMPERATURE, EPI_TEMPERATURE, SEGMENT_TEMPERATURE,
+)
+
+DEFAULT_STYLES: List[NewsStyle] = ["CONCISE", "FRIENDLY", "NEUTRAL"]
+
+# 프롬프트에 본문을 싣는 스테이지 (본문 압축 절약량 집계용, map-reduce 때의 summary:*는 제외)
+_BODY_STAGES = ("summary:", "epi:original", "quiz")
+
+# 모든 스테이지 결과는 (..., input_tokens, output_tokens, model, latency_ms)로 끝난다.
+# 다른 스테이지 결과를 나눠 쓰는 스테이지는 토큰/지연을 0으로 두어 한 번만 집계되게 한다.
+
+class RewriteStagesFailed(Exception):
+    """기사의 일부 스테이지가 실패. 끝난 부분(partial)과 스테이지별 실패를 담는다."""
+
+    def __init__(self, partial: RewritePartialResponse, failures: List[StageFailure]):
+        roots = [f"{f.stage}({f.error})" for f in failures if not f.skipped]
+        super().__init__("스테이지 실패: " + ", ".join(roots))
+        self.partial = partial
+        self.failures = failures
+
+async def _through_cache(name: str, key: str, fn: Callable[[], Awaitable[Any]], hits: Set[str],
+                         checkpoint: Optional[ArticleCheckpoint] = None) -> Any:
+    """
+    체크포인트 -> 결과 캐시 조회 -> 미스면 실행 후 저장. 적중한 스테이지 이름은 hits에 기록.
+    같은 키가 이미 실행 중이면(중복 요청/배치 내 중복 기사) 그 결과를 나눠 받고 역시 hits에 기록한다.
+    checkpoint가 있으면 결과를 기사 체크포인트에도 모아 둔다. (저장은 기사가 실패했을 때 한 번)
+    """
+    if checkpoint is not None:
+        saved = checkpoint.get(name, key)
+        if saved is not None:
+            hits.add(name)
+            return saved
+
+    out = await _cached_call(name, key, fn, hits)
+    if checkpoint is not None:
+        checkpoint.record(name, key, out)
+    return out
+
+async def _cached_call(name: str, key: str, fn: Callable[[], Awaitable[Any]], hits: Set[str]) -> Any:
+    cache = get_cache()
+    if cache is not None:
+        cached = await cache.get(key)
+        if cached is not None:
+            hits.add(name)
+            return cached
+
+    async def run() -> Any:
+        out = await fn()
+        if cache is not None:
+            await cache.set(key, out)
+        return out
+
+    out, shared = await get_single_flight().do(key, name, run)
+    if shared:
+        hits.add(name)
+    return out
+
+def build_stages(title: str, body: str, styles: List[NewsStyle], hits: Set[str],
+                 fused: bool = False, epi_batched: bool = True,
+                 epi_mode: EpiMode = "llm", local: Optional[Set[str]] = None,
+                 segments: Optional[List[str]] = None,
+                 checkpoint: Optional[ArticleCheckpoint] = None) -> List[Stage]:
+    """
+    기사 1건의 LLM 호출 DAG.
+      summary:<STYLE> ─┐
+      epi:original ────┴─> epi:<STYLE>    (스타일별 체인, 원문 EPI는 기사당 1회 공유)
+      quiz                                (독립)
+    fused=True면 summary:fused 1회 호출이 모든 summary:<STYLE> 앞에 오고,
+    검증에 실패한 스타일만 개별 call_llm으로 보충한다.
+    epi_batched=True면 요약이 모두 나온 뒤 epi:summaries 1회 호출로 전 스타일을 채점하고,
+    빠진 스타일만 개별 채점한다. False면 각 스타일 요약이 끝나는 즉시 따로 채점한다.
+    epi_mode: "llm"(LLM 심사관) | "fast"(로컬 어휘 채점만) | "hybrid"(K/C/V/X/EVID는 로컬, S/SUBJ/F만 LLM)
+    segments가 있으면(긴 기사) map:<i> 구간 요약들이 동시에 돌고, summary:<STYLE>은
+    그 결과를 모아 스타일별 reduce 1회로 만든다. (이때 fused는 쓰지 않는다)
+    각 LLM 스테이지는 체크포인트(이전 시도에서 끝난 결과)와 내용 주소 캐시를 먼저 확인한다.
+    LLM 없이 끝난 스테이지는 local에 기록.
+    """
+    stages: List[Stage] = []
+    local = local if local is not None else set()
+    llm_keys = LLM_KEYS if epi_mode == "hybrid" else EPI_KEYS
+
+    def derived(parent: str, name: str) -> None:
+        # 부모 스테이지가 캐시/로컬에서 왔다면 나눠 쓴 스테이지도 같은 것으로 본다
+        if parent in hits:
+            hits.add(name)
+        if parent in local:
+            local.add(name)
+
+    def with_lexical(llm_comp: Dict[str, float], text: str) -> Dict[str, float]:
+        # hybrid: 어휘로 셀 수 있는 컴포넌트는 로컬 값, 나머지는 LLM 값
+        lexical = score_text(text)
+        return {k: (llm_comp[k] if k in llm_keys else lexical[k]) for k in EPI_KEYS}
+
+    # ----- 제목/요약 -----
+    segments = segments or []
+    map_names = [f"map:{i}" for i in range(len(segments))]
+    for i, segment in enumerate(segments):
+        async def map_fn(_deps, i=i, segment=segment):
+            key = make_key("segment", title, segment, f"{i + 1}/{len(segments)}",
+                           SEGMENT_SUMMARY_SYSTEM_PROMPT + SEGMENT_SUMMARY_USER_TEMPLATE,
+                           *cache_route(f"map:{i}", SEGMENT_TEMPERATURE))
+            return await _through_cache(
+                f"map:{i}", key, lambda: summarize_segment(title, segment, i, len(segments)), hits, checkpoint
+            )
+
+        stages.append(Stage(f"map:{i}", map_fn))
+    if segments:
+        fused = False
+
+    if fused:
+        async def fused_fn(_deps):
+            key = make_key("summary_fused", title, body, ",".join(styles),
+                           fused_system_prompt(styles) + TITLE_SUMMARY_FUSED_USER_TEMPLATE,
+                           *cache_route("summary:fused", SUMMARY_TEMPERATURE))
+            try:
+                return await _through_cache(
+                    "summary:fused", key, lambda: call_llm_fused(title, body, styles), hits, checkpoint
+                )
+            except OutputFormatError as e:
+                # 출력이 끝내 형식에 맞지 않으면 모든 스타일을 개별 호출로 보충 (이미 쓴 토큰은 집계)
+                # 대기열 거절/기한 초과/API 오류는 그대로 올린다
+                return [{}, e.tokens_in, e.tokens_out, e.model, e.latency_ms]
+
+        stages.append(Stage("summary:fused", fused_fn))
+
+    for style in styles:
+        async def summary_fn(deps, style=style):
+            if segments:
+                partials = [deps[m][0] for m in map_names]
+                sys_prompt = _style_to_prompt(style)
+                key = make_key("summary_reduce", title, "\n\n".join(partials), style,
+                               sys_prompt + TITLE_SUMMARY_REDUCE_USER_TEMPLATE,
+                               *cache_route(f"summary:{style}", SUMMARY_TEMPERATURE))
+                return await _through_cache(
+                    f"summary:{style}", key, lambda: call_llm_reduce(title, partials, sys_prompt), hits, checkpoint
+                )
+            if fused:
+                pairs, _, _, model, _ = deps["summary:fused"]
+                if style in pairs:
+                    new_title, summary = pairs[style]
+                    derived("summary:fused", f"summary:{style}")
+                    return [new_title, summary, 0, 0, model, 0]
+            sys_prompt = _style_to_prompt(style)
+            key = make_key("summary", title, body, style,
+                           sys_prompt + TITLE_SUMMARY_USER_TEMPLATE,
+                           *cache_route(f"summary:{style}", SUMMARY_TEMPERATURE))
+            return await _through_cache(
+                f"summary:{style}", key, lambda: call_llm(title, body, sys_prompt), hits, checkpoint
+            )
+
+        stages.append(Stage(f"summary:{style}", summary_fn,
+                            deps=map_names or (["summary:fused"] if fused else [])))
+
+    # ----- EPI -----
+    async def epi_original_fn(_deps):
+        if epi_mode == "fast":
+            local.add("epi:original")
+            return [score_text(f"{title}\n{body}"), 0, 0, LOCAL_MODEL, 0]
+        key = make_key("epi_original", title, body, "",
+                       EPI_SYSTEM_PROMPT + EPI_ORIGINAL_USER_TEMPLATE + ",".join(llm_keys),
+                       *cache_route("epi:original", EPI_TEMPERATURE))
+        comp, *rest = await _through_cache(
+            "epi:original", key, lambda: evaluate_epi_original(title, body, llm_keys), hits, checkpoint
+        )
+        if epi_mode == "hybrid":
+            comp = with_lexical(comp, f"{title}\n{body}")
+        return [comp, *rest]
+
+    stages.append(Stage("epi:original", epi_original_fn))
+
+    def epi_summaries_key(name: str, orig_comp: Dict[str, float], summaries: Dict[str, Any]) -> str:
+        # 원문 점수와 생성 제목/요약도 EPI 프롬프트의 일부이므로 해시에 포함
+        return make_key("epi_summaries", title, body, ",".join(summaries),
+                        EPI_SYSTEM_PROMPT + EPI_SUMMARIES_USER_TEMPLATE + ",".join(llm_keys)
+                        + json.dumps([orig_comp, summaries], ensure_ascii=False, sort_keys=True),
+                        *cache_route(name, EPI_TEMPERATURE))
+
+    def score_locally(orig_comp: Dict[str, float], summaries: Dict[str, Any]) -> Dict[str, Any]:
+        # 요약 여러 개를 결합 정규식 1회 스캔으로 채점
+        comps = score_batch([f"{t}\n{s}" for t, s in summaries.values()])
+        return {style: [c, local_reason(orig_comp, c)] for style, c in zip(summaries, comps)}
+
+    async def score_summaries(name: str, orig_comp: Dict[str, float], summaries: Dict[str, Any]):
+        if epi_mode == "fast":
+            local.add(name)
+            return [score_locally(orig_comp, summaries), 0, 0, LOCAL_MODEL, 0]
+        scored, *rest = await _through_cache(
+            name, epi_summaries_key(name, orig_comp, summaries),
+            lambda: evaluate_epi_summaries(title, orig_comp, summaries, llm_keys), hits, checkpoint
+        )
+        if epi_mode == "hybrid":
+            scored = {
+                style: [with_lexical(comp, "\n".join(summaries[style])), reason]
+                for style, (comp, reason) in scored.items()
+            }
+        return [scored, *rest]
+
+    if epi_batched:
+        async def epi_batch_fn(deps):
+            orig_comp = deps["epi:original"][0]
+            summaries = {s: deps[f"summary:{s}"][:2] for s in styles}
+            try:
+                return await score_summaries("epi:summaries", orig_comp, summaries)
+            except OutputFormatError as e:
+                # 채점 출력이 끝내 형식에 맞지 않으면 로컬 사전 채점으로 대신한다 (이미 쓴 토큰은 집계)
+                # 대기열 거절/기한 초과/API 오류는 그대로 올린다
+                return [score_locally(orig_comp, summaries),
+                        e.tokens_in, e.tokens_out, LOCAL_MODEL, e.latency_ms]
+
+        stages.append(Stage("epi:summaries", epi_batch_fn,
+                            deps=["epi:original"] + [f"summary:{s}" for s in styles]))
+
+    for style in styles:
+        async def epi_fn(deps, style=style):
+            if epi_batched:
+                scored, _, _, model, _ = deps["epi:summaries"]
+                if style in scored:
+                    comp, reason = scored[style]
+                    derived("epi:summaries", f"epi:{style}")
+                    return [comp, reason, 0, 0, model, 0]
+            orig_comp = deps["epi:original"][0]
+            new_title, summary = deps[f"summary:{style}"][:2]
+            scored, tin, tout, model, lat = await score_summaries(
+                f"epi:{style}", orig_comp, {style: [new_title, summary]}
+            )
+            comp, reason = scored[style]
+            return [comp, reason, tin, tout, model, lat]
+
+        deps = ["epi:original", f"summary:{style}"]
+        if epi_batched:
+            deps.append("epi:summaries")
+        stages.append(Stage(f"epi:{style}", epi_fn, deps=deps))
+
+    # ----- 질문/퀴즈 -----
+    async def quiz_fn(_deps):
+        key = make_key("quiz", title, body, "",
+                       QUESTIONS_SYSTEM_PROMPT + QUESTIONS_USER_TEMPLATE,
+                       *cache_route("quiz", QUIZ_TEMPERATURE))
+        return await _through_cache(
+            "quiz", key, lambda: suggest_questions_and_quiz(title, body), hits, checkpoint
+        )
+
+    stages.append(Stage("quiz", quiz_fn))
+    return stages
+
+def _fused_saved_input(title: str, body: str, styles: List[NewsStyle],
+                       served: List[NewsStyle], fused_in: int) -> int:
+    """
+    fused 1회 호출의 실제 입력 토큰을, 같은 스타일들을 개별 호출했을 때의 추정치와 비교한 절약량.
+    (추정치 비율로 환산해 실제 usage 스케일에 맞춘다)
+    """
+    if not served or not fused_in:
+        return 0
+    est_fused = estimate_tokens(fused_system_prompt(styles)) + estimate_tokens(fused_user_prompt(title, body, styles))
+    user_est = estimate_tokens(TITLE_SUMMARY_USER_TEMPLATE.format(title=title, body=body[:settings.MAX_BODY_CHARS]))
+    est_separate = sum(estimate_tokens(_style_to_prompt(s)) + user_est for s in served)
+    return max(0, int(fused_in * est_separate / max(est_fused, 1)) - fused_in)
+
+async def rewrite_article(article_id: str, title: str, body: str,
+                          options: Optional[RewriteOptions] = None,
+                          styles: Optional[List[NewsStyle]] = None) -> RewriteMultiResponse:
+    """
+    스타일별 제목/요약 + EPI, 기사당 1회 질문/퀴즈를 DAG로 동시에 생성한다.
+    latencyMsTotal은 "sum"(단계 지연 합) 또는 "critical_path"(가장 긴 체인) 기준.
+    캐시에서 온 스테이지는 토큰/지연을 0으로 집계한다.
+    본문은 전처리(상용구 제거/추출 압축)를 1회 거친 뒤 모든 스테이지가 공유한다.
+    일부 스테이지가 실패하면 끝난 스테이지를 체크포인트에 저장하고 RewriteStagesFailed를 올린다.
+    이미 처리한 기사와 본문이 거의 같으면(유사 중복 색인) 그 결과를 재사용한다. (nearDupMode)
+    끝나면 추천 질문 답변을 백그라운드에서 미리 만든다. (CHAT_PRECOMPUTE_ENABLED)
+    """
+    options = options or RewriteOptions()
+    styles = styles or DEFAULT_STYLES
+    # 요청 기한: 재시도/헤지는 이 안에서만 (바깥에 더 짧은 기한이 있으면 그쪽을 따른다).
+    # 기한이 지나면 대기 중/진행 중 호출을 모두 취소하고 DeadlineExceeded
+    with span("rewrite_article", articleId=article_id) as sp, deadline_scope(_article_deadline()), \
+            usage_ledger() as ledger:
+        try:
+            async with enforce_deadline():
+                result = await _rewrite_or_reuse(article_id, title, body, options, styles, sp, ledger)
+        except DeadlineExceeded:
+            PIPELINE_ABORTED.inc(reason="deadline")
+            raise
+        except asyncio.CancelledError:
+            PIPELINE_ABORTED.inc(reason="cancelled")
+            raise
+    _schedule_chat_answers(result)
+    return result
+
+def _article_deadline() -> Optional[float]:
+    """
+    기사 1건 기한. 오프라인 일괄 처리(Batch API 결과를 분~시간 단위로 기다림)와 잡 워커(offline 우선순위)는
+    기사 기한을 두지 않는다 (바깥 기한이 있으면 그것만 따른다). 그 밖에는 REQUEST_DEADLINE_SEC
+    """
+    if offline_collector_var.get() is not None or priority_var.get() == "offline":
+        return None
+    return settings.REQUEST_DEADLINE_SEC
+
+_background: Set[asyncio.Task] = set()
+
+def _schedule_chat_answers(result: RewriteMultiResponse) -> None:
+    """추천 질문의 첫 턴 답변을 백그라운드에서 미리 만든다 (CHAT_PRECOMPUTE_ENABLED, 응답을 늦추지 않음)"""
+    if get_chat_answers() is None or not result.questions:
+        return
+    wanted = settings.CHAT_PRECOMPUTE_STYLES
+    summaries = [v.summary for v in result.variants if not wanted or v.newsStyle in wanted]
+    if not summaries:
+        return
+    task = asyncio.create_task(_precompute_chat(result.articleId, summaries, list(result.questions)))
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+async def _precompute_chat(article_id: str, summaries: List[str], questions: List[str]) -> None:
+    # 복사된 요청 컨텍스트에서 요청 기한은 떼어 낸다 (요청이 끝나거나 끊겨도 계속)
+    deadline_var.set(None)
+    set_priority("offline")
+    with span("precompute_chat", articleId=article_id) as sp:
+        sp.update(answers=await precompute_chat_answers(article_id, summaries, questions))
+
+async def _rewrite_or_reuse(article_id: str, title: str, body: str, options: RewriteOptions,
+                            styles: List[NewsStyle], sp: Dict[str, Any],
+                            ledger: Dict[str, List[int]]) -> RewriteMultiResponse:
+    dup_mode = options.nearDupMode or settings.NEAR_DUP_MODE
+    index = get_near_dup_index() if dup_mode != "off" else None
+    # 서명은 본문 길이에 비례하는 CPU 작업(3천 자에 수 ms)이라 스레드에서
+    sig = await to_thread("near_dup_signature", signature, body) if index is not None else None
+    scope = _near_dup_scope(options, styles)
+    if sig is not None:
+        # 같은 articleId는 제외: 고쳐서 다시 보낸 기사가 자기 이전 결과를 재사용하지 않게
+        found = index.lookup(sig, scope, exclude=article_id)
+        if found is not None:
+            src_id, sim, base = found
+            sp.update(nearDuplicateOf=src_id, similarity=round(sim, 3))
+            out = _reuse_near_dup(article_id, src_id, sim, base)
+            if dup_mode == "retitle":
+                await _retitle(out, title, body, options, styles, ledger)
+            return out
+    result = await _rewrite_article(article_id, title, body, options, styles, sp, ledger)
+    if sig is not None:
+        index.add(article_id, sig, scope, result)
+    return result
+
+def _near_dup_scope(options: RewriteOptions, styles: List[NewsStyle]) -> str:
+    """결과를 그대로 나눠 쓸 수 있는 범위: 생성/EPI 방식과 스타일 목록이 같아야 한다."""
+    return "|".join([options.generationMode or settings.GENERATION_MODE,
+                     options.epiMode or settings.EPI_MODE, ",".join(styles)])
+
+def _reuse_near_dup(article_id: str, src_id: str, sim: float, base: RewriteMultiResponse) -> RewriteMultiResponse:
+    """원 기사 결과를 이 기사 것으로 복사. LLM 호출이 없으므로 토큰/지연 0, 원 기사 입력 토큰은 절약분으로"""
+    out = base.model_copy(deep=True)
+    out.articleId = article_id
+    for v in out.variants:
+        v.articleId = article_id
+        v.latencyMs = 0
+        v.cached = True
+    out.tokensUsedTotal = TokensUsed(savedInput=base.tokensUsedTotal.input)
+    out.latencyMsTotal = 0
+    out.cacheHit = True
+    out.cachedStages = sorted(base.stageModels)
+    out.resumedStages = []
+    out.tokensByModel = {}
+    out.nearDuplicateOf = src_id
+    out.nearDuplicateSimilarity = round(sim, 3)
+    return out
+
+def _prepare(title: str, body: str) -> Tuple[PreparedBody, List[str]]:
+    """본문 전처리(추출 압축) + 긴 기사 구간 분할. 긴 기사는 수십 ms 걸리는 CPU 작업이라 스레드에서 부른다"""
+    prepared = prepare_body(title, body)
+    return prepared, long_doc_segments(prepared, title)
+
+async def _retitle(out: RewriteMultiResponse, title: str, body: str, options: RewriteOptions,
+                   styles: List[NewsStyle], ledger: Dict[str, List[int]]) -> None:
+    """
+    "retitle": 이 기사 제목으로 제목/요약 스테이지만 다시 돌려 newTitle만 바꾼다.
+    요약/EPI/퀴즈는 원 기사 것을 그대로 둔다. (제목 전용 호출이 없어 제목/요약 호출 결과에서 제목만 쓴다)
+    """
+    prepared, segments = await to_thread("prepare_body", _prepare, title, body)
+    fused = (options.generationMode or settings.GENERATION_MODE) == "fused" and not segments
+    hits: Set[str] = set()
+    stages = [st for st in build_stages(title, prepared.body, styles, hits, fused=fused, segments=segments)
+              if st.name.startswith(("summary:", "map:"))]
+    run = await run_dag(stages)
+    r = run.results
+    for v in out.variants:
+        v.newTitle = r[f"summary:{v.newsStyle}"][0].strip()
+        v.cached = False
+    fresh = [r[st.name][-4:-2] for st in stages if st.name not in hits]
+    out.tokensUsedTotal.input = sum(tin for tin, _ in fresh)
+    out.tokensUsedTotal.output = sum(tout for _, tout in fresh)
+    out.tokensUsedTotal.savedInput = max(0, out.tokensUsedTotal.savedInput - out.tokensUsedTotal.input)
+    out.latencyMsTotal = run.wall_ms
+    out.cacheHit = all(st.name in hits for st in stages)
+    out.cachedStages = sorted(set(out.cachedStages) - {st.name for st in stages} | hits)
+    out.stageModels.update({st.name: r[st.name][-2] for st in stages})
+    out.tokensByModel = {m: TokensUsed(input=tin, output=tout) for m, (tin, tout) in sorted(ledger.items())}
+
+async def _rewrite_article(article_id: str, title: str, body: str, options: RewriteOptions,
+                           styles: List[NewsStyle], sp: Dict[str, Any],
+                           ledger: Dict[str, List[int]]) -> RewriteMultiResponse:
+    reporting = options.latencyReporting or settings.LATENCY_REPORTING
+    fused = (options.generationMode or settings.GENERATION_MODE) == "fused"
+    epi_mode = options.epiMode or settings.EPI_MODE
+
+    # 아주 긴 기사는 제목/요약만 구간 요약(map) -> 스타일별 reduce로. EPI/퀴즈는 압축 본문 그대로
+    prepared, segments = await to_thread("prepare_body", _prepare, title, body)
+    body = prepared.body
+    fused = fused and not segments
+
+    checkpoints = get_checkpoints()
+    checkpoint = await checkpoints.load(article_id) if checkpoints is not None else None
+
+    hits: Set[str] = set()
+    local: Set[str] = set()
+    stages = build_stages(title, body, styles, hits,
+                          fused=fused, epi_batched=settings.EPI_BATCH_SUMMARIES,
+                          epi_mode=epi_mode, local=local, segments=segments, checkpoint=checkpoint)
+    # 한 스테이지가 실패해도 독립 스테이지는 끝까지 돌려 결과를 체크포인트에 남긴다
+    try:
+        run = await run_dag(stages, fail_fast=False)
+    except asyncio.CancelledError:
+        # 연결 끊김/기한 초과로 취소: 끝난 스테이지는 결과 캐시에 이미 있고, 체크포인트에도 남겨
+        # 같은 기사를 다시 요청하면 빠진 스테이지만 실행한다
+        if checkpoint is not None:
+            await asyncio.shield(checkpoints.save(checkpoint))
+        raise
+    r = run.results
+    done = [st for st in stages if st.name in r]
+    for st in done:
+        kind, style = split_stage(st.name)
+        source = "cache" if st.name in hits else ("local" if st.name in local else "llm")
+        STAGE_LATENCY.observe(run.duration_ms(st.name) / 1000, stage=kind, style=style, source=source)
+    sp.update(stages=len(stages), cached=len(hits), failed=len(run.errors), wallMs=run.wall_ms)
+
+    # 스테이지별 (입력, 출력, 지연) — 캐시/체크포인트 적중이면 0
+    usage: Dict[str, tuple] = {}
+    for st in done:
+        tin, tout, _, lat = r[st.name][-4:]
+        usage[st.name] = (0, 0, 0) if st.name in hits else (tin, tout, lat)
+    durations = {name: u[2] for name, u in usage.items()}
+
+    def lat_of(name: str) -> int:
+        return durations.get(name, 0)
+
+    # map 구간들은 병렬이므로 가장 느린 구간만 체인 지연에 더한다
+    map_lat = max((lat_of(f"map:{i}") for i in range(len(segments))), default=0)
+
+    variants: List[RewriteVariant] = []
+    for style in styles:
+        if f"epi:{style}" not in r:     # 요약 또는 EPI 체인이 실패한 스타일 (epi:<STYLE>은 요약/원문 EPI 뒤에 온다)
+            continue
+        new_title, summary, *_, model, _ = r[f"summary:{style}"]
+        comp, reason = r[f"epi:{style}"][:2]
+        variants.append(RewriteVariant(
+            newsStyle=style,
+            articleId=article_id,
+            newTitle=new_title.strip(),
+            summary=summary.strip(),
+            model=model,
+            # 이 스타일 체인이 거친 호출들 (공유 호출 포함, 원문 EPI는 병렬이라 제외)
+            latencyMs=(map_lat + lat_of("summary:fused") + lat_of(f"summary:{style}")
+                       + lat_of("epi:summaries") + lat_of(f"epi:{style}")),
+            epi=build_epi_result(r["epi:original"][0], comp, reason),
+            cached={f"summary:{style}", f"epi:{style}"} <= hits,
+        ))
+
+    if run.errors:
+        # 끝난 스테이지는 저장해 두고, 재요청 때는 빠진 스테이지만 실행한다
+        if checkpoint is not None:
+            await checkpoints.save(checkpoint)
+        questions, quiz = r["quiz"][:2] if "quiz" in r else ([], None)
+        raise RewriteStagesFailed(
+            RewritePartialResponse(
+                articleId=article_id,
+                variants=variants,
+                questions=questions,
+                quiz=quiz,
+                tokensUsedTotal=TokensUsed(input=sum(u[0] for u in usage.values()),
+                                           output=sum(u[1] for u in usage.values())),
+                completedStages=sorted(r),
+            ),
+            [StageFailure(stage=name, error=str(e), skipped=isinstance(e, StageSkipped))
+             for name, e in run.errors.items()],
+        )
+    if checkpoint is not None:
+        await checkpoints.clear(checkpoint)
+
+    questions, quiz = r["quiz"][:2]
+
+    if reporting == "critical_path":
+        latency_total = critical_path_ms(stages, durations)
+    else:
+        latency_total = sum(durations.values())
+
+    # 절약 추정: fused 본문 1회 전송 + 원문 EPI를 스타일 수만큼 반복하지 않은 분
+    saved_in = (len(styles) - 1) * usage["epi:original"][0]
+    if fused:
+        pairs = r["summary:fused"][0]
+        saved_in += _fused_saved_input(title, body, styles, [s for s in styles if s in pairs],
+                                       usage["summary:fused"][0])
+    # 본문 압축: 실제로 본문을 실어 보낸 호출(캐시/로컬/파생 제외) 수만큼
+    body_stages = ("epi:original", "quiz") if segments else _BODY_STAGES
+    body_calls = sum(1 for name, u in usage.items() if name.startswith(body_stages) and u[0])
+    compression_saved = body_calls * prepared.saved_tokens
+    saved_in += compression_saved
+
+    return RewriteMultiResponse(
+        articleId=article_id,
+        variants=variants,
+        questions=questions,
+        quiz=quiz,
+        tokensUsedTotal=TokensUsed(
+            input=sum(u[0] for u in usage.values()),
+            output=sum(u[1] for u in usage.values()),
+            savedInput=saved_in,
+        ),
+        latencyMsTotal=latency_total,
+        # LLM을 부르지 않은 로컬 스테이지는 적중 판정에서 제외
+        cacheHit=all(st.name in hits or st.name in local for st in stages),
+        cachedStages=sorted(hits),
+        resumedStages=sorted(checkpoint.resumed) if checkpoint is not None else [],
+        stageModels={st.name: r[st.name][-2] for st in stages},
+        tokensByModel={m: TokensUsed(input=tin, output=tout) for m, (tin, tout) in sorted(ledger.items())},
+        longDocSegments=len(segments),
+        compression=BodyCompression(
+            originalTokens=prepared.original_tokens,
+            compressedTokens=prepared.tokens,
+            ratio=prepared.ratio,
+            extractive=prepared.compressed,
+            savedInputEstimate=compression_saved,
+        ),
+    )
+
+async def process_batch_item(item: RewriteBatchItemIn,
+                             options: Optional[RewriteOptions] = None) -> RewriteBatchItemMultiResult:
+    """
+    배치 아이템 1건 처리. 예외는 ok=False 결과로 변환한다. (배치/스트림/잡 공용)
+    일부 스테이지만 실패했으면 끝난 부분(partial)과 실패 스테이지(failedStages)를 함께 돌려준다.
+    """
+    body = (item.body or "").strip()
+    if len(body) < 50:
+        return RewriteBatchItemMultiResult(
+            articleId=item.articleId, ok=False,
+            error="본문이 너무 짧습니다(최소 50자)."
+        )
+    try:
+        data = await rewrite_article(item.articleId, item.title, body, options)
+        return RewriteBatchItemMultiResult(articleId=item.articleId, ok=True, data=data)
+    except RewriteStagesFailed as e:
+        return RewriteBatchItemMultiResult(articleId=item.articleId, ok=False, error=str(e),
+                                           partial=e.partial, failedStages=e.failures)
+    except Exception as e:
+        return RewriteBatchItemMultiResult(articleId=item.articleId, ok=False, error=str(e))
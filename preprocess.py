@@ -0,0 +1,162 @@
+import math, re
+from collections import Counter
+from dataclasses import dataclass
+from typing import List, Set
+from settings import settings
+from rate_limiter import estimate_tokens
+
+# 기사 본문 전처리: 상용구 제거 -> (예산 초과 시) 추출 요약으로 문장 선별
+# 기사당 1회 계산해 모든 스테이지가 같은 본문을 쓴다. (캐시 키도 압축 본문 기준)
+# 아주 긴 기사는 제목/요약만 map-reduce(구간 요약 -> 스타일별 통합)로 따로 만든다.
+
+# 줄 단위로 통째로 지우는 상용구 (바이라인, 저작권/광고/구독 안내, 관련기사 목록 등)
+# 저작권 표시는 본문 문장에도 나오므로(저작권 분쟁 기사 등) 꼬리말처럼 짧은 줄만 지운다
+_COPYRIGHT = r"(?:무단\s?전재|재배포\s?금지|All\s+rights\s+reserved|Copyright|ⓒ|©)"
+_BOILERPLATE_LINE = re.compile(
+    r"^\s*(?:"
+    r"\[?[가-힣]{2,4}\s?(?:기자|특파원|통신원)\]?\s*(?:[\w.+-]+@[\w-]+\.[\w.]+)?\s*$"   # 홍길동 기자 (이메일)
+    r"|[\w.+-]+@[\w-]+\.[\w.]+\s*$"                                                  # 이메일만 있는 줄
+    r"|(?=.{0,80}$)(?:.{0,10}" + _COPYRIGHT + r".*|.*" + _COPYRIGHT + r".{0,30})"   # 짧은 저작권 꼬리말 (표시가 줄 앞/끝 근처)
+    r"|(?:\[?광고\]|▶|☞|■\s?관련\s?기사|관련\s?기사|많이\s?본\s?뉴스|기사\s?제보|구독하기).*"
+    r")$",
+    re.IGNORECASE | re.MULTILINE,
+)
+_SPACES = re.compile(r"[ \t\u00a0\u200b]+")
+_BLANK_LINES = re.compile(r"\n\s*\n+")
+_SENTENCE = re.compile(r"(?:[^.!?。…\n]|(?<=\d)\.(?=\d))+(?:[.!?。…]+[\"'”’)]*|\n|$)")
+_HANGUL_WORD = re.compile(r"[가-힣]{2,}|[A-Za-z]{3,}|\d+(?:[.,]\d+)?")
+
+@dataclass
+class PreparedBody:
+    body: str                 # 스테이지들이 공유하는 본문
+    cleaned: str              # 상용구만 제거한 전체 본문 (긴 기사 map 단계 입력)
+    original_tokens: int
+    tokens: int
+    compressed: bool          # 문장 선별까지 했는지 (상용구 제거만이면 False)
+
+    @property
+    def ratio(self) -> float:
+        """압축 후/전 토큰 비율 (1.0 = 그대로)"""
+        return round(self.tokens / max(self.original_tokens, 1), 3)
+
+    @property
+    def saved_tokens(self) -> int:
+        """본문을 싣는 호출 1회당 줄어든 입력 토큰(추정)"""
+        return max(0, self.original_tokens - self.tokens)
+
+def strip_boilerplate(body: str) -> str:
+    """바이라인/저작권·광고 줄 제거, 연속 공백·빈 줄 정리."""
+    text = _BOILERPLATE_LINE.sub("", body.replace("\r\n", "\n"))
+    text = _SPACES.sub(" ", text)
+    text = _BLANK_LINES.sub("\n\n", text)
+    return "\n".join(line.strip() for line in text.split("\n")).strip()
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE.findall(text) if s.strip()]
+
+def _terms(text: str) -> Set[str]:
+    """한글은 조사/어미 변화에 덜 민감하도록 단어 내 2글자 바이그램, 영문/숫자는 단어 그대로."""
+    out: Set[str] = set()
+    for w in _HANGUL_WORD.findall(text):
+        if "가" <= w[0] <= "힣":
+            out.update(w[i:i + 2] for i in range(len(w) - 1))
+        else:
+            out.add(w.lower())
+    return out
+
+def rank_sentences(title: str, sentences: List[str]) -> List[float]:
+    """
+    로컬 추출 요약 점수: 다른 문장들과 공유하는 용어가 많을수록(중심성),
+    제목과 겹칠수록, 앞쪽 문장일수록 높다. (LLM 호출 없음, O(문장 수 x 용어 수))
+    """
+    terms = [_terms(s) for s in sentences]
+    df = Counter(t for ts in terms for t in ts)
+    title_terms = _terms(title)
+    n = len(sentences)
+    scores: List[float] = []
+    for i, ts in enumerate(terms):
+        if not ts:
+            scores.append(0.0)
+            continue
+        centrality = sum(df[t] - 1 for t in ts) / (math.sqrt(len(ts)) * max(n - 1, 1))
+        title_overlap = len(ts & title_terms) / max(len(title_terms), 1)
+        position = 1.0 / (1.0 + i / 3)     # 리드 문장 가중
+        scores.append(centrality + title_overlap + 0.5 * position)
+    return scores
+
+def extract_to_budget(title: str, text: str, budget_tokens: int) -> str:
+    """점수 높은 문장부터 예산까지 채우고 원래 순서로 다시 잇는다. 첫 문장(리드)은 항상 포함."""
+    sentences = split_sentences(text)
+    if not sentences:
+        return text
+    scores = rank_sentences(title, sentences)
+    order = [0] + sorted(range(1, len(sentences)), key=lambda i: scores[i], reverse=True)
+    picked, used = [], 0
+    for i in order:
+        cost = estimate_tokens(sentences[i])
+        if picked and used + cost > budget_tokens:
+            continue
+        picked.append(i)
+        used += cost
+    return " ".join(sentences[i] for i in sorted(picked))
+
+def prepare_body(title: str, body: str) -> PreparedBody:
+    """
+    기사 본문을 프롬프트에 싣기 전에 1회 전처리한다.
+    BODY_TOKEN_BUDGET 이하면 상용구만 제거, 넘으면 추출 요약으로 예산 안에 맞춘다.
+    (MAX_BODY_CHARS는 llm_client에서 최종 안전장치로 그대로 유지)
+    """
+    original_tokens = estimate_tokens(body)
+    if not settings.BODY_PREPROCESS_ENABLED:
+        return PreparedBody(body, body, original_tokens, original_tokens, False)
+    text = cleaned = strip_boilerplate(body) or body
+    compressed = False
+    if estimate_tokens(text) > settings.BODY_TOKEN_BUDGET:
+        text = extract_to_budget(title, text, settings.BODY_TOKEN_BUDGET)
+        compressed = True
+    return PreparedBody(text, cleaned, original_tokens, estimate_tokens(text), compressed)
+
+def split_segments(text: str, max_tokens: int) -> List[str]:
+    """
+    긴 본문을 문단 경계로 max_tokens 이하 구간들로 나눈다.
+    한 문단이 너무 길면 그 문단은 문장 경계로 다시 나눈다.
+    """
+    units: List[str] = []
+    for para in (p.strip() for p in text.split("\n\n")):
+        if not para:
+            continue
+        if estimate_tokens(para) <= max_tokens:
+            units.append(para)
+        else:
+            units.extend(split_sentences(para))
+
+    segments: List[str] = []
+    buf: List[str] = []
+    used = 0
+    for unit in units:
+        cost = estimate_tokens(unit)
+        if buf and used + cost > max_tokens:
+            segments.append("\n\n".join(buf))
+            buf, used = [], 0
+        buf.append(unit)
+        used += cost
+    if buf:
+        segments.append("\n\n".join(buf))
+    return segments
+
+def long_doc_segments(prepared: PreparedBody, title: str = "") -> List[str]:
+    """
+    상용구 제거 본문이 LONG_DOC_TOKEN_THRESHOLD를 넘으면 map-reduce용 구간 목록, 아니면 빈 목록.
+    구간마다 LLM 호출 1회이므로 입력은 MAX_BODY_CHARS까지, 구간은 LONG_DOC_MAX_SEGMENTS개까지
+    (넘으면 첫 구간 + 점수 높은 구간만 원래 순서로 남긴다).
+    """
+    text = prepared.cleaned[:settings.MAX_BODY_CHARS]
+    if estimate_tokens(text) <= settings.LONG_DOC_TOKEN_THRESHOLD:
+        return []
+    segments = split_segments(text, settings.LONG_DOC_SEGMENT_TOKENS)
+    limit = max(2, settings.LONG_DOC_MAX_SEGMENTS)
+    if len(segments) > limit:
+        scores = rank_sentences(title, segments)
+        keep = [0] + sorted(range(1, len(segments)), key=lambda i: scores[i], reverse=True)[:limit - 1]
+        segments = [segments[i] for i in sorted(keep)]
+    return segments if len(segments) > 1 else []
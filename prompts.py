@@ -41,6 +41,42 @@ TITLE_SUMMARY_USER_TEMPLATE = """원래 제목:
 }}
 """
 
+# 긴 기사 map 단계: 구간별 사실 요약 (스타일 없이, 평문 출력)
+SEGMENT_SUMMARY_SYSTEM_PROMPT = """너는 긴 기사를 나눠 읽는 편집 보조자다.
+- 주어진 구간에서만 사실을 가져온다. 추측이나 날조는 금지.
+- 인물/기관, 수치, 날짜, 인과관계 등 핵심 사실을 빠짐없이 남긴다.
+- 한국어 3~6문장, 평문으로만 출력한다. (JSON/목록 기호/머릿말 금지)
+"""
+
+SEGMENT_SUMMARY_USER_TEMPLATE = """기사 제목:
+{title}
+
+본문 구간 ({index}/{total}):
+{segment}
+"""
+
+# 긴 기사 reduce 단계: 구간 요약들로 스타일별 제목/요약 생성 (SYSTEM은 스타일 프롬프트 그대로)
+TITLE_SUMMARY_REDUCE_USER_TEMPLATE = """원래 제목:
+{title}
+
+기사가 길어 구간별로 먼저 요약했다. 아래 구간 요약들을 기사 본문으로 보고 작성한다.
+구간 요약 (기사 순서대로):
+{segments}
+
+출력 포맷(JSON 엄수, 다른 말 금지):
+{{
+  "newTitle": "<새로운 한글 제목>",
+  "summary": "<재미있고 흥미로운 요약: 3~5문장>"
+}}
+"""
+
+# JSON 교정 재요청: 형식이 깨진 출력을 내용은 그대로 두고 형식만 고친다
+JSON_REPAIR_SYSTEM_PROMPT = """너는 JSON 교정기다.
+- [깨진 출력]을 [출력 형식]에 맞는 JSON 객체 하나로 고친다.
+- 내용(문장, 수치)은 바꾸지 않는다. 빠진 키만 깨진 출력에 근거해 채운다.
+- JSON 이외의 텍스트(설명, 코드블록, 백틱) 출력 금지.
+"""
+
 # 질문 4개 + 예/아니오 퀴즈(정답 YES/NO) 생성 프롬프트
 QUESTIONS_SYSTEM_PROMPT = """너는 기사 이해를 돕는 코치다.
 - 사실은 기사 본문에서만 근거를 가져온다(추측/날조/선동 금지).
@@ -82,6 +118,14 @@ CHAT_SYSTEM_PROMPT = """
 - 답변은 한국어로, 친근하고 간결하게.
 """
 
+# 챗봇 이전 대화 누적 요약용 SYSTEM 프롬프트 (토큰 예산을 넘긴 오래된 턴을 접을 때)
+CHAT_HISTORY_SUMMARY_PROMPT = """너는 대화 기록을 압축하는 도우미다.
+- [기존 요약]과 [새로 접을 대화]를 합쳐 하나의 요약으로 다시 쓴다.
+- 사용자가 취한 입장(찬성/반대), 물어본 핵심 질문, 어시스턴트가 제시한 주요 근거와 결론을 남긴다.
+- 인사말, 반복, 군더더기는 버린다. 한국어 5문장 이내.
+- 요약 본문만 출력한다.
+"""
+
 # EPI 평가용 SYSTEM 프롬프트
 EPI_SYSTEM_PROMPT = """[핵심기능]
 - 너는 뉴스 텍스트의 자극도를 정량 평가하는 심사관이야.
@@ -117,31 +161,58 @@ EPI_SYSTEM_PROMPT = """[핵심기능]
 
 """
 
-# EPI 평가용 USER 템플릿
-EPI_USER_TEMPLATE = """원문 제목:
+# EPI 평가용 USER 템플릿: 원문만 채점 (기사당 1회, 모든 스타일이 공유)
+# {format}: 채점할 컴포넌트 출력 예시 (hybrid 모드는 S/SUBJ/F만)
+EPI_ORIGINAL_USER_TEMPLATE = """원문 제목:
 {originalTitle}
 
 원문 본문:
 {originalBody}
 
-생성 제목:
-{generatedTitle}
+이번에는 원문만 평가한다. EPI 합산/감소율 계산은 하지 않는다.
+출력 예시에 있는 컴포넌트만 채점한다.
+출력(JSON 엄수, 다른 말 금지):
+{format}
+"""
+
+# EPI 평가용 USER 템플릿: 생성 요약 여러 개를 한 번에 채점 (원문 점수는 이미 산출된 값을 기준으로 제공)
+# {summaries}: 스타일별 생성 제목/요약, {format}: 스타일별 출력 예시
+EPI_SUMMARIES_USER_TEMPLATE = """원문 제목:
+{originalTitle}
 
-생성 요약:
-{generatedSummary}
+원문 컴포넌트 점수(이미 확정, 다시 채점하지 말 것):
+{originalComponents}
 
-출력(JSON 엄수, 다른 말 금지):
-{{
-  "original": {{
-    "S": 0.0, "SUBJ": 0.0, "K": 0.0, "F": 0.0, "C": 0.0, "V": 0.0, "X": 0.0, "EVID": 0.0,
-    "EPI": 0
-  }},
-  "summary": {{
-    "S": 0.0, "SUBJ": 0.0, "K": 0.0, "F": 0.0, "C": 0.0, "V": 0.0, "X": 0.0, "EVID": 0.0,
-    "EPI": 0
-  }},
-  "reductionPct": 0,
-  "stimulationReduced": "자극도를 0% 줄였어요",
-  "reason": "자극도 감소 이유"
-}}
-"""
\ No newline at end of file
+스타일별 생성 제목/요약:
+{summaries}
+
+각 스타일의 생성 요약만 평가한다. EPI 합산/감소율 계산은 하지 않는다.
+출력 예시에 있는 컴포넌트만 채점한다.
+"reason"에는 원문 대비 그 요약에서 무엇이 줄었는지 1~2문장으로 쓴다.
+출력(JSON 엄수, 다른 말 금지, 스타일 이름을 키로 사용):
+{format}
+"""
+
+# --- 제목/요약: 여러 스타일 한 번에 생성 (fused 모드) ---
+# {sections}: 요청 스타일마다 "[STYLE]" + 개별 스타일 프롬프트(TITLE_SUMMARY_SYSTEM_PROMPT_*)의 규칙 줄
+TITLE_SUMMARY_FUSED_SYSTEM_TEMPLATE = """너는 뉴스/기사 편집 보조자다.
+- 같은 기사에 대해 요청된 스타일마다 제목과 요약을 각각 따로 작성한다.
+
+{sections}
+
+- 스타일끼리 문장을 복사하지 말고, 각 스타일 규칙에 맞게 따로 쓴다.
+- 출력은 반드시 JSON 객체 하나로만 작성하며, 텍스트 외에는 출력하지 않는다.
+"""
+
+# fused 모드 USER 템플릿 ({styles}: 요청 스타일 목록, {format}: 스타일별 출력 예시)
+TITLE_SUMMARY_FUSED_USER_TEMPLATE = """원래 제목:
+{title}
+
+기사 본문:
+{body}
+
+작성할 스타일: {styles}
+
+출력 포맷(JSON 엄수, 다른 말 금지, 스타일 이름을 키로 사용):
+{format}
+"""
@@ -0,0 +1,145 @@
+import re, time
+from dataclasses import dataclass
+from typing import Dict, Mapping, Optional
+from settings import settings
+
+# OpenAI 한도 헤더의 리셋 시간 표기 (예: "1s", "6m0s", "120ms", "1h2m3.5s")
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNIT_SEC = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+def _parse_duration(val: Optional[str]) -> Optional[float]:
+    if not val:
+        return None
+    val = val.strip()
+    try:
+        return float(val)          # retry-after 처럼 초 단위 숫자만 온 경우
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(val)
+    if not parts:
+        return None
+    return sum(float(n) * _UNIT_SEC[u] for n, u in parts)
+
+def estimate_tokens(text: str) -> int:
+    """
+    토크나이저 없이 대략적인 토큰 수 추정.
+    ASCII는 4자당 1토큰, 한글 등 비ASCII는 글자당 약 0.8토큰으로 본다.
+    (호출 후 usage로 정산하므로 약간 보수적이면 충분)
+    """
+    if not text:
+        return 0
+    ascii_n = sum(1 for ch in text if ord(ch) < 128)
+    return int(ascii_n / 4 + (len(text) - ascii_n) * 0.8) + 1
+
+@dataclass
+class Reservation:
+    estimated: int
+    settled: bool = False
+
+class RateLimiter:
+    """
+    모델 1개에 대한 RPM/TPM 토큰 버킷.
+    - ready_in()/reserve(): 예약 가능 시각 확인/차감 (기다림과 LLM 호출 순서는 scheduler가 정한다)
+    - settle(): 실제 usage(input+output)로 차액 정산
+    - update_from_headers(): x-ratelimit-* / retry-after 헤더 반영
+    """
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._req = float(rpm)
+        self._tok = float(tpm)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        dt = now - self._updated
+        self._updated = now
+        self._req = min(self.rpm, self._req + dt * self.rpm / 60.0)
+        self._tok = min(self.tpm, self._tok + dt * self.tpm / 60.0)
+
+    def _wait_time(self, tokens: int) -> float:
+        now = time.monotonic()
+        wait = max(0.0, self._blocked_until - now)
+        if self._req < 1:
+            wait = max(wait, (1 - self._req) * 60.0 / self.rpm)
+        if self._tok < tokens:
+            wait = max(wait, (tokens - self._tok) * 60.0 / self.tpm)
+        return wait
+
+    def ready_in(self, estimated_tokens: int) -> float:
+        """지금부터 몇 초 뒤에 예약할 수 있는지 (0 이하면 바로)"""
+        self._refill()
+        # 한 번에 TPM보다 큰 요청은 버킷이 가득 찼을 때 통과시킨다 (영원히 대기 방지)
+        return self._wait_time(min(estimated_tokens, self.tpm))
+
+    def reserve(self, estimated_tokens: int) -> Reservation:
+        """기다리지 않고 차감한다. ready_in()이 0 이하일 때 부른다. (스케줄러가 순서를 정한 뒤)"""
+        self._req -= 1
+        self._tok -= estimated_tokens
+        return Reservation(estimated_tokens)
+
+    def settle(self, reservation: Reservation, actual_tokens: int) -> None:
+        if reservation.settled:
+            return
+        reservation.settled = True
+        self._refill()
+        # 실제가 더 많으면 빚(음수)으로 남겨 다음 요청이 기다리게 한다
+        self._tok = min(self.tpm, self._tok + reservation.estimated - actual_tokens)
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> None:
+        """서버가 알려준 잔여량이 로컬 추정보다 적으면 서버 값을 따른다."""
+        if not headers:
+            return
+        self._refill()
+        now = time.monotonic()
+
+        rem_req = headers.get("x-ratelimit-remaining-requests")
+        rem_tok = headers.get("x-ratelimit-remaining-tokens")
+        try:
+            if rem_req is not None:
+                self._req = min(self._req, float(rem_req))
+                if float(rem_req) <= 0:
+                    reset = _parse_duration(headers.get("x-ratelimit-reset-requests"))
+                    if reset:
+                        self._blocked_until = max(self._blocked_until, now + reset)
+            if rem_tok is not None:
+                self._tok = min(self._tok, float(rem_tok))
+                if float(rem_tok) <= 0:
+                    reset = _parse_duration(headers.get("x-ratelimit-reset-tokens"))
+                    if reset:
+                        self._blocked_until = max(self._blocked_until, now + reset)
+        except ValueError:
+            pass
+
+        retry_ms = headers.get("retry-after-ms")
+        retry = _parse_duration(headers.get("retry-after"))
+        if retry_ms:
+            try:
+                retry = float(retry_ms) / 1000.0
+            except ValueError:
+                pass
+        if retry:
+            self._blocked_until = max(self._blocked_until, now + retry)
+
+    def snapshot(self) -> Dict[str, float]:
+        self._refill()
+        return {
+            "rpm": self.rpm, "tpm": self.tpm,
+            "requestsAvailable": round(self._req, 2),
+            "tokensAvailable": round(self._tok, 1),
+            "blockedForSec": round(max(0.0, self._blocked_until - time.monotonic()), 3),
+        }
+
+_limiters: Dict[str, RateLimiter] = {}
+
+def get_limiter(model: str) -> RateLimiter:
+    """모델별 한도는 settings.MODEL_RATE_LIMITS, 없으면 DEFAULT_RPM/TPM."""
+    lim = _limiters.get(model)
+    if lim is None:
+        cfg = settings.MODEL_RATE_LIMITS.get(model)
+        rpm = cfg.rpm if cfg else settings.DEFAULT_RPM
+        tpm = cfg.tpm if cfg else settings.DEFAULT_TPM
+        lim = _limiters[model] = RateLimiter(rpm, tpm)
+    return lim
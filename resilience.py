@@ -0,0 +1,177 @@
+import asyncio, random, time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, Iterator, Optional, TypeVar
+from openai import APIConnectionError, APIStatusError, APITimeoutError
+from settings import settings
+from rate_limiter import _parse_duration
+from telemetry import LLM_RESILIENCE, current_stage
+
+# LLM 호출 복원력: 요청 기한(deadline) 안에서의 재시도, 느린 호출 헤지, (JSON 교정은 llm_client)
+
+T = TypeVar("T")
+
+# 요청 단위 기한 (monotonic 초). 바깥 기한이 더 빠르면 그대로 둔다.
+deadline_var: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[None]:
+    if not seconds:
+        yield
+        return
+    new = time.monotonic() + seconds
+    cur = deadline_var.get()
+    token = deadline_var.set(new if cur is None else min(cur, new))
+    try:
+        yield
+    finally:
+        deadline_var.reset(token)
+
+@asynccontextmanager
+async def enforce_deadline() -> AsyncIterator[None]:
+    """
+    기한이 있으면 그 시각에 블록을 취소하고 DeadlineExceeded를 올린다.
+    (대기열/재시도 대기/진행 중 호출/single-flight 대기까지 한꺼번에 멈춘다)
+    """
+    left = remaining()
+    if left is None:
+        yield
+        return
+    scope = asyncio.timeout(max(0.0, left))
+    try:
+        async with scope:
+            yield
+    except TimeoutError as e:
+        if isinstance(e, DeadlineExceeded) or not scope.expired():
+            raise
+        raise DeadlineExceeded("요청 기한을 넘겼습니다.") from e
+
+def parse_timeout_header(value: Optional[str]) -> Optional[float]:
+    """요청 헤더의 기한(초, 양수). 형식이 틀리면 None -> 엔드포인트 기본값"""
+    try:
+        sec = float(value) if value else None
+    except ValueError:
+        return None
+    return sec if sec and sec > 0 else None
+
+def remaining() -> Optional[float]:
+    """남은 기한(초). 기한이 없으면 None."""
+    d = deadline_var.get()
+    return None if d is None else d - time.monotonic()
+
+def call_timeout() -> float:
+    """이번 호출에 줄 타임아웃: OPENAI_TIMEOUT_SEC와 남은 기한 중 작은 값. 기한이 지났으면 예외."""
+    left = remaining()
+    if left is None:
+        return settings.OPENAI_TIMEOUT_SEC
+    if left <= 0:
+        raise DeadlineExceeded("요청 기한을 넘겼습니다.")
+    return min(settings.OPENAI_TIMEOUT_SEC, left)
+
+def is_retryable_status(status_code: int) -> bool:
+    return status_code in (408, 409, 429) or status_code >= 500
+
+def is_retryable(e: BaseException) -> bool:
+    if isinstance(e, (APITimeoutError, APIConnectionError)):
+        return True
+    if isinstance(e, APIStatusError):
+        return is_retryable_status(e.status_code)
+    return False
+
+def _backoff(attempt: int, e: BaseException) -> float:
+    # 서버가 retry-after를 주면 그 값을 우선
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    hinted = _parse_duration(headers.get("retry-after"))
+    if headers.get("retry-after-ms"):
+        hinted = _parse_duration(headers["retry-after-ms"] + "ms") or hinted
+    if hinted:
+        return min(hinted, settings.LLM_RETRY_MAX_SEC)
+    base = settings.LLM_RETRY_BASE_SEC * (2 ** attempt)
+    return min(settings.LLM_RETRY_MAX_SEC, base * random.uniform(0.5, 1.5))   # 지터
+
+async def with_retries(fn: Callable[[], Awaitable[T]]) -> T:
+    """
+    429/5xx/타임아웃/연결 오류면 지수 백오프+지터로 LLM_RETRY_MAX회까지 다시 시도한다.
+    기다린 뒤 남는 기한이 없으면 더 시도하지 않고 마지막 오류를 올린다.
+    fn은 매 시도마다 rate limiter를 다시 거쳐야 한다.
+    """
+    attempt = 0
+    while True:
+        try:
+            return await fn()
+        except Exception as e:
+            if not is_retryable(e) or attempt >= settings.LLM_RETRY_MAX:
+                raise
+            delay = _backoff(attempt, e)
+            left = remaining()
+            if left is not None and left <= delay:
+                raise
+            LLM_RESILIENCE.inc(stage=current_stage()[0], event="retry")
+            attempt += 1
+            await asyncio.sleep(delay)
+
+class LatencyTracker:
+    """스테이지 종류별 최근 성공 지연. 헤지 기준(p95)을 잡는 데 쓴다."""
+
+    def __init__(self, window: int = 200):
+        self._samples: Dict[str, Deque[float]] = {}
+        self.window = window
+
+    def observe(self, key: str, seconds: float) -> None:
+        self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def p95(self, key: str) -> Optional[float]:
+        samples = self._samples.get(key)
+        if not samples or len(samples) < settings.HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+_latency = LatencyTracker()
+
+async def hedged(fn: Callable[[], Awaitable[T]], can_hedge: Callable[[], bool] = lambda: True,
+                 key: Optional[str] = None) -> T:
+    """
+    fn()이 이 스테이지의 최근 p95를 넘도록 끝나지 않으면 같은 호출을 하나 더 보내고
+    먼저 성공한 결과를 쓴다(진 쪽은 취소). 한쪽이 실패하면 나머지를 기다린다.
+    can_hedge()가 False면(리미터 여유 없음 등) 헤지하지 않는다.
+    key는 지연 분포를 나눌 기준 (기본은 스테이지 종류, 모델이 여럿이면 "quiz@<model>" 등)
+    """
+    key = key or current_stage()[0]
+    t0 = time.monotonic()
+    delay = _latency.p95(key) if settings.HEDGE_ENABLED else None
+    if delay is not None:
+        delay = max(delay, settings.HEDGE_MIN_DELAY_SEC)
+        left = remaining()
+        if left is not None and left <= delay:
+            delay = None
+
+    first = asyncio.ensure_future(fn())
+    tasks = {first}
+    try:
+        if delay is not None:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and can_hedge():
+                LLM_RESILIENCE.inc(stage=current_stage()[0], event="hedge")
+                tasks.add(asyncio.ensure_future(fn()))
+
+        error: Optional[BaseException] = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                if t.exception() is None:
+                    if t is not first:
+                        LLM_RESILIENCE.inc(stage=current_stage()[0], event="hedge_won")
+                    _latency.observe(key, time.monotonic() - t0)
+                    return t.result()
+                error = error or t.exception()
+        raise error
+    finally:
+        for t in tasks:
+            t.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
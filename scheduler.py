@@ -0,0 +1,217 @@
+import asyncio, time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+from settings import settings
+from rate_limiter import RateLimiter, Reservation, get_limiter
+from concurrency import AdaptiveConcurrency, get_concurrency
+from resilience import DeadlineExceeded, remaining
+from telemetry import QUEUE_WAIT, SCHED_QUEUE_DEPTH, SCHED_REJECTED
+
+# 모델별 LLM 호출 스케줄러. llm_client의 모든 온라인 호출이 여기서 차례를 받는다.
+# 우선순위 클래스(chat > single > batch > offline)별 큐를 두고, 토큰 버킷과 AIMD 동시성 한도에
+# 자리가 나면 가중 공정 큐잉(WFQ, 비용 = 추정 토큰 / 클래스 가중치)으로 다음 호출을 고른다.
+# 그래서 큰 배치가 한도를 채우고 있어도 뒤에 온 대화/단건 요청이 배치 대기열 앞쪽으로 끼어든다.
+
+PRIORITIES = ("chat", "single", "batch", "offline")
+
+# 호출 우선순위 (엔드포인트/잡 워커가 설정, DAG 스테이지 태스크는 생성 시점 컨텍스트를 복사)
+priority_var: ContextVar[str] = ContextVar("llm_priority", default="single")
+
+def set_priority(priority: str) -> None:
+    """현재 태스크(요청)의 LLM 호출 우선순위. 요청/워커 태스크 시작 시 한 번 부른다."""
+    if priority not in PRIORITIES:
+        raise ValueError(f"알 수 없는 우선순위: {priority!r}")
+    priority_var.set(priority)
+
+class SchedulerRejected(RuntimeError):
+    """클래스별 대기열이 가득 찼거나 최대 대기 시간을 넘겨 호출을 보내지 않았다. (요청 기한이 먼저 끝나면 DeadlineExceeded)"""
+
+    def __init__(self, priority: str, reason: str):
+        super().__init__(f"LLM 호출 대기열 거절 (priority={priority}, reason={reason})")
+        self.priority = priority
+        self.reason = reason
+
+class _Ticket:
+    __slots__ = ("priority", "tokens", "key", "fut", "tag", "enqueued")
+
+    def __init__(self, priority: str, tokens: int, key: Optional[str], tag: float):
+        self.priority = priority
+        self.tokens = tokens
+        self.key = key          # None이면 동시성 슬롯 없이 토큰만 예약 (스트리밍)
+        self.fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.tag = tag          # WFQ 가상 종료 시각
+        self.enqueued = time.perf_counter()
+
+class Grant:
+    """차례를 받은 호출 1건: 토큰 예약 + (있으면) 동시성 슬롯"""
+    __slots__ = ("reservation", "_slot", "_ctl")
+
+    def __init__(self, reservation: Reservation, slot, ctl: Optional[AdaptiveConcurrency]):
+        self.reservation = reservation
+        self._slot = slot
+        self._ctl = ctl
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        if self._slot is not None:
+            slot, self._slot = self._slot, None
+            self._ctl.finish(slot, error)
+
+class LLMScheduler:
+    def __init__(self, model: str):
+        self.model = model
+        self.limiter: RateLimiter = get_limiter(model)
+        self.ctl: AdaptiveConcurrency = get_concurrency(model)
+        self.ctl.listeners.append(self._kick)
+        self._queues: Dict[str, Deque[_Ticket]] = {p: deque() for p in PRIORITIES}
+        self._last_tag: Dict[str, float] = {p: 0.0 for p in PRIORITIES}
+        self._vtime = 0.0
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.granted: Dict[str, int] = {p: 0 for p in PRIORITIES}
+        self.rejected: Dict[str, int] = {p: 0 for p in PRIORITIES}
+
+    def _room(self) -> bool:
+        return not settings.AIMD_ENABLED or self.ctl.has_room()
+
+    def _ready(self, t: _Ticket) -> bool:
+        return self.limiter.ready_in(t.tokens) <= 0 and (t.key is None or self._room())
+
+    def _queued(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def can_start_now(self, tokens: int) -> bool:
+        """기다리는 호출이 없고 지금 바로 보낼 수 있는지 (헤지 판단용)"""
+        return not self._queued() and self.limiter.ready_in(tokens) <= 0 and self._room()
+
+    def _grant(self, t: _Ticket) -> Grant:
+        reservation = self.limiter.reserve(t.tokens)
+        use_slot = t.key is not None and settings.AIMD_ENABLED
+        slot = self.ctl.take(t.key) if use_slot else None
+        self.granted[t.priority] += 1
+        QUEUE_WAIT.observe(time.perf_counter() - t.enqueued, queue=f"llm_{t.priority}")
+        return Grant(reservation, slot, self.ctl if use_slot else None)
+
+    async def acquire(self, priority: str, tokens: int, key: Optional[str]) -> Grant:
+        weight = settings.LLM_PRIORITY_WEIGHTS.get(priority, 1.0)
+        t = _Ticket(priority, tokens, key, 0.0)
+        if not self._queued() and self._ready(t):
+            return self._grant(t)
+
+        queue = self._queues[priority]
+        depth = settings.LLM_QUEUE_MAX_DEPTH.get(priority, 0)
+        if depth and len(queue) >= depth:
+            self._reject(priority, "queue_full")
+        t.tag = max(self._vtime, self._last_tag[priority]) + max(1, tokens) / weight
+        self._last_tag[priority] = t.tag
+        queue.append(t)
+        SCHED_QUEUE_DEPTH.set(len(queue), model=self.model, priority=priority)
+        self._kick()
+
+        timeout = settings.LLM_QUEUE_MAX_WAIT_SEC.get(priority) or None
+        left = remaining()
+        by_deadline = left is not None and (timeout is None or left <= timeout)
+        if by_deadline:
+            timeout = left
+        try:
+            return await asyncio.wait_for(asyncio.shield(t.fut), timeout=timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if t.fut.done() and not t.fut.cancelled():
+                # 막 차례를 받았으면 돌려준다 (슬롯 반납 + 보내지 않은 토큰 예약 환불)
+                grant = t.fut.result()
+                grant.finish()
+                self.limiter.settle(grant.reservation, 0)
+            else:
+                t.fut.cancel()
+            if isinstance(e, asyncio.TimeoutError):
+                if by_deadline:
+                    # 클래스 최대 대기가 아니라 요청 기한이 먼저 끝남
+                    raise DeadlineExceeded("요청 기한을 넘겼습니다.") from None
+                self._reject(priority, "wait_timeout")
+            raise
+
+    def _reject(self, priority: str, reason: str) -> None:
+        self.rejected[priority] += 1
+        SCHED_REJECTED.inc(model=self.model, priority=priority, reason=reason)
+        raise SchedulerRejected(priority, reason)
+
+    def _head(self) -> Optional[_Ticket]:
+        best = None
+        for p, q in self._queues.items():
+            while q and q[0].fut.done():   # 취소/시간 초과로 떠난 호출
+                q.popleft()
+                SCHED_QUEUE_DEPTH.set(len(q), model=self.model, priority=p)
+            if q and (best is None or q[0].tag < best.tag):
+                best = q[0]
+        return best
+
+    def _kick(self) -> None:
+        if self._wake is not None:
+            self._wake.set()
+        if self._queued() and (self._task is None or self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self._dispatch())
+
+    async def _dispatch(self) -> None:
+        """가상 종료 시각이 가장 빠른 호출부터, 토큰과 동시성 자리가 나는 대로 차례를 준다."""
+        self._wake = asyncio.Event()
+        try:
+            while True:
+                t = self._head()
+                if t is None:
+                    return
+                wait = self.limiter.ready_in(t.tokens)
+                if wait <= 0 and (t.key is None or self._room()):
+                    q = self._queues[t.priority]
+                    q.popleft()
+                    SCHED_QUEUE_DEPTH.set(len(q), model=self.model, priority=t.priority)
+                    self._vtime = t.tag
+                    t.fut.set_result(self._grant(t))
+                    continue
+                # 토큰이 모자라면 충전될 때까지, 동시성 자리가 없으면 슬롯이 풀릴 때까지 (새 호출이 오면 다시 고른다)
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=wait if wait > 0 else None)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._wake = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "queued": {p: sum(1 for t in q if not t.fut.done()) for p, q in self._queues.items()},
+            "granted": dict(self.granted),
+            "rejected": dict(self.rejected),
+        }
+
+_schedulers: Dict[str, LLMScheduler] = {}
+
+def get_scheduler(model: str) -> LLMScheduler:
+    sched = _schedulers.get(model)
+    if sched is None:
+        sched = _schedulers[model] = LLMScheduler(model)
+    return sched
+
+async def admit(model: str, tokens: int, priority: Optional[str] = None) -> Reservation:
+    """동시성 슬롯 없이 토큰만 예약 (스트리밍처럼 오래 붙잡는 호출)"""
+    grant = await get_scheduler(model).acquire(priority or priority_var.get(), tokens, None)
+    return grant.reservation
+
+@asynccontextmanager
+async def scheduled(model: str, tokens: int, key: str,
+                    priority: Optional[str] = None) -> AsyncIterator[Reservation]:
+    """
+    차례를 받아 블록 동안 동시성 슬롯을 잡는다. 블록이 끝난 결과(예외 종류, 지연)로 AIMD 한도를 조절한다.
+    토큰 예약의 정산(settle)은 부르는 쪽이 usage로 한다.
+    """
+    grant = await get_scheduler(model).acquire(priority or priority_var.get(), tokens, key)
+    try:
+        yield grant.reservation
+    except BaseException as e:
+        grant.finish(e)
+        raise
+    else:
+        grant.finish()
+
+def scheduler_stats() -> Dict[str, Any]:
+    return {m: s.snapshot() for m, s in _schedulers.items()}
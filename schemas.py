@@ -1,12 +1,27 @@
 from typing import Annotated, List, Literal, Optional, Dict
-from pydantic import BaseModel, StringConstraints
+from pydantic import BaseModel, Field, StringConstraints
 
 StrMin1 = Annotated[str, StringConstraints(strip_whitespace=True, min_length=1)]
 BodyStr = Annotated[str, StringConstraints(strip_whitespace=True, min_length=50)]
 
 NewsStyle = Literal["CONCISE", "FRIENDLY", "NEUTRAL"]
-
-class RewriteRequest(BaseModel):
+LatencyReporting = Literal["sum", "critical_path"]   # latencyMsTotal 집계 방식
+GenerationMode = Literal["per_style", "fused"]       # 스타일별 개별 호출 | 3스타일 1회 호출
+EpiMode = Literal["llm", "fast", "hybrid"]           # LLM 심사 | 로컬 어휘 채점 | 로컬 + S/SUBJ/F만 LLM
+NearDupMode = Literal["off", "reuse", "retitle"]     # 유사 중복 기사: 안 씀 | 결과 재사용 | 제목만 다시 생성
+
+# 요청 단위 파이프라인 옵션 (미지정 시 settings 기본값)
+class RewriteOptions(BaseModel):
+    latencyReporting: Optional[LatencyReporting] = None
+    generationMode: Optional[GenerationMode] = None
+    epiMode: Optional[EpiMode] = None
+    nearDupMode: Optional[NearDupMode] = None
+
+    def pipeline_options(self) -> "RewriteOptions":
+        """하위 요청 모델에서 옵션 필드만 떼어낸 RewriteOptions."""
+        return RewriteOptions(**self.model_dump(include=set(RewriteOptions.model_fields)))
+
+class RewriteRequest(RewriteOptions):
     articleId: StrMin1
     title: StrMin1
     body: BodyStr
@@ -14,6 +29,7 @@ class RewriteRequest(BaseModel):
 class TokensUsed(BaseModel):
     input: int = 0
     output: int = 0
+    savedInput: int = 0     # fused 모드/본문 압축 등으로 절약한 입력 토큰(추정)
 
 class Quiz(BaseModel):
     question: StrMin1
@@ -35,7 +51,7 @@ class RewriteBatchItemIn(BaseModel):
     title: StrMin1
     body: str  # 길이 제한 제거 (엔드포인트 내부에서 검사)
 
-class RewriteBatchRequest(BaseModel):
+class RewriteBatchRequest(RewriteOptions):
     items: List[RewriteBatchItemIn]
 
 # ------- 챗 봇 -------
@@ -47,8 +63,10 @@ class ChatMessage(BaseModel):
 class ChatArticleRequest(BaseModel):
     articleId: str
     userId: str
-    summary: str
-    history: List[ChatMessage]
+    # 서버 세션((articleId, userId))에 저장되므로 첫 턴(또는 변경 시)에만 보내면 된다
+    summary: Optional[str] = None
+    # 보내면 서버 세션 기록을 이것으로 교체. 생략하면 서버에 쌓인 기록을 사용
+    history: Optional[List[ChatMessage]] = None
     userMessage: str
 
 class ChatArticleResponse(BaseModel):
@@ -59,6 +77,11 @@ class ChatArticleResponse(BaseModel):
     model: str
     latencyMs: int
 
+# 스트리밍 챗(SSE)의 마지막 "done" 이벤트
+class ChatArticleStreamDone(ChatArticleResponse):
+    ttftMs: int                 # 첫 토큰까지 걸린 시간
+    tokensUsed: TokensUsed
+
 # ------- 스타일별 변형 스키마 -------
 
 class RewriteVariant(BaseModel):
@@ -69,6 +92,14 @@ class RewriteVariant(BaseModel):
     model: str
     latencyMs: int
     epi: EpiResult
+    cached: bool = False                    # 요약+EPI 모두 결과 캐시에서 온 경우
+
+class BodyCompression(BaseModel):
+    originalTokens: int                     # 원문 본문 추정 토큰
+    compressedTokens: int                   # 전처리 후 추정 토큰
+    ratio: float                            # compressedTokens / originalTokens
+    extractive: bool                        # 예산 초과로 문장 선별까지 했는지
+    savedInputEstimate: int                 # 본문을 실은 실제 호출 수 x 호출당 절약 토큰
 
 class RewriteMultiResponse(BaseModel):
     articleId: str
@@ -76,7 +107,30 @@ class RewriteMultiResponse(BaseModel):
     questions: List[str]                    # 질문/퀴즈는 기사당 1세트
     quiz: Quiz
     tokensUsedTotal: TokensUsed             # variants 합계
-    latencyMsTotal: int                     # variants 합계(또는 max)
+    latencyMsTotal: int                     # 단계 지연 합계 또는 임계 경로(latencyReporting)
+    cacheHit: bool = False                  # 모든 스테이지가 캐시 적중(또는 동일 호출 공유)
+    cachedStages: List[str] = []            # 캐시 적중/진행 중 동일 호출 공유/체크포인트 스테이지 (예: "summary:CONCISE", "quiz")
+    resumedStages: List[str] = []           # 이전 시도의 체크포인트에서 이어받은 스테이지 (cachedStages의 부분집합)
+    stageModels: Dict[str, str] = {}        # 스테이지별로 결과를 낸 모델 (캐스케이드면 작은 모델 또는 승격된 큰 모델)
+    tokensByModel: Dict[str, TokensUsed] = {}   # 이번 요청에서 실제 호출한 모델별 토큰 (승격 전 작은 모델 호출 포함)
+    longDocSegments: int = 0                # 긴 기사 map-reduce 구간 수 (0이면 일반 경로)
+    compression: Optional[BodyCompression] = None  # 본문 전처리 결과
+    nearDuplicateOf: Optional[str] = None   # 유사 중복으로 결과를 재사용한 원 기사 articleId
+    nearDuplicateSimilarity: Optional[float] = None  # 추정 Jaccard 유사도 (글자 n-gram)
+
+class StageFailure(BaseModel):
+    stage: str                              # 예: "epi:NEUTRAL"
+    error: str
+    skipped: bool = False                   # 선행 스테이지 실패로 실행하지 않음
+
+# 일부 스테이지가 실패한 기사: 끝난 부분만 (끝난 스테이지는 체크포인트에 저장돼 재요청 시 건너뜀)
+class RewritePartialResponse(BaseModel):
+    articleId: str
+    variants: List[RewriteVariant] = []     # 요약+EPI가 모두 끝난 스타일만
+    questions: List[str] = []
+    quiz: Optional[Quiz] = None
+    tokensUsedTotal: TokensUsed             # 이번 시도에서 실제 쓴 토큰 (실패 스테이지 제외)
+    completedStages: List[str] = []
 
 # 배치용 결과도 멀티 버전을 사용
 class RewriteBatchItemMultiResult(BaseModel):
@@ -84,6 +138,42 @@ class RewriteBatchItemMultiResult(BaseModel):
     ok: bool
     data: Optional[RewriteMultiResponse] = None
     error: Optional[str] = None
+    partial: Optional[RewritePartialResponse] = None    # ok=False지만 일부 스테이지는 끝난 경우
+    failedStages: List[StageFailure] = []
 
 class RewriteBatchMultiResponse(BaseModel):
-    results: List[RewriteBatchItemMultiResult]
\ No newline at end of file
+    results: List[RewriteBatchItemMultiResult]
+
+# 스트리밍 배치의 마지막 레코드
+class RewriteBatchStreamSummary(BaseModel):
+    type: Literal["summary"] = "summary"
+    total: int
+    ok: int = 0
+    failed: int = 0
+    tokensUsedTotal: TokensUsed = Field(default_factory=TokensUsed)
+    elapsedMs: int = 0
+
+# ------- 비동기 배치 잡 -------
+
+class JobSubmitResponse(BaseModel):
+    jobId: str
+    total: int
+    status: Literal["queued", "running", "completed"] = "queued"
+
+class JobStatus(BaseModel):
+    jobId: str
+    status: Literal["queued", "running", "completed"]
+    total: int
+    done: int
+    failed: int
+    pending: int
+    running: int
+    progressPct: float
+    createdAt: float        # epoch seconds
+    updatedAt: float
+
+class JobResultsPage(BaseModel):
+    jobId: str
+    offset: int
+    limit: int
+    results: List[RewriteBatchItemMultiResult]   # 완료된 아이템만, 입력 순서대로
@@ -1,11 +1,168 @@
-
+from typing import Literal
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+class ModelRateLimit(BaseModel):
+    rpm: int   # requests per minute
+    tpm: int   # tokens per minute (input + max_output 기준으로 예약)
+
+class StageRoute(BaseModel):
+    model: str | None = None              # 비우면 MODEL_NAME
+    temperature: float | None = None      # 비우면 스테이지 기본값 (llm_client의 *_TEMPERATURE)
+    max_output_tokens: int | None = None  # 비우면 스테이지 기본값 (여러 스타일을 한 번에 받는 호출은 스타일당 값)
+    cheap_model: str | None = None        # MODEL_CASCADE_ENABLED일 때 먼저 시도할 작은 모델
+
 class Settings(BaseSettings):
     OPENAI_API_KEY: str | None = None
     MODEL_NAME: str = "gpt-4.1"
     MAX_BODY_CHARS: int = 200_000
 
+    # 공용 AsyncOpenAI 클라이언트 커넥션 풀 (lifespan에서 1회 생성)
+    OPENAI_TIMEOUT_SEC: float = 60.0
+    OPENAI_CONNECT_TIMEOUT_SEC: float = 5.0
+    OPENAI_MAX_CONNECTIONS: int = 64
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = 32
+    OPENAI_KEEPALIVE_EXPIRY_SEC: float = 30.0
+    OPENAI_MAX_RETRIES: int = 0          # SDK 자체 재시도는 끄고 llm_client에서 리미터를 거쳐 재시도
+    OPENAI_BASE_URL: str | None = None   # 비우면 SDK 기본값 (bench/는 로컬 가짜 서버 주소를 넣는다)
+
+    # 모델별 RPM/TPM 한도 (env 예: MODEL_RATE_LIMITS='{"gpt-4.1": {"rpm": 500, "tpm": 30000}}')
+    MODEL_RATE_LIMITS: dict[str, ModelRateLimit] = {
+        "gpt-4.1": ModelRateLimit(rpm=500, tpm=30_000),
+        "gpt-4.1-mini": ModelRateLimit(rpm=500, tpm=200_000),
+    }
+    DEFAULT_RPM: int = 500
+    DEFAULT_TPM: int = 30_000
+
+    # 내용 주소 결과 캐시 (메모리 LRU + SQLite). DB 경로를 비우면 메모리만 사용
+    CACHE_ENABLED: bool = True
+    CACHE_MAX_ENTRIES: int = 4096
+    CACHE_TTL_SEC: float = 7 * 24 * 3600
+    CACHE_DB_PATH: str = "data/cache.sqlite3"
+
+    # 스테이지 체크포인트: 기사 일부 스테이지가 실패하면 끝난 스테이지 결과를 articleId 단위로 저장,
+    # 같은 기사를 다시 요청하면 빠진 스테이지만 실행 (캐시와 별개로 동작). DB 경로를 비우면 메모리만
+    CHECKPOINT_ENABLED: bool = True
+    CHECKPOINT_MAX_ENTRIES: int = 2048
+    CHECKPOINT_TTL_SEC: float = 24 * 3600
+    CHECKPOINT_DB_PATH: str = "data/checkpoints.sqlite3"
+
+    # 비동기 배치 잡 (POST /v1/jobs)
+    JOB_DB_PATH: str = "data/jobs.sqlite3"
+    JOB_WORKERS: int = 4
+    JOB_POLL_INTERVAL_SEC: float = 2.0
+    JOB_LEASE_SEC: float = 120.0      # 처리 중 아이템 임대 (처리하는 동안 연장, 끝나면 다른 프로세스가 이어받음)
+
+    # 오프라인 일괄 처리(python -m offline_batch): 기사 N개씩 Batch API 라운드로 처리, 상태/요청/결과 파일은 작업 디렉터리에
+    OFFLINE_BATCH_WORK_DIR: str = "data/offline"
+    OFFLINE_BATCH_CHUNK_ARTICLES: int = 2000
+    OFFLINE_BATCH_POLL_INTERVAL_SEC: float = 30.0
+
+    # 스테이지별 모델 라우팅. 키는 스테이지 이름("summary:CONCISE") 또는 종류("summary", "epi", "quiz",
+    # "map", "chat", "chat_summary"), 이름이 종류보다 우선. 없는 스테이지는 MODEL_NAME + 코드 기본값
+    # (env 예: MODEL_ROUTES='{"quiz": {"model": "gpt-4.1-mini", "max_output_tokens": 280}}')
+    MODEL_ROUTES: dict[str, StageRoute] = {
+        "epi": StageRoute(cheap_model="gpt-4.1-mini"),
+        "quiz": StageRoute(cheap_model="gpt-4.1-mini"),
+    }
+    # 캐스케이드: cheap_model이 있는 JSON 스테이지는 작은 모델로 먼저 호출하고,
+    # 출력 검증(JSON 파싱, EPI 범위, YES/NO 등)에 실패할 때만 model로 다시 호출
+    MODEL_CASCADE_ENABLED: bool = False
+
+    # 제목/요약 생성: "per_style"(스타일별 호출) | "fused"(3스타일 1회 호출, 실패 스타일만 개별 보충)
+    GENERATION_MODE: Literal["per_style", "fused"] = "per_style"
+
+    # EPI: 원문은 기사당 1회 채점. True면 생성 요약 전부를 1회 호출로 일괄 채점
+    EPI_BATCH_SUMMARIES: bool = True
+    # "llm" | "fast"(로컬 어휘 채점만, LLM 호출 없음) | "hybrid"(K/C/V/X/EVID 로컬 + S/SUBJ/F만 LLM)
+    EPI_MODE: Literal["llm", "fast", "hybrid"] = "llm"
+
+    # 유사 중복 기사(통신 기사 재게재 등): 정규화 본문의 글자 n-gram MinHash + LSH 밴드 색인(메모리, LRU 상한).
+    # 이미 처리한 기사와 추정 Jaccard 유사도가 NEAR_DUP_THRESHOLD 이상이면 "reuse"는 결과(요약/EPI/퀴즈)를 그대로,
+    # "retitle"은 제목/요약 스테이지만 다시 돌려 제목만 바꿔 쓴다. "off"면 사용 안 함 (요청별 nearDupMode로도 켠다)
+    NEAR_DUP_MODE: Literal["off", "reuse", "retitle"] = "off"
+    NEAR_DUP_THRESHOLD: float = 0.85
+    NEAR_DUP_SHINGLE_CHARS: int = 5
+    NEAR_DUP_MIN_SHINGLES: int = 100      # 이보다 짧은 본문은 색인하지 않는다
+    NEAR_DUP_NUM_PERM: int = 64           # 서명 길이 (= 밴드 수 x 밴드당 행 수)
+    NEAR_DUP_BANDS: int = 16
+    NEAR_DUP_MAX_ENTRIES: int = 5000      # 0이면 색인을 만들지 않는다
+
+    # 챗봇 서버 세션: 최근 턴은 토큰 예산 안에서 유지, 넘치면 오래된 턴을 누적 요약으로 접음
+    CHAT_SESSION_MAX: int = 10_000
+    CHAT_SESSION_TTL_SEC: float = 6 * 3600
+    CHAT_HISTORY_TOKEN_BUDGET: int = 1200
+    CHAT_HISTORY_SUMMARY_MAX_TOKENS: int = 300
+
+    # 추천 질문 답변 미리 만들기: 재작성이 끝나면 백그라운드(offline 우선순위)에서 추천 질문마다
+    # 스타일별 요약 기준 첫 턴 답변을 만들어 저장, 같은 첫 턴 질문은 모델 호출 없이 응답. DB 경로를 비우면 메모리만
+    CHAT_PRECOMPUTE_ENABLED: bool = False
+    CHAT_PRECOMPUTE_STYLES: list[str] = []    # 비우면 생성한 모든 스타일의 요약
+    CHAT_PRECOMPUTE_MAX_ENTRIES: int = 20_000
+    CHAT_PRECOMPUTE_TTL_SEC: float = 7 * 24 * 3600
+    CHAT_PRECOMPUTE_DB_PATH: str = "data/chat_answers.sqlite3"
+
+    # 본문 전처리: 상용구 제거 후, 추정 토큰이 예산을 넘으면 로컬 추출 요약으로 문장 선별
+    BODY_PREPROCESS_ENABLED: bool = True
+    BODY_TOKEN_BUDGET: int = 3000
+
+    # 긴 기사 map-reduce: 상용구 제거 후 추정 토큰이 임계값을 넘으면 구간별 요약(map) -> 스타일별 reduce
+    LONG_DOC_TOKEN_THRESHOLD: int = 8000
+    LONG_DOC_SEGMENT_TOKENS: int = 2500
+    LONG_DOC_MAX_SEGMENTS: int = 8        # 기사당 map 호출 상한 (넘는 구간은 점수 낮은 것부터 버림)
+    LONG_DOC_SEGMENT_SUMMARY_MAX_TOKENS: int = 350
+
+    # LLM 호출 복원력: 429/5xx/타임아웃은 지수 백오프+지터로 재시도(요청 기한 안에서),
+    # 최근 p95보다 오래 걸리면 같은 호출을 하나 더 보내 먼저 온 결과 사용, JSON이 깨지면 교정 재요청 1회
+    REQUEST_DEADLINE_SEC: float = 90.0
+    # 요청 전체 기한: 헤더(초)가 있으면 그 값(REQUEST_DEADLINE_MAX_SEC 상한), 없으면 경로별 기본값.
+    # 기한이 지나면 진행 중 LLM 호출까지 취소하고 504. 클라이언트가 끊겨도 같은 방식으로 취소(499)
+    REQUEST_DEADLINE_HEADER: str = "X-Request-Timeout"
+    REQUEST_DEADLINE_MAX_SEC: float = 1800.0
+    REQUEST_DEADLINES: dict[str, float] = {
+        "/v1/rewrite-summarize3": 90.0,
+        "/v1/rewrite-batch3": 600.0,
+        "/v1/rewrite-batch3/stream": 1800.0,
+        "/v1/chat-article": 60.0,
+        "/v1/chat-article/stream": 120.0,
+    }
+    LLM_RETRY_MAX: int = 3
+    LLM_RETRY_BASE_SEC: float = 0.5
+    LLM_RETRY_MAX_SEC: float = 8.0
+    HEDGE_ENABLED: bool = True
+    HEDGE_MIN_SAMPLES: int = 20
+    HEDGE_MIN_DELAY_SEC: float = 1.0
+    JSON_REPAIR_ENABLED: bool = True
+
+    # 동시 LLM 호출 수 자동 조절(AIMD, 모델별): 정상이면 왕복마다 +AIMD_INCREASE,
+    # 429/5xx/타임아웃 또는 최근 지연(AIMD_RATIO_ALPHA EWMA)이 스테이지별 기준(AIMD_EWMA_ALPHA EWMA)의
+    # AIMD_LATENCY_SPIKE_FACTOR배를 넘으면 x AIMD_DECREASE_FACTOR
+    AIMD_ENABLED: bool = True
+    AIMD_INITIAL_LIMIT: int = 16
+    AIMD_MIN_LIMIT: int = 2
+    AIMD_MAX_LIMIT: int = 64
+    AIMD_INCREASE: float = 1.0
+    AIMD_DECREASE_FACTOR: float = 0.5
+    AIMD_LATENCY_SPIKE_FACTOR: float = 2.5
+    AIMD_EWMA_ALPHA: float = 0.1
+    AIMD_RATIO_ALPHA: float = 0.3
+    AIMD_MIN_SAMPLES: int = 10
+    AIMD_DECISION_LOG: int = 50          # /v1/stats에 보여 줄 최근 조절 기록 수
+    # LLM 호출 스케줄러: 우선순위 클래스(chat > single > batch > offline)별 대기열, 가중 공정 큐잉 가중치,
+    # 클래스별 최대 대기열 길이/최대 대기 시간(초, 0이면 제한 없음). 넘치면 SchedulerRejected
+    LLM_PRIORITY_WEIGHTS: dict[str, float] = {"chat": 16.0, "single": 8.0, "batch": 2.0, "offline": 1.0}
+    LLM_QUEUE_MAX_DEPTH: dict[str, int] = {"chat": 200, "single": 1000, "batch": 10000, "offline": 0}
+    LLM_QUEUE_MAX_WAIT_SEC: dict[str, float] = {"chat": 20.0, "single": 60.0, "batch": 600.0, "offline": 0.0}
+    # 배치 요청에서 동시에 진행하는 기사 수 상한 (실제 LLM 동시성은 AIMD가 정한다)
+    BATCH_ARTICLE_WORKERS: int = 16
+
+    # 모니터링: /metrics(Prometheus 텍스트 포맷) 집계, 스테이지/LLM 호출 스팬 로그(요청 ID 포함)
+    METRICS_ENABLED: bool = True
+    TRACE_ENABLED: bool = False
+
+    # latencyMsTotal 집계: "sum"(단계별 지연 합) | "critical_path"(가장 긴 의존 체인)
+    LATENCY_REPORTING: Literal["sum", "critical_path"] = "sum"
+
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
 settings = Settings()
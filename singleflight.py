@@ -0,0 +1,71 @@
+import asyncio
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+class SingleFlight:
+    """
+    같은 키(내용 해시 + 스테이지)로 동시에 들어온 호출을 하나의 작업으로 합친다.
+    먼저 온 호출(리더)이 작업을 만들고, 나머지는 같은 작업을 기다려 결과를 나눠 받는다.
+    작업은 별도 Task로 돌리므로 리더 요청이 끊겨도 기다리는 쪽은 결과를 받는다.
+    기다리는 쪽이 모두 취소되면(연결 끊김/기한 초과) 작업도 취소해 토큰을 더 쓰지 않는다.
+    취소한 작업은 바로 목록에서 빼므로, 그 뒤에 같은 키로 온 호출은 새 작업을 시작한다.
+    (끝난 뒤의 재사용은 결과 캐시 몫, 여기서는 진행 중인 것만 합친다)
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._waiters: Counter = Counter()
+        self.leaders = 0
+        self.coalesced = 0
+        self.abandoned = 0
+        self.coalesced_by_stage: Counter = Counter()
+
+    async def do(self, key: str, stage: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """(결과, 다른 호출의 결과를 나눠 받았는지)"""
+        task = self._inflight.get(key)
+        if task is not None and (task.cancelled() or task.cancelling()):
+            # 버려져 취소 중인 작업에는 붙지 않고 새로 시작한다
+            task = None
+        shared = task is not None
+        if shared:
+            self.coalesced += 1
+            self.coalesced_by_stage[stage.split(":")[0]] += 1
+        else:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        # 기다리던 쪽 하나가 취소돼도 다른 쪽이 남아 있으면 공유 작업은 계속 돈다
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(task), shared
+        except asyncio.CancelledError:
+            if self._waiters[key] == 1 and not task.done():
+                task.cancel()
+                # 취소가 끝날 때까지 기다리지 않고 바로 빼서, 새로 온 호출이 취소 중인 작업에 붙지 않게 한다
+                self._forget(key, task)
+                self.abandoned += 1
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if self._waiters[key] <= 0:
+                del self._waiters[key]
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        # 같은 키로 이미 새 작업이 시작됐으면 그것은 두고 간다
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "inFlight": len(self._inflight),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "abandoned": self.abandoned,
+            "coalescedByStage": dict(self.coalesced_by_stage),
+        }
+
+_flight = SingleFlight()
+
+def get_single_flight() -> SingleFlight:
+    return _flight
@@ -0,0 +1,224 @@
+import asyncio, json, logging, threading, time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+from settings import settings
+
+# Prometheus 텍스트 포맷(/metrics) 카운터/히스토그램 + 요청 ID/스테이지 컨텍스트 + 스팬 로그.
+# 외부 의존성 없이 필요한 만큼만 구현한다.
+
+T = TypeVar("T")
+
+# 요청 ID와 현재 스테이지는 contextvar로 흘려보낸다 (DAG 스테이지 태스크는 생성 시점 컨텍스트를 복사)
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+stage_var: ContextVar[str] = ContextVar("stage", default="-")
+# 기사 1건 동안 실제 호출한 모델별 토큰 {model: [input, output]} (pipeline이 usage_ledger()로 설정)
+usage_ledger_var: ContextVar[Optional[Dict[str, List[int]]]] = ContextVar("usage_ledger", default=None)
+
+_trace_log = logging.getLogger("article_rewriter.trace")
+if not _trace_log.handlers:
+    _trace_log.addHandler(logging.StreamHandler())
+    _trace_log.setLevel(logging.INFO)
+    _trace_log.propagate = False
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _fmt_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labels)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kw):
+        super().__init__(*args, **kw)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        if not settings.METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, v in sorted(self._values.items()):
+                lines.append(f"{self.name}{_fmt_labels(self.labels, key)} {v:g}")
+        return lines
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kw):
+        super().__init__(*args, **kw)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels: Any) -> None:
+        if not settings.METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, v in sorted(self._values.items()):
+                lines.append(f"{self.name}{_fmt_labels(self.labels, key)} {v:g}")
+        return lines
+
+# 초 단위. LLM 호출(수백 ms~수십 s)과 스레드풀/대기(ms 이하)를 함께 담을 수 있게 넓게
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kw):
+        super().__init__(*args, **kw)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple[str, ...], List[float]] = {}   # [버킷별 개수..., sum, count]
+
+    def observe(self, value: float, **labels: Any) -> None:
+        if not settings.METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            row = self._values.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, row in sorted(self._values.items()):
+                for b, n in zip(self.buckets, row):
+                    le = 'le="%g"' % b
+                    lines.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, le)} {n:g}")
+                inf = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, inf)} {row[-1]:g}")
+                lines.append(f"{self.name}_sum{_fmt_labels(self.labels, key)} {row[-2]:.6f}")
+                lines.append(f"{self.name}_count{_fmt_labels(self.labels, key)} {row[-1]:g}")
+        return lines
+
+_REGISTRY: List[_Metric] = []
+
+def render_metrics() -> str:
+    return "\n".join(line for m in _REGISTRY for line in m.render()) + "\n"
+
+# ----- 메트릭 정의 -----
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP 요청 수", ("path", "method", "status"))
+REQUESTS_CANCELLED = Counter("http_requests_cancelled_total", "처리 중에 멈춘 요청 (reason: disconnect|deadline)", ("path", "reason"))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP 응답 헤더까지 걸린 시간", ("path",))
+PIPELINE_ABORTED = Counter("pipeline_articles_aborted_total", "끝나기 전에 멈춘 기사 처리 (reason: deadline|cancelled)", ("reason",))
+STAGE_LATENCY = Histogram("pipeline_stage_duration_seconds", "DAG 스테이지 실행 시간", ("stage", "style", "source"))
+LLM_LATENCY = Histogram("llm_call_duration_seconds", "LLM 호출 1회 지연", ("stage", "style", "model"))
+LLM_CALLS = Counter("llm_calls_total", "LLM 호출 수 (outcome: ok|error|rate_limited|cancelled)", ("stage", "model", "outcome"))
+LLM_TOKENS = Counter("llm_tokens_total", "LLM 토큰 사용량 (direction: input|output)", ("stage", "style", "model", "direction"))
+LLM_RESILIENCE = Counter("llm_resilience_events_total", "재시도/헤지/JSON 교정/모델 승격 (event: retry|hedge|hedge_won|repair|repair_failed|escalate)", ("stage", "event"))
+PARSE_FAILURES = Counter("llm_parse_failures_total", "LLM 출력 JSON 파싱 실패 수", ("stage",))
+QUEUE_WAIT = Histogram("queue_wait_seconds", "작업이 실행되기 전까지 기다린 시간 (batch/stream 워커, llm_<priority> 스케줄러)", ("queue",))
+AIMD_LIMIT = Gauge("llm_concurrency_limit", "AIMD가 정한 모델별 동시 LLM 호출 한도", ("model",))
+AIMD_IN_FLIGHT = Gauge("llm_concurrency_in_flight", "모델별 진행 중인 LLM 호출 수", ("model",))
+AIMD_DECISIONS = Counter("llm_concurrency_decisions_total", "AIMD 한도 조절 (decision: increase|decrease, reason: healthy|429|5xx|timeout|latency)", ("model", "decision", "reason"))
+SCHED_QUEUE_DEPTH = Gauge("llm_scheduler_queue_depth", "우선순위별 LLM 호출 대기열 길이", ("model", "priority"))
+SCHED_REJECTED = Counter("llm_scheduler_rejected_total", "대기열에서 거절된 LLM 호출 (reason: queue_full|wait_timeout)", ("model", "priority", "reason"))
+CHAT_PRECOMPUTED = Counter("chat_precomputed_answers_total", "미리 만든 첫 턴 답변 (outcome: hit|miss|stored)", ("outcome",))
+NEAR_DUP_LOOKUPS = Counter("near_dup_lookups_total", "유사 중복 기사 색인 조회 (outcome: hit|miss)", ("outcome",))
+THREAD_TIME = Histogram("thread_pool_duration_seconds", "asyncio.to_thread 작업 시간 (스레드풀 대기 포함)", ("op",))
+
+def split_stage(name: str) -> Tuple[str, str]:
+    """'summary:CONCISE' -> ('summary', 'CONCISE'), 'epi:original'/'map:3' -> ('epi'/'map', '')"""
+    kind, _, rest = name.partition(":")
+    return kind, (rest if rest.isupper() else "")
+
+def current_stage() -> Tuple[str, str]:
+    return split_stage(stage_var.get())
+
+@contextmanager
+def stage_scope(name: str) -> Iterator[None]:
+    """이 블록 안의 LLM 호출/파싱 실패를 name 스테이지로 집계한다."""
+    token = stage_var.set(name)
+    try:
+        yield
+    finally:
+        stage_var.reset(token)
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+    """
+    TRACE_ENABLED일 때 요청 ID와 함께 구간 시간을 JSON 한 줄로 남긴다.
+    블록 안에서 돌려받은 dict에 값을 넣으면 같은 줄에 함께 기록된다.
+    """
+    extra: Dict[str, Any] = {}
+    t0 = time.perf_counter()
+    error = None
+    try:
+        yield extra
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        if settings.TRACE_ENABLED:
+            rec = {"requestId": request_id_var.get(), "span": name,
+                   "ms": round((time.perf_counter() - t0) * 1000, 1), **attrs, **extra}
+            if error:
+                rec["error"] = error
+            _trace_log.info(json.dumps(rec, ensure_ascii=False))
+
+@contextmanager
+def usage_ledger() -> Iterator[Dict[str, List[int]]]:
+    """이 블록 안(에서 만든 태스크 포함)의 성공한 LLM 호출 토큰을 모델별로 모은다."""
+    ledger: Dict[str, List[int]] = {}
+    token = usage_ledger_var.set(ledger)
+    try:
+        yield ledger
+    finally:
+        usage_ledger_var.reset(token)
+
+def record_llm_call(model: str, seconds: float, tin: int, tout: int, outcome: str = "ok",
+                    stage_name: Optional[str] = None) -> None:
+    """stage_name을 주지 않으면 현재 컨텍스트의 스테이지로 집계한다."""
+    stage, style = split_stage(stage_name) if stage_name else current_stage()
+    LLM_CALLS.inc(stage=stage, model=model, outcome=outcome)
+    if outcome != "ok":
+        return
+    ledger = usage_ledger_var.get()
+    if ledger is not None:
+        row = ledger.setdefault(model, [0, 0])
+        row[0] += tin
+        row[1] += tout
+    LLM_LATENCY.observe(seconds, stage=stage, style=style, model=model)
+    LLM_TOKENS.inc(tin, stage=stage, style=style, model=model, direction="input")
+    LLM_TOKENS.inc(tout, stage=stage, style=style, model=model, direction="output")
+
+async def to_thread(op: str, fn: Callable[..., T], *args: Any) -> T:
+    """asyncio.to_thread + 스레드풀 대기/실행 시간 집계"""
+    t0 = time.perf_counter()
+    try:
+        return await asyncio.to_thread(fn, *args)
+    finally:
+        THREAD_TIME.observe(time.perf_counter() - t0, op=op)
@@ -0,0 +1,30 @@
+from settings import settings
+from preprocess import long_doc_segments, prepare_body
+from pipeline import _prepare, build_stages
+
+def _paragraph(i: int) -> str:
+    return " ".join(f"{i}번째 문단의 {j}번째 문장은 지방 재정과 예산 집행에 관한 사실을 전한다." for j in range(12))
+
+def test_huge_body_caps_map_calls():
+    body = "\n\n".join(_paragraph(i) for i in range(3000))
+    prepared, segments = _prepare("지방 재정 보고서", body)
+    stages = build_stages("지방 재정 보고서", prepared.body, ["CONCISE"], set(), segments=segments)
+    map_calls = [st for st in stages if st.name.startswith("map:")]
+    assert 1 < len(map_calls) <= settings.LONG_DOC_MAX_SEGMENTS
+
+def test_long_doc_segments_keep_lead_and_order():
+    body = "\n\n".join(_paragraph(i) for i in range(400))
+    segments = long_doc_segments(prepare_body("제목", body), "제목")
+    assert len(segments) <= settings.LONG_DOC_MAX_SEGMENTS
+    assert segments[0].startswith("0번째 문단")
+    firsts = [int(seg.split("번째", 1)[0]) for seg in segments]
+    assert firsts == sorted(firsts)
+
+def test_copyright_mention_in_body_survives():
+    paragraph = ("법원은 음원 저작권 침해 소송에서 플랫폼의 copyright 필터가 충분하지 않았다고 판단했다. "
+                 "재판부는 배상액을 절반으로 줄였지만 재발 방지 조치를 함께 명령했다.")
+    body = "\n".join([paragraph, "홍길동 기자 hong@news.com", "<저작권자 ⓒ 한국뉴스, 무단 전재 및 재배포 금지>",
+                      "Copyright © 2024 Korea News. All rights reserved."])
+    prepared = prepare_body("저작권 판결", body)
+    assert prepared.body == paragraph
+    assert prepared.cleaned == paragraph